@@ -1,14 +1,31 @@
 import traceback
 from typing import Union
 
-import evaluix.utils.EvaluationFunctions as ef
 import numpy as np
 import pint
 from nomad.datamodel import EntryArchive
 from nomad.normalizing import Normalizer
 
+from nomad_age.schema_packages.LMOKEandVMOKESchema import LMOKERasterMap
+from nomad_age.utils.cache import get_result_cache
+from nomad_age.utils.hdf5 import get_offloaded_array
+
+# Evaluated hysteresis parameters stored as maps of a raster
+RASTER_MAP_PARAMETERS = ('HC', 'dHC', 'HEB', 'dHEB', 'MS', 'dMS')
+
 
 class LMOKENormalizer(Normalizer):
+    def __init__(
+        self,
+        cache_directory: str = '',
+        cache_max_size: int = 2**30,
+        average_cycles: bool = False,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.cache = get_result_cache(cache_directory, cache_max_size)
+        self.average_cycles = average_cycles
+
     def normalize(
         self,
         archive: EntryArchive,
@@ -16,6 +33,11 @@ class LMOKENormalizer(Normalizer):
     ) -> None:
         logger.info('LMOKENormalizer called')
 
+        # Raster maps hold the data of all positions and are evaluated in one batch
+        if isinstance(archive.data, LMOKERasterMap):
+            self.normalize_raster(archive.data, archive, logger)
+            return
+
         # Check if the archive has magnetic field and intensity but
         # no magnetization data
         if (
@@ -24,17 +46,16 @@ class LMOKENormalizer(Normalizer):
             and 'intensity' in archive.data
         ):
             logger.info('Normalizing magnetization data')
-            # Normalize the magnetization data
-            magnetization = self.normalize_magnetization(
-                archive.data['magnetic_field'], archive.data['intensity']
+            params = self.cached(
+                'LMOKENormalizer',
+                [archive.data.magnetic_field, archive.data.intensity],
+                lambda: self.evaluate(archive.data),
+                model='tan_hyseval',
+                branch_starts=archive.data.branch_starts,
+                average_cycles=self.average_cycles,
             )
-
-            archive.data.magnetization = magnetization
-
-            evaluated_hysteresis = self.hyseval(
-                archive.data['magnetic_field'],
-                archive.data['magnetization'],
-                'tan_hyseval',
+            archive.data.magnetization = (
+                params.pop('magnetization') * archive.data.intensity.units
             )
 
             try:
@@ -50,16 +71,6 @@ class LMOKENormalizer(Normalizer):
                 logger.error(f'Error generating hysteresis plot: {e}')
                 logger.error(traceback.format_exc())
 
-            # depending if fitted (analytical) or calculated, the output is different
-            NUMERICAL_LENGTH = 1
-            ANALYTICAL_LENGTH = 3
-            if len(evaluated_hysteresis) == NUMERICAL_LENGTH:
-                params = evaluated_hysteresis
-            elif len(evaluated_hysteresis) == ANALYTICAL_LENGTH:
-                params = evaluated_hysteresis[1]
-            else:
-                params = {}
-
             # Add the evaluated hysteresis parameters to the archive
 
             for key in params.keys():
@@ -75,15 +86,161 @@ class LMOKENormalizer(Normalizer):
                 else:
                     setattr(archive.data, key, params[key])
 
+    def cached(self, step: str, arrays: list, evaluate, **parameters) -> dict:
+        """
+        Returns the result of `evaluate` for the given input arrays, from the result
+        cache if they were evaluated with the same parameters before.
+        """
+        if self.cache is None:
+            return evaluate()
+        content = b''.join(
+            np.ascontiguousarray(getattr(array, 'magnitude', array)).tobytes()
+            for array in arrays
+        )
+        key = self.cache.key(content, step, **parameters)
+        result = self.cache.get(key)
+        if result is None:
+            result = evaluate()
+            self.cache.put(key, result)
+        return result
+
+    def evaluate(self, data) -> dict:
+        """
+        Normalizes the magnetization of a measurement and evaluates its hysteresis.
+
+        Returns:
+        dict: The evaluated hysteresis parameters and the normalized `magnetization`.
+        """
+        # Normalize the magnetization data
+        normalized_magnetization = self.normalize_magnetization(
+            data['magnetic_field'], data['intensity']
+        )
+        data.magnetization = normalized_magnetization
+
+        # Several cycles are averaged branch-wise into a single loop, if enabled
+        if self.average_cycles:
+            magnetic_field, magnetization = self.get_averaged_cycles(data)
+        else:
+            magnetic_field, magnetization = (
+                data['magnetic_field'],
+                data['magnetization'],
+            )
+        evaluated_hysteresis = self.hyseval(
+            magnetic_field,
+            magnetization,
+            'tan_hyseval',
+        )
+        return {
+            **self.get_parameters(evaluated_hysteresis),
+            'magnetization': normalized_magnetization.magnitude,
+        }
+
+    def normalize_raster(
+        self, raster_map: LMOKERasterMap, archive: EntryArchive, logger
+    ) -> None:
+        """
+        Normalizes and evaluates the measurements of all positions of a raster map in
+        one batch and stores the evaluated parameters as (Y, X) maps. Positions which
+        cannot be evaluated are NaN in the maps. The measurements are read from the
+        HDF5 file of the generated archive, they are not stored in the processed one.
+        """
+        logger.info(f'Evaluating raster map of {len(raster_map.X)} measurements')
+        magnetic_field = get_offloaded_array(raster_map, 'magnetic_field', archive)
+        intensity = get_offloaded_array(raster_map, 'intensity', archive)
+        if magnetic_field is None or intensity is None:
+            logger.warning('Raster map without measurement data')
+            return
+        result = self.cached(
+            'LMOKENormalizer.raster',
+            [magnetic_field, intensity, raster_map.X, raster_map.Y],
+            lambda: self.evaluate_raster(raster_map, magnetic_field, intensity, logger),
+            model='tan_hyseval',
+            shape=[raster_map.nY, raster_map.nX],
+        )
+        for name, values in result.items():
+            setattr(raster_map, name, values)
+
+        if raster_map.avg_raster:
+            raster_map.average_magnetic_field = np.nanmean(
+                magnetic_field.magnitude, axis=0
+            )
+            raster_map.average_magnetization = np.nanmean(
+                raster_map.magnetization, axis=0
+            )
+
+        try:
+            raster_map.generate_map_plots()
+        except Exception as e:
+            logger.error(f'Error generating raster map plots: {e}')
+            logger.error(traceback.format_exc())
+
+    def evaluate_raster(
+        self,
+        raster_map: LMOKERasterMap,
+        magnetic_field: pint.Quantity,
+        intensity: pint.Quantity,
+        logger,
+    ) -> dict:
+        """
+        Normalizes and evaluates the measurements (magnetic field and intensity, one
+        row per position) of all positions of a raster map.
+
+        Returns:
+        dict: The normalized `magnetization` and the maps of the evaluated parameters.
+        """
+        magnetization = np.full(intensity.shape, np.nan)
+        maps = {
+            name: np.full((raster_map.nY, raster_map.nX), np.nan)
+            for name in RASTER_MAP_PARAMETERS
+        }
+
+        for row, (x, y) in enumerate(zip(raster_map.X, raster_map.Y)):
+            # positions are 1-based, others would silently wrap around the maps
+            if not (1 <= x <= raster_map.nX and 1 <= y <= raster_map.nY):
+                logger.warning(f'Raster position ({x},{y}) outside of the raster')
+                continue
+            measured = ~np.isnan(magnetic_field[row].magnitude)
+            try:
+                magnetization[row, measured] = self.normalize_magnetization(
+                    magnetic_field[row][measured], intensity[row][measured]
+                ).magnitude
+                params = self.get_parameters(
+                    self.hyseval(
+                        magnetic_field[row][measured],
+                        magnetization[row, measured],
+                        'tan_hyseval',
+                    )
+                )
+            except Exception as e:
+                logger.warning(f'Error evaluating raster position ({x},{y}): {e}')
+                continue
+            for name, values in maps.items():
+                if params.get(name) is not None:
+                    values[y - 1, x - 1] = params[name]
+
+        return {'magnetization': magnetization, **maps}
+
+    def get_parameters(self, evaluated_hysteresis) -> dict:
+        """Returns the parameters of an evaluated hysteresis (see `hyseval`)."""
+        # depending if fitted (analytical) or calculated, the output is different
+        NUMERICAL_LENGTH = 1
+        ANALYTICAL_LENGTH = 3
+        if len(evaluated_hysteresis) == NUMERICAL_LENGTH:
+            return evaluated_hysteresis
+        elif len(evaluated_hysteresis) == ANALYTICAL_LENGTH:
+            return evaluated_hysteresis[1]
+        return {}
+
     def normalize_magnetization(
         self,
         magnetic_field: Union[list, np.array],
         intensity: Union[list, np.array],
     ):
+        import evaluix.utils.EvaluationFunctions as ef
+
         # Normalize the magnetization data
         # magnetic_field = np.array(magnetic_field)
         # intensity = np.array(intensity)
-
         magnetization = ef.del_outliers(intensity.magnitude, threshold=3, neighbours=5)
         magnetization = ef.rmv_opening(magnetization, sat_region=0.1)
         magnetization = ef.slope_correction(
@@ -104,6 +261,26 @@ class LMOKENormalizer(Normalizer):
 
         # return magnetization
 
+    def get_averaged_cycles(self, data):
+        """
+        Averages the cycles of the measurement branch-wise (see
+        `LMOKEandVMOKESchema.get_branches`) into a single loop of magnetic field and
+        magnetization. Data with a single cycle is returned as is.
+        """
+        magnetic_field = data.get_branches('magnetic_field')
+        n_cycles = magnetic_field.shape[0]
+        if n_cycles == 1:
+            return data['magnetic_field'], data['magnetization']
+
+        magnetic_field = magnetic_field.reshape(n_cycles, -1)
+        magnetization = data.get_branches('magnetization').reshape(n_cycles, -1)
+        # points missing in all cycles (truncated branches) are dropped
+        valid = ~np.isnan(magnetic_field).all(axis=0)
+        return (
+            np.nanmean(magnetic_field[:, valid], axis=0),
+            np.nanmean(magnetization[:, valid], axis=0),
+        )
+
     def hyseval(
         self,
         magnetic_field: Union[list, np.array, pint.Quantity],
@@ -121,6 +298,8 @@ class LMOKENormalizer(Normalizer):
         else:
             _magnetization = magnetization
 
+        import evaluix.utils.EvaluationFunctions as ef
+
         # check if model is available in EvaluationFunctions
         if hasattr(ef, model):
             evaluated_hysteresis = getattr(ef, model)(_magnetic_field, _magnetization)
@@ -18,6 +18,20 @@ normalizer_entry_point = NewNormalizerEntryPoint(
 
 
 class LMOKENormalizerEntryPoint(NormalizerEntryPoint):
+    cache_directory: str = Field(
+        '', description='Directory of the result cache (empty: no caching)'
+    )
+    cache_max_size: int = Field(
+        2**30, description='Maximum size of the result cache in bytes'
+    )
+    average_cycles: bool = Field(
+        False,
+        description=(
+            'Average the cycles of a measurement branch-wise into a single loop '
+            'before the evaluation (default: all cycles are evaluated as measured)'
+        ),
+    )
+
     def load(self):
         from nomad_age.normalizers.LMOKEnormalizer import LMOKENormalizer
 
@@ -0,0 +1,193 @@
+import io
+import multiprocessing
+import re
+import zipfile
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Union
+
+from nomad.datamodel import EntryArchive, EntryMetadata
+from nomad.parsing import MatchingParser
+
+from nomad_age.parsers.LMOKEparser import parse_lmoke_content
+from nomad_age.schema_packages.LMOKEandVMOKESchema import LMOKEandVMOKESchema
+
+"""
+# Measurement campaigns (e.g. an overnight raster) produce hundreds of LMOKE files.
+# Uploaded as a bundle (`*.lmoke.zip`), the whole campaign is a single mainfile: its
+# members are parsed on a process pool and each measurement becomes a child entry.
+# Scheduling is thus paid once per campaign instead of once per file.
+#
+# NOMAD extracts the .zip files uploaded directly into the raw files of the upload,
+# so a bundle only stays a mainfile if it reaches the upload as a file, e.g. nested
+# in the uploaded archive or with the extraction disabled. Otherwise its members are
+# extracted and parsed one by one by the LMOKEParser, with the same entries.
+"""
+# Members of a bundle which are parsed as LMOKE/VMOKE measurements
+BUNDLE_MEMBER_RE = re.compile(r'(?:.*/)?[^/]*(LMOKE|VMOKE)[^/]*\.txt')
+
+
+def list_bundle_members(bundle: Union[str, zipfile.ZipFile]) -> list[str]:
+    """
+    Returns the names of the LMOKE/VMOKE measurement files in a bundle.
+
+    Parameters:
+    bundle (str | ZipFile): The path to the bundle or the opened bundle.
+
+    Returns:
+    list[str]: The member names in the order of the bundle.
+    """
+    if not isinstance(bundle, zipfile.ZipFile):
+        with zipfile.ZipFile(bundle) as zip_file:
+            return list_bundle_members(zip_file)
+    return [
+        info.filename
+        for info in bundle.infolist()
+        if not info.is_dir() and BUNDLE_MEMBER_RE.fullmatch(info.filename)
+    ]
+
+
+def parse_bundle_member(bundle: str, member: str) -> dict:
+    """
+    Parses a single measurement of a bundle. Runs in a worker process, so the result
+    is returned as a dictionary (see `LMOKEandVMOKESchema.m_from_dict`).
+
+    Parameters:
+    bundle (str): The path to the bundle.
+    member (str): The name of the measurement file in the bundle.
+
+    Returns:
+    dict: The serialised LMOKEandVMOKESchema of the measurement.
+    """
+    with zipfile.ZipFile(bundle) as zip_file:
+        info = zip_file.getinfo(member)
+        with io.TextIOWrapper(zip_file.open(info)) as f:
+            content = f.read()
+
+    # Without a datetime in the name, the member's timestamp in the bundle is used
+    datetime = None
+    if not re.search(r'\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}', member):
+        datetime = '{:04d}-{:02d}-{:02d}_{:02d}-{:02d}-{:02d}'.format(*info.date_time)
+
+    return parse_lmoke_content(content, member, datetime=datetime).m_to_dict()
+
+
+def parse_bundle(
+    bundle: str, members: list[str], max_workers: int = None, logger=None
+) -> dict[str, LMOKEandVMOKESchema]:
+    """
+    Parses the measurements of a bundle on a process pool. A member which cannot be
+    parsed is logged and left out, the other members are kept.
+
+    Parameters:
+    bundle (str): The path to the bundle.
+    members (list[str]): The names of the measurement files to parse.
+    max_workers (int, optional): The number of worker processes (default: all cores).
+    logger (optional): The logger of the parser the failed members are logged to.
+
+    Returns:
+    dict[str, LMOKEandVMOKESchema]: The parsed measurements by member name, in the
+        order of `members`.
+    """
+    # Daemonic processes (e.g. pool workers) cannot have children, use threads there
+    if multiprocessing.current_process().daemon:
+        executor_class = ThreadPoolExecutor
+    else:
+        executor_class = ProcessPoolExecutor
+    results = {}
+    with executor_class(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(parse_bundle_member, bundle, member): member
+            for member in members
+        }
+        for future in as_completed(futures):
+            member = futures[future]
+            try:
+                results[member] = future.result()
+            except Exception as e:
+                if logger is not None:
+                    logger.error(f'Error parsing {member} of bundle {bundle}: {e}')
+    return {
+        member: LMOKEandVMOKESchema.m_from_dict(results[member])
+        for member in members
+        if member in results
+    }
+
+
+class LMOKEBundleParser(MatchingParser):
+    """
+    Parser for bundles (ZIP files) of LMOKE and VMOKE measurement files.
+
+    Each measurement of the bundle is parsed into its own child archive, keyed by its
+    name in the bundle. The main archive only represents the bundle itself.
+
+    Arguments:
+        max_workers: int, optional
+            The number of worker processes parsing the measurements.
+    """
+
+    creates_children = True
+
+    def __init__(self, max_workers: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_workers = max_workers or None
+
+    def is_mainfile(
+        self,
+        filename: str,
+        mime: str,
+        buffer: bytes,
+        decoded_buffer: str,
+        compression: str = None,
+    ) -> Union[bool, Iterable[str]]:
+        if not super().is_mainfile(filename, mime, buffer, decoded_buffer, compression):
+            return False
+        try:
+            members = list_bundle_members(filename)
+        except (OSError, zipfile.BadZipFile):
+            return False
+        return set(members) or False
+
+    def parse(
+        self,
+        mainfile: str,
+        archive: EntryArchive,
+        logger,
+        child_archives: dict[str, EntryArchive] = None,
+    ) -> None:
+        """
+        Parses all measurements of the bundle into the child archives.
+
+        Parameters:
+            mainfile (str): The path to the bundle.
+            archive (EntryArchive): The archive object of the bundle.
+            logger (Logger): The logger object for logging messages.
+            child_archives (Dict[str, EntryArchive]): The child archives by member
+            name, as returned by `is_mainfile`.
+        """
+        logger.info(f'LMOKEBundleParser called on {mainfile}')
+
+        if archive.metadata is None:
+            archive.metadata = EntryMetadata()
+        if archive.metadata.entry_type is None:
+            archive.metadata.entry_type = 'Bundle'
+
+        if not child_archives:
+            logger.warning(f'No child archives for the members of {mainfile}')
+            return
+
+        measurements = parse_bundle(
+            mainfile, sorted(child_archives), self.max_workers, logger
+        )
+
+        for member, measurement in measurements.items():
+            child_archive = child_archives[member]
+            if child_archive.metadata is None:
+                child_archive.metadata = EntryMetadata()
+            child_archive.metadata.entry_type = 'Experiment'
+            child_archive.data = measurement
+
+        logger.info(
+            f'Stored {len(measurements)} of {len(child_archives)} measurements of '
+            f'{mainfile}'
+        )
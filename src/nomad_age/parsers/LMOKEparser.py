@@ -1,11 +1,16 @@
+import os
 import re
+import time
+from typing import Optional
 
 import numpy
 from nomad.datamodel import EntryArchive, EntryMetadata
 from nomad.parsing import MatchingParser
-from nomad.parsing.file_parser import DataTextParser, Quantity, TextParser
 
+from nomad_age.parsers.instrument_log import read_log_data
 from nomad_age.schema_packages.LMOKEandVMOKESchema import LMOKEandVMOKESchema
+from nomad_age.utils.cache import get_result_cache
+from nomad_age.utils.utils import sniff_header
 
 
 def assign_as_single_string(value):
@@ -27,13 +32,370 @@ def assign_as_single_string(value):
     return value
 
 
+def split_lmoke_content(content: str) -> tuple[str, str]:
+    """
+    Splits the content of an LMOKE file at the `# ----` separator line (LMOKE) or
+    before the `Magnetic field [kA/m]` column header (VMOKE) into the metadata header
+    and the data block. If no separator is found, the whole content is returned for
+    both parts.
+
+    Parameters:
+    content (str): The full content of the LMOKE or VMOKE file.
+
+    Returns:
+    tuple[str, str]: The metadata header and the data block.
+    """
+    separator = re.search(r'#\s-{4,}|^(?=Magnetic\sfield\s\[)', content, re.MULTILINE)
+    if separator is None:
+        return content, content
+    return content[: separator.start()], content[separator.end() :]
+
+
+def read_lmoke_data(data_content: str) -> numpy.ndarray:
+    """
+    Converts the data block of an LMOKE file into a 2-D array in a single pass.
+    Leading comment lines (e.g. the column header `# H (kA/m)  I (arb.u.)`) are
+    skipped and the number of columns is taken from the first data row. Rows with
+    another number of columns (e.g. the incomplete last row of an interrupted
+    measurement) or with values which are not numbers (e.g. a footer) are dropped
+    (see `read_log_data`).
+
+    Parameters:
+    data_content (str): The data block of the LMOKE file.
+
+    Returns:
+    numpy.ndarray: The data with shape (n_points, n_columns).
+    """
+    first_row = re.search(r'^[ \t]*[-+.\d]', data_content, re.MULTILINE)
+    if first_row is None:
+        return numpy.empty((0, 0))
+    block = data_content[first_row.start() :]
+
+    n_columns = len(block.split('\n', 1)[0].split())
+    return read_log_data(block.encode(), n_columns)
+
+
+def read_column_names(data_content: str) -> list[str]:
+    """
+    Returns the tab separated column names of the data block, i.e. of the last
+    line before the first data row (e.g. `# H (kA/m)  I (arb.u.)`).
+    """
+    first_row = re.search(r'^[ \t]*[-+.\d]', data_content, re.MULTILINE)
+    end = first_row.start() if first_row is not None else len(data_content)
+    column_line = data_content[:end].rstrip().rsplit('\n', 1)[-1]
+    return [
+        name.strip() for name in column_line.lstrip('#').split('\t') if name.strip()
+    ]
+
+
+# Channels of the data columns if they cannot be told from the column names
+CHANNEL_LAYOUTS = {
+    2: ('longitudinal_field', 'longitudinal_intensity'),
+    4: (
+        'longitudinal_field',
+        'transversal_field',
+        'longitudinal_intensity',
+        'transversal_intensity',
+    ),
+    5: (
+        'longitudinal_field',
+        'transversal_field',
+        'longitudinal_intensity',
+        'transversal_intensity',
+        'diff_longitudinal_intensity',
+    ),
+    6: (
+        'longitudinal_field',
+        'transversal_field',
+        'total_field',
+        'longitudinal_intensity',
+        'transversal_intensity',
+        'diff_longitudinal_intensity',
+    ),
+}
+
+
+def get_channels(column_names: list[str], n_columns: int) -> list[str]:
+    """
+    Maps the data columns to named channels, e.g. `longitudinal_field` or
+    `transversal_intensity`. The channels are told from keywords in the column names.
+    If the names are missing or ambiguous, the default layout for the number of
+    columns (`CHANNEL_LAYOUTS`) is used.
+
+    Parameters:
+    column_names (list[str]): The column names of the data block.
+    n_columns (int): The number of data columns.
+
+    Returns:
+    list[str]: The channel name of each column.
+    """
+    channels = []
+    for name in column_names:
+        name = name.lower()
+        is_field = 'field' in name or re.match(r'h\b', name) is not None
+        if 'diff' in name:
+            component = 'diff_longitudinal'
+        elif 'trans' in name:
+            component = 'transversal'
+        elif 'total' in name or 'abs' in name:
+            component = 'total'
+        else:
+            component = 'longitudinal'
+        channels.append(f'{component}_{"field" if is_field else "intensity"}')
+
+    if len(channels) == n_columns and len(set(channels)) == n_columns:
+        return channels
+    if n_columns in CHANNEL_LAYOUTS:
+        return list(CHANNEL_LAYOUTS[n_columns])
+    return [f'channel_{index}' for index in range(n_columns)]
+
+
+def get_lmoke_datetime(mainfile: str) -> str:
+    """
+    Returns the datetime of an LMOKE measurement from its filename or, if the filename
+    does not contain it, from the file creation time.
+    """
+    # get datetime from filename
+    datetime_pattern = re.compile(r'(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})')
+    matches = datetime_pattern.findall(mainfile)
+    if matches:
+        return matches[0]
+    # get datetime from file creation time
+    creation_time = os.path.getctime(mainfile)
+    return time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime(creation_time))
+
+
+def get_lmoke_position(
+    header: 'LMOKEHeader', mainfile: str
+) -> Optional[tuple[int, int]]:
+    """
+    Returns the raster position (X, Y) of a measurement from its header or, for files
+    before 2025, from its filename (e.g. "..._(3,5).txt"), or None if it is not given.
+    """
+    if header.dialect == PRE_2025:
+        position = re.search(r'\((\d+),(\d+)\)', os.path.basename(mainfile))
+        return (int(position[1]), int(position[2])) if position else None
+    if header.get('X') is None or header.get('Y') is None:
+        return None
+    return header.get('X'), header.get('Y')
+
+
+def find_branches(
+    magnetic_field: numpy.ndarray, pts_per_branch: int = None
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Finds the branches of a field sweep by vectorized sign-change detection.
+
+    The sweep direction is taken from the field difference over a window of a tenth of
+    a branch, so that noise at the turning points does not split branches. Each
+    turning point (field extremum) is the first point of the following branch.
+
+    Parameters:
+    magnetic_field (numpy.ndarray): The (flat) magnetic field of the measurement.
+    pts_per_branch (int, optional): The number of points per branch from the header.
+
+    Returns:
+    tuple[numpy.ndarray, numpy.ndarray]: The index of the first point and the sweep
+        direction (-1 decreasing, +1 increasing) of each branch.
+    """
+    field = numpy.asarray(magnetic_field, dtype=float)
+    window = max((pts_per_branch or 0) // 10, 1)
+    if field.size <= window:
+        return numpy.zeros(1, dtype=int), numpy.zeros(1, dtype=int)
+
+    trend = numpy.sign(field[window:] - field[:-window]).astype(int)
+    # carry the last direction over steps without field change
+    steps = numpy.flatnonzero(trend)
+    if steps.size == 0:
+        return numpy.zeros(1, dtype=int), numpy.zeros(1, dtype=int)
+    carried = numpy.where(trend != 0, numpy.arange(trend.size), steps[0])
+    trend = trend[numpy.maximum.accumulate(carried)]
+
+    changes = numpy.flatnonzero(trend[1:] != trend[:-1]) + 1
+    # the turning point is the field extremum within the window of the change
+    windows = changes[:, None] + numpy.arange(window + 1)
+    windows = numpy.minimum(windows, field.size - 1)
+    extrema = numpy.where(
+        trend[changes, None] > 0,
+        field[windows] == field[windows].min(axis=1, keepdims=True),
+        field[windows] == field[windows].max(axis=1, keepdims=True),
+    ).argmax(axis=1)
+    turns = changes + extrema
+
+    branch_starts = numpy.concatenate(([0], turns))
+    branch_directions = numpy.concatenate((trend[[0]], trend[changes]))
+    # drop branches shorter than the window (noise at the turning points)
+    keep = numpy.diff(numpy.append(branch_starts, field.size)) >= window
+    keep[0] = True
+    branch_starts, branch_directions = branch_starts[keep], branch_directions[keep]
+    # the kept neighbours of a dropped branch with the same direction are merged
+    keep = numpy.r_[True, branch_directions[1:] != branch_directions[:-1]]
+    return branch_starts[keep], branch_directions[keep]
+
+
+def read_lmoke_header(mainfile: str) -> 'LMOKEHeader':
+    """
+    Reads only the metadata header of an LMOKE measurement file, i.e. all lines up to
+    the `# ----` separator line.
+
+    Parameters:
+    mainfile (str): The path to the LMOKE file.
+
+    Returns:
+    LMOKEHeader: The key-value index of the header.
+    """
+    lines = []
+    with open(mainfile) as f:
+        for line in f:
+            if re.match(r'#\s-{4,}', line):
+                break
+            lines.append(line)
+    return LMOKEHeader(''.join(lines))
+
+
+def parse_lmoke_content(
+    content: str, mainfile: str, datetime: str = None
+) -> LMOKEandVMOKESchema:
+    """
+    Creates a new LMOKEandVMOKESchema from the content of an LMOKE measurement file.
+
+    All state of a parse is local to this call (no shared parser instances), so it
+    can be called for many files at once from a thread or process pool.
+
+    Parameters:
+    content (str): The full content of the LMOKE file.
+    mainfile (str): The path of the LMOKE file, used for the datetime of the
+        measurement.
+    datetime (str, optional): The datetime of the measurement, if `mainfile` is not a
+        file on disk (e.g. a member of a bundle) and its name does not contain it.
+
+    Returns:
+    LMOKEandVMOKESchema: The schema holding the metadata and experimental data.
+    """
+    lmokeandvmokeschema = LMOKEandVMOKESchema()
+
+    # Split the content once at the separator line
+    metadata_content, data_content = split_lmoke_content(content)
+
+    lmokeandvmokeschema.datetime = datetime or get_lmoke_datetime(mainfile)
+
+    header = LMOKEHeader(metadata_content)  # extract all metadata from the header
+
+    # The header dialect tells old files (without UUID) from new ones and VMOKE files
+    if header.dialect == VMOKE:
+        lmokeandvmokeschema.uuid = header.get('UUID') or 'None'
+        lmokeandvmokeschema.device = header.get('Device') or 'VMOKE'
+        lmokeandvmokeschema.field_angle = header.get('Field angle')
+        lmokeandvmokeschema.temperature = header.get('Temperature') or 300.0
+        lmokeandvmokeschema.calibration = header.get('Calibration') or 'None'
+        lmokeandvmokeschema.polarization = header.get('Polarization') or 'p'
+    elif header.dialect == PRE_2025:
+        # Old files (before 2025): use hardcoded values for missing quantities
+        lmokeandvmokeschema.uuid = 'None'
+        lmokeandvmokeschema.device = 'LMOKE'
+        lmokeandvmokeschema.field_angle = 0.0
+        lmokeandvmokeschema.temperature = 300.0
+        lmokeandvmokeschema.calibration = 'None'
+        lmokeandvmokeschema.polarization = 's'
+        # Without a position in the filename, it follows from the acquisition order
+        # of the raster (see LMOKEraster)
+        position = get_lmoke_position(header, mainfile)
+        lmokeandvmokeschema.X = position[0] if position else 0
+        lmokeandvmokeschema.Y = position[1] if position else 0
+    else:
+        # New files (starting from 2025): use parsed values
+        lmokeandvmokeschema.uuid = header.get('UUID')
+        lmokeandvmokeschema.device = header.get('Device')
+        lmokeandvmokeschema.field_angle = header.get('Field angle')
+        lmokeandvmokeschema.temperature = header.get('Temperature')
+        lmokeandvmokeschema.calibration = header.get('Calibration')
+        lmokeandvmokeschema.polarization = header.get('Polarization')
+        lmokeandvmokeschema.X = header.get('X')
+        lmokeandvmokeschema.Y = header.get('Y')
+
+    lmokeandvmokeschema.user = assign_as_single_string(header.get('User'))
+    lmokeandvmokeschema.sample = header.get('Sample')
+    lmokeandvmokeschema.sample_state = assign_as_single_string(
+        header.get('Sample State')
+    )
+    lmokeandvmokeschema.meas_type = header.get('Meas. type')
+    lmokeandvmokeschema.profile = header.get('Profile')
+    lmokeandvmokeschema.sample_angle = header.get('Sample angle')
+    lmokeandvmokeschema.H_start = header.get('Hstart')
+    lmokeandvmokeschema.H_end = header.get('Hend')
+    lmokeandvmokeschema.pts_per_branch = header.get('Pts/branch')
+    lmokeandvmokeschema.time_per_point = header.get('Time/pt')
+    lmokeandvmokeschema.delay_time = header.get('Delay time')
+    lmokeandvmokeschema.nCycles = header.get('nCycles')
+    lmokeandvmokeschema.cycle = header.get('Cycle')
+    lmokeandvmokeschema.H_stop = header.get('Hstop')
+    lmokeandvmokeschema.wait_time = header.get('Wait time')
+    lmokeandvmokeschema.nSched = header.get('nSched')
+    lmokeandvmokeschema.nMinorLoops_nFORCs = header.get('nMinorLoops')
+    lmokeandvmokeschema.nX = header.get('nX')
+    lmokeandvmokeschema.nY = header.get('nY')
+    lmokeandvmokeschema.DeltaX = header.get('DeltaX')
+    lmokeandvmokeschema.DeltaY = header.get('DeltaY')
+
+    lmokeandvmokeschema.avg_raster = False
+    if header.get('Avg. raster') is not None:
+        if 'no' not in header.get('Avg. raster').lower():
+            lmokeandvmokeschema.avg_raster = True
+
+    # Comment is over several lines (until "Meas. type")
+    comment = header.get_multiline('Comment')
+    lmokeandvmokeschema.comment = comment if comment is not None else 'None'
+
+    # Convert the experimental data block (all columns) in one pass
+    data = read_lmoke_data(data_content)
+    if data.size:
+        channels = get_channels(read_column_names(data_content), data.shape[1])
+        if data.shape[1] > len(CHANNEL_LAYOUTS[2]):
+            lmokeandvmokeschema.channels = channels
+            lmokeandvmokeschema.channel_data = data
+
+        # Longitudinal magnetic field and longitudinal detector signal
+        field_column, intensity_column = 0, 1
+        if 'longitudinal_field' in channels:
+            field_column = channels.index('longitudinal_field')
+        if 'longitudinal_intensity' in channels:
+            intensity_column = channels.index('longitudinal_intensity')
+        lmokeandvmokeschema.magnetic_field = data[:, field_column]
+        lmokeandvmokeschema.intensity = data[:, intensity_column]
+
+        # Field branches and cycles of the measurement
+        branch_starts, branch_directions = find_branches(
+            data[:, field_column], lmokeandvmokeschema.pts_per_branch
+        )
+        lmokeandvmokeschema.branch_starts = branch_starts
+        lmokeandvmokeschema.branch_directions = branch_directions
+
+    return lmokeandvmokeschema
+
+
+def read_lmoke_file(mainfile: str) -> LMOKEandVMOKESchema:
+    """
+    Reads and parses an LMOKE measurement file (see `parse_lmoke_content`).
+
+    Parameters:
+    mainfile (str): The path to the LMOKE file.
+
+    Returns:
+    LMOKEandVMOKESchema: The schema holding the metadata and experimental data.
+    """
+    with open(mainfile) as f:
+        content = f.read()
+    return parse_lmoke_content(content, mainfile)
+
+
 class LMOKEParser(MatchingParser):
     """
-    Parser for LMOKE (Longitudinal Magneto-Optic Kerr Effect) measurement files.
+    Parser for LMOKE (Longitudinal Magneto-Optic Kerr Effect) and VMOKE (Vector MOKE)
+    measurement files.
 
     This parser extracts metadata and experimental data from LMOKE measurement files.
-    The metadata is extracted using regular expressions, and the experimental data is
-    processed using the DataTextParser.
+    The metadata is extracted from a key-value index of the header (see `LMOKEHeader`),
+    and the experimental data is converted directly into a NumPy array.
 
     Arguments:
         mainfile: str
@@ -44,8 +406,58 @@ class LMOKEParser(MatchingParser):
             The logger object for logging messages.
         child_archives: dict[str, EntryArchive], optional
             A dictionary of child archives, if any.
+        cache_directory: str, optional
+            The directory of the result cache (see `ResultCache`), no caching if empty.
+        cache_max_size: int, optional
+            The maximum size of the result cache in bytes.
     """
 
+    def __init__(
+        self, cache_directory: str = '', cache_max_size: int = 2**30, **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.cache = get_result_cache(cache_directory, cache_max_size)
+
+    # Banner of LMOKE (`# Meas. type`) and VMOKE (`Measurement Method`) headers
+    header_re = re.compile(rb'#\s+Meas\.\s+type\s|Measurement\s+Method\s')
+
+    def is_mainfile(
+        self,
+        filename: str,
+        mime: str,
+        buffer: bytes,
+        decoded_buffer: str,
+        compression: str = None,
+    ) -> bool:
+        """
+        Matches LMOKE and VMOKE files by their name and the banner in their header
+        (see `sniff_header`), without decoding or searching the rest of the file.
+        """
+        if compression is not None or not self._mainfile_name_re.fullmatch(filename):
+            return False
+        return sniff_header(filename, buffer, self.header_re)
+
+    def read(self, mainfile: str) -> LMOKEandVMOKESchema:
+        """
+        Reads the LMOKE file (see `read_lmoke_file`) or, if its content was parsed
+        before, the cached result.
+        """
+        if self.cache is None:
+            return read_lmoke_file(mainfile)
+        # the datetime and position are derived from the path if not in the content
+        key = self.cache.key(
+            mainfile,
+            'LMOKEParser',
+            file_name=os.path.basename(mainfile),
+            datetime=get_lmoke_datetime(mainfile),
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return LMOKEandVMOKESchema.m_from_dict(cached)
+        data = read_lmoke_file(mainfile)
+        self.cache.put(key, data.m_to_dict())
+        return data
+
     def parse(
         self,
         mainfile: str,
@@ -64,35 +476,6 @@ class LMOKEParser(MatchingParser):
             archives, if any.
         """
         logger.info(f'LMOKEParser called on {mainfile}')
-        lmokeandvmokeschema = LMOKEandVMOKESchema()
-
-        # Read the file content
-        with open(mainfile) as f:
-            content = f.read()
-
-        # Split the content at the separator line
-        try:
-            _metadata_content, data_content = re.split(r'#\s-{4,}', content, maxsplit=1)
-        except ValueError:
-            _metadata_content = data_content = content
-        tmp_data_file = 'tmp_data_file.txt'
-        with open(tmp_data_file, 'w') as f:
-            f.write(data_content)
-
-        # get datetime from filename
-        datetime_pattern = re.compile(r'(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})')
-        matches = datetime_pattern.findall(mainfile)
-        if matches:
-            lmokeandvmokeschema.datetime = matches[0]
-        if not matches:
-            # get datetime from file creation time
-            import os
-            import time
-
-            creation_time = os.path.getctime(mainfile)
-            lmokeandvmokeschema.datetime = time.strftime(
-                '%Y-%m-%d_%H-%M-%S', time.localtime(creation_time)
-            )
 
         # TODO: Check if this is correct
         if archive.metadata is None:
@@ -101,291 +484,236 @@ class LMOKEParser(MatchingParser):
         if archive.metadata.entry_type is None:
             archive.metadata.entry_type = 'Experiment'
 
-        mainfile_parser.mainfile = mainfile
-        mainfile_parser.parse()  # extract all metadata from the mainfile
-
-        logger.info(f'Extracted metadata from {mainfile}')
-
-        # Check if UUID is present to determine if it's a new file
-        uuid = mainfile_parser.get('UUID')
-        if uuid is None:
-            # Old files (before 2025): use hardcoded values for missing quantities
-            lmokeandvmokeschema.uuid = 'None'
-            lmokeandvmokeschema.device = 'LMOKE'
-            lmokeandvmokeschema.field_angle = 0.0
-            lmokeandvmokeschema.temperature = 300.0
-            lmokeandvmokeschema.calibration = 'None'
-            lmokeandvmokeschema.polarization = 's'
-            lmokeandvmokeschema.X = 0.0  # TODO: Extract from filename
-            lmokeandvmokeschema.Y = 0.0  # TODO: Extract from filename
-        else:
-            # New files (starting from 2025): use parsed values
-            lmokeandvmokeschema.uuid = uuid
-            lmokeandvmokeschema.device = mainfile_parser.get('Device')
-            lmokeandvmokeschema.field_angle = mainfile_parser.get('Field angle')
-            lmokeandvmokeschema.temperature = mainfile_parser.get('Temperature')
-            lmokeandvmokeschema.calibration = mainfile_parser.get('Calibration')
-            lmokeandvmokeschema.polarization = mainfile_parser.get('Polarization')
-            lmokeandvmokeschema.X = mainfile_parser.get('X')
-            lmokeandvmokeschema.Y = mainfile_parser.get('Y')
-
-        lmokeandvmokeschema.user = assign_as_single_string(mainfile_parser.get('User'))
-        lmokeandvmokeschema.sample = mainfile_parser.get('Sample')
-        lmokeandvmokeschema.sample_state = assign_as_single_string(
-            mainfile_parser.get('Sample State')
-        )
-        lmokeandvmokeschema.meas_type = mainfile_parser.get('Meas. type')
-        lmokeandvmokeschema.profile = mainfile_parser.get('Profile')
-        lmokeandvmokeschema.sample_angle = mainfile_parser.get('Sample angle')
-        lmokeandvmokeschema.H_start = mainfile_parser.get('Hstart')
-        lmokeandvmokeschema.H_end = mainfile_parser.get('Hend')
-        lmokeandvmokeschema.pts_per_branch = mainfile_parser.get('Pts/branch')
-        lmokeandvmokeschema.time_per_point = mainfile_parser.get('Time/pt')
-        lmokeandvmokeschema.delay_time = mainfile_parser.get('Delay time')
-        lmokeandvmokeschema.nCycles = mainfile_parser.get('nCycles')
-        lmokeandvmokeschema.cycle = mainfile_parser.get('Cycle')
-        lmokeandvmokeschema.H_stop = mainfile_parser.get('Hstop')
-        lmokeandvmokeschema.wait_time = mainfile_parser.get('Wait time')
-        lmokeandvmokeschema.nSched = mainfile_parser.get('nSched')
-        lmokeandvmokeschema.nMinorLoops = mainfile_parser.get('nMinorLoops')
-        lmokeandvmokeschema.nX = mainfile_parser.get('nX')
-        lmokeandvmokeschema.nY = mainfile_parser.get('nY')
-        lmokeandvmokeschema.DeltaX = mainfile_parser.get('DeltaX')
-        lmokeandvmokeschema.DeltaY = mainfile_parser.get('DeltaY')
-
-        lmokeandvmokeschema.avg_raster = False
-        if mainfile_parser.get('Avg. raster') is not None:
-            if 'no' not in mainfile_parser.get('Avg. raster').lower():
-                lmokeandvmokeschema.avg_raster = True
-
-        # Comment is over several lines which is not supported by the mainfile_parser
-        # (flags?!)
-        with open(mainfile) as f:
-            content = f.read()
-            comment_pattern = re.compile(
-                r'#\sComment\s+(.*?)(?=\n#\sMeas\.\stype|\n#\s-{4,})', re.DOTALL
-            )
-            matches = comment_pattern.findall(content)
-            if matches:
-                comment_lines = matches[0].split('\n')
-                # remove "# " at the beginning of each line
-                processed_comment_lines = [
-                    line.lstrip('# ').strip() for line in comment_lines
-                ]
-                lmokeandvmokeschema.comment = '\n'.join(processed_comment_lines)
-            else:
-                lmokeandvmokeschema.comment = 'None'
-
-        # Process the experimental data using DataTextParser
-        experimental_data_parser.mainfile = tmp_data_file
-        experimental_data_parser.parse()
-
-        lmokeandvmokeschema.magnetic_field = experimental_data_parser.get(
-            'Longitudinal magnetic field'
-        )
-        lmokeandvmokeschema.intensity = experimental_data_parser.get(
-            'Longitudinal detector signal'
-        )
+        archive.data = self.read(mainfile)
+
+        # The last measurement of a raster run creates the map of the whole raster
+        if archive.m_context is not None:
+            from nomad_age.parsers.LMOKEraster import create_raster_map
 
-        archive.data = lmokeandvmokeschema
+            try:
+                create_raster_map(mainfile, archive, logger)
+            except Exception as e:
+                logger.error(f'Error creating raster map: {e}')
 
         logger.info(f'Stored metadata in {archive}')
 
 
 """
-# This is the mainfile parser for LMOKE measurements (similar to VMOKEs parser).
-# The mainfile contains all the metadata (and data) of the measurement.
-# The metadata is extracted using regular expressions.
-# The metadata is then stored in a schema object.
+# This is the header engine for LMOKE measurements (similar to VMOKEs header).
+# The header lines (`# key<tabs>value`) are tokenised once into a key-value index.
+# Each metadata quantity is then looked up by its header key(s) and converted to its
+# type. Patterns only act on the value of the respective key, never on the whole file.
 """
-mainfile_parser = TextParser(
-    quantities=[
-        ## General (most important) metadata
-        # Extracts the first and last name of the user
-        Quantity(
-            'User', r'#\sUser\s+([A-Z][a-z]+\s[A-Z][a-z]+)', repeats=False, dtype=str
-        ),
-        # Extracts the sample name, E for External, Z for Z400 and P for Prevac
-        Quantity('Sample', r'([EZP]?\d{4}_\d{4}_\d)', repeats=False, dtype=str),
-        # Extracts the sample state, typically "as made", "after FC" or "after IB"
-        Quantity('Sample State', r'#\sState\s+([a-zA-Z\s]+)', repeats=False, dtype=str),
-        # Extracts the UUID of the measurement likely consisting of the experiment and
-        # a measurement number
-        Quantity('UUID', r'#\sUUID\s+([a-zA-Z0-9]+)', repeats=False, dtype=str),
-        ## Important measurement quantities for EVERY measurement
-        # Extracts the measurement type, e.g. "Hysteresis", "Minor loops", "Raster" etc
-        Quantity(
-            'Meas. type',
-            r'#\sMeas\.\stype\s+([a-zA-Z_\-\.]+)',
-            repeats=False,
-            dtype=str,
-        ),
-        # Extracts the profile name during the measurement. Can be any profile txt,
-        # which can be altered later or during the measurement. Not very informative.
-        Quantity(
-            'Profile', r'#\sProfile\s+([a-zA-Z0-9_\-\.]+)', repeats=False, dtype=str
-        ),
-        # Extracts the sample angle in degrees. Typically 0, sometimes 90 or 45 but can
-        # be any angle. Measured according to sputter deposition direction vs plane of
-        # incidence in direction of light.
-        Quantity(
-            'Sample angle',
-            r'#\s(?:Sample\s)?angle\s\(deg\)\s+([0-9\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Extracts the device used for the measurement, e.g. "LMOKE" or "VMOKE"
-        Quantity('Device', r'#\sDevice\s+([a-zA-Z0-9\s]+)', repeats=False, dtype=str),
-        # Extracts the field angle in degrees, relative to the plane of incidence.
-        # For LMOKE always 0, for VMOKE mostly 0 and 90.
-        Quantity(
-            'Field angle',
-            r'#\sField\sangle\s\(deg\)\s+([0-9\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Extracts the temperature in Kelvin. Typically room temperature (300 K) as not
-        # yet measured.
-        Quantity(
-            'Temperature',
-            r'#\sTemperature\s\(K\)\s+([0-9\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Extracts the calibration file used for the measurement. Typically "default"
-        # or "none". Not yet used.
-        Quantity(
-            'Calibration',
-            r'#\sCalibration\s+([a-zA-Z0-9_\-\.]+)',
-            repeats=False,
-            dtype=str,
-        ),
-        # Extracts the polarization of the light used for the measurement. Typically
-        # "s" for LMOKE and "p" for VMOKE.
-        Quantity(
-            'Polarization', r'#\sPolarization\s+([spSP]+)', repeats=False, dtype=str
-        ),
-        # Extracts the starting field in kA/m.
-        Quantity(
-            'Hstart',
-            r'#\s(?:Hmin|Hstart)\s\(kA/m\)\s+([0-9\-\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Extracts the ending field in kA/m (of the first branch). The measurement
-        # finally stops at the starting field.
-        Quantity(
-            'Hend',
-            r'#\s(?:Hmax|Hend)\s\(kA/m\)\s+([0-9\-\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Extracts the number of points per branch.
-        Quantity('Pts/branch', r'#\spts\./branch\s+([0-9]+)', repeats=False, dtype=int),
-        # Extracts the time per point in seconds.
-        Quantity(
-            'Time/pt', r'#\stime/pt\.\s\(s\)\s+([0-9\.]+)', repeats=False, dtype=float
-        ),
-        # Extracts the delay time (equilibration tima after a new field) in seconds.
-        Quantity(
-            'Delay time', r'#\sdt\s\(s\)\s+([0-9\.]+)', repeats=False, dtype=float
-        ),
-        # Extracts the number of cycles/measurement repetitions.
-        Quantity('nCycles', r'#\snCycles\s+([0-9]+)', repeats=False, dtype=int),
-        # Extracts the current/last cycle number.
-        Quantity('Cycle', r'#\sCycle\s+([0-9]+)', repeats=False, dtype=int),
-        # Should only extract the first value of for example 2/3 being Cycle/nCycles
-        # TODO: Implement this for all modes (e.q. Raster mode)
-        # Extracts everything between Comment and the next "Meas. type" or "----";
-        # non-greedy match
-        Quantity(
-            'Comment',
-            r'#\sComment\s+(.*?)(?=\n#\sMeas\.\stype|\n#\s-{4,})',
-            repeats=False,
-            dtype=str,
-            flags=re.DOTALL,
-        ),
-        ## Optional quantities, depending on the measurement type
-        # Extracts the stopping field in kA/m. Only present in FORC and Minor
-        # loops measurements.
-        Quantity(
-            'Hstop', r'#\sHstop\s\(kA/m\)\s+([0-9\-\.]+)', repeats=False, dtype=float
-        ),
-        # Extracts the wait time between subsequent measurements in seconds. Only
-        # present in Scheduled measurements.
-        Quantity(
-            'Wait time', r'#\swait\s\(s\)\s+([0-9\.]+)', repeats=False, dtype=float
-        ),
-        # Extracts the number of scheduled measurements. Only present in Scheduled
-        # measurements.
-        Quantity('nSched', r'#\snSched\s+([0-9]+)', repeats=False, dtype=int),
-        # Extracts the number of minor loops. Only present in Minor loops and FORC
-        # measurements. TODO: test if this works for FORC measurements
-        Quantity(
-            'nMinorLoops_nFORCs', r'#\snMinorLoops\s+([0-9]+)', repeats=False, dtype=int
-        ),
-        # Extracts the number of X raster points. Only present in Raster measurements.
-        Quantity('nX', r'#\snX\s+([0-9]+)', repeats=False, dtype=int),
-        # Extracts the number of Y raster points. Only present in Raster measurements.
-        Quantity('nY', r'#\snY\s+([0-9]+)', repeats=False, dtype=int),
-        # Extracts total X raster step size in mm. Only present in Raster measurements.
-        Quantity(
-            'DeltaX',
-            r'#\s(?:DeltaX|dx)\s\(mm\)\s+([0-9\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Extracts total Y raster step size in mm. Only present in Raster measurements.
-        Quantity(
-            'DeltaY',
-            r'#\s(?:DeltaY|dy)\s\(mm\)\s+([0-9\.]+)',
-            repeats=False,
-            dtype=float,
-        ),
-        # Exracts the current raster position in X. Only present in Raster measurements.
-        Quantity(
-            'X',
-            r'#\sRaster\s+\(([0-9]+),[0-9]+\)/\([0-9]+,[0-9]+\)',
-            repeats=False,
-            dtype=str,
-        ),
-        # Exracts the current raster position in Y. Only present in Raster measurements.
-        Quantity(
-            'Y',
-            r'#\sRaster\s+\([0-9]+,([0-9]+)\)/\([0-9]+,[0-9]+\)',
-            repeats=False,
-            dtype=str,
-        ),
-        # Extracts boolean information if a raster scan should be averaged at the end.
-        # Only present in Raster measurements.
-        Quantity(
-            'Avg. raster',
-            r'#\savg\.\sraster\s+([a-zA-Z0-9]+)',
-            repeats=False,
-            dtype=str,
-        ),
-    ]
-)
+# Header dialect of files written before 2025 (Hmin/Hmax, dx/dy, `Cycle 2/2`, no UUID)
+PRE_2025 = 'pre-2025'
+# Header dialect of files written since 2025 (UUID, Device, Hstart/Hend, DeltaX/DeltaY)
+SINCE_2025 = '2025'
+# Header dialect of VMOKE files (`key<tabs>value` lines without `#`)
+VMOKE = 'VMOKE'
 
-"""
-# This is the experimental data parser for LMOKE and VMOKE measurements.
-# The experimental data is extracted using regular expressions
-# (The tabular parser did not work).
-# The data is then stored in a schema object.
-"""
-experimental_data_parser = DataTextParser(
-    quantities=[
-        Quantity(
-            'Longitudinal magnetic field',
-            r'([-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)\s+[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?',
-            repeats=True,
-            dtype=float,
-        ),
-        Quantity(
-            'Longitudinal detector signal',
-            r'[-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?\s+([-+]?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)',
-            repeats=True,
-            dtype=float,
-        ),
-    ]
-)
+# Keys which span several lines, mapped to the keys terminating them
+MULTILINE_KEYS = {'Comment': ('Meas. type', 'Measurement Method')}
+
+
+class HeaderQuantity:
+    """
+    A metadata quantity of the LMOKE header.
+
+    Arguments:
+        name: str
+            The name the quantity is accessed with.
+        keys: tuple[str, ...]
+            The header keys of the quantity in the different dialects.
+        pattern: str, optional
+            Regular expression with one group extracting the value from the header
+            value. If not given, the stripped header value is used.
+        dtype: type
+            The type the extracted value is converted to.
+    """
+
+    def __init__(self, name: str, keys: tuple, pattern: str = None, dtype=str):
+        self.name = name
+        self.keys = keys
+        self.pattern = re.compile(pattern) if pattern is not None else None
+        self.dtype = dtype
+
+    def convert(self, value: str):
+        """Extracts and converts the quantity from its header value."""
+        if self.pattern is not None:
+            match = self.pattern.search(value)
+            if match is None:
+                return None
+            value = match.group(1)
+        try:
+            return self.dtype(value.strip())
+        except ValueError:
+            return None
+
+
+header_quantities = [
+    ## General (most important) metadata
+    # Extracts the first and last name of the user
+    HeaderQuantity('User', ('User',), r'([A-Z][a-z]+\s[A-Z][a-z]+)'),
+    # Extracts the sample name, E for External, Z for Z400 and P for Prevac
+    HeaderQuantity('Sample', ('Sample', 'Charge'), r'([EZP]?\d{4}_\d{4}_\d)'),
+    # Extracts the sample state, typically "as made", "after FC" or "after IB"
+    HeaderQuantity('Sample State', ('State', 'Sample State'), r'([a-zA-Z\s]+)'),
+    # Extracts the UUID of the measurement likely consisting of the experiment and
+    # a measurement number
+    HeaderQuantity('UUID', ('UUID',), r'([a-zA-Z0-9]+)'),
+    ## Important measurement quantities for EVERY measurement
+    # Extracts the measurement type, e.g. "Hysteresis", "Minor loops", "Raster" etc
+    HeaderQuantity(
+        'Meas. type', ('Meas. type', 'Measurement Method'), r'([a-zA-Z_\-\.]+)'
+    ),
+    # Extracts the profile name during the measurement. Can be any profile txt,
+    # which can be altered later or during the measurement. Not very informative.
+    HeaderQuantity('Profile', ('Profile',), r'([a-zA-Z0-9_\-\.]+)'),
+    # Extracts the sample angle in degrees. Typically 0, sometimes 90 or 45 but can
+    # be any angle. Measured according to sputter deposition direction vs plane of
+    # incidence in direction of light.
+    HeaderQuantity(
+        'Sample angle',
+        ('angle (deg)', 'Sample angle (deg)', 'Sample Angle'),
+        r'([-0-9\.]+)',
+        dtype=float,
+    ),
+    # Extracts the device used for the measurement, e.g. "LMOKE" or "VMOKE"
+    HeaderQuantity('Device', ('Device',), r'([a-zA-Z0-9\s]+)'),
+    # Extracts the field angle in degrees, relative to the plane of incidence.
+    # For LMOKE always 0, for VMOKE mostly 0 and 90.
+    HeaderQuantity(
+        'Field angle',
+        ('Field angle (deg)', 'Magnetic Field Angle'),
+        r'([-0-9\.]+)',
+        dtype=float,
+    ),
+    # Extracts the temperature in Kelvin. Typically room temperature (300 K) as not
+    # yet measured.
+    HeaderQuantity('Temperature', ('Temperature (K)',), dtype=float),
+    # Extracts the calibration file used for the measurement. Typically "default"
+    # or "none". Not yet used.
+    HeaderQuantity('Calibration', ('Calibration',), r'([a-zA-Z0-9_\-\.]+)'),
+    # Extracts the polarization of the light used for the measurement. Typically
+    # "s" for LMOKE and "p" for VMOKE.
+    HeaderQuantity('Polarization', ('Polarization',), r'([spSP]+)'),
+    # Extracts the starting field in kA/m.
+    HeaderQuantity('Hstart', ('Hmin (kA/m)', 'Hstart (kA/m)'), dtype=float),
+    # Extracts the ending field in kA/m (of the first branch). The measurement
+    # finally stops at the starting field.
+    HeaderQuantity('Hend', ('Hmax (kA/m)', 'Hend (kA/m)'), dtype=float),
+    # Extracts the number of points per branch.
+    HeaderQuantity('Pts/branch', ('pts./branch',), dtype=int),
+    # Extracts the time per point in seconds.
+    HeaderQuantity('Time/pt', ('time/pt. (s)',), dtype=float),
+    # Extracts the delay time (equilibration tima after a new field) in seconds.
+    HeaderQuantity('Delay time', ('dt (s)',), dtype=float),
+    # Extracts the number of cycles/measurement repetitions.
+    HeaderQuantity('nCycles', ('nCycles',), dtype=int),
+    # Extracts the current/last cycle number. Only the first value of for example
+    # 2/3 being Cycle/nCycles is extracted.
+    HeaderQuantity('Cycle', ('Cycle',), r'([0-9]+)', dtype=int),
+    ## Optional quantities, depending on the measurement type
+    # Extracts the stopping field in kA/m. Only present in FORC and Minor
+    # loops measurements.
+    HeaderQuantity('Hstop', ('Hstop (kA/m)',), dtype=float),
+    # Extracts the wait time between subsequent measurements in seconds. Only
+    # present in Scheduled measurements.
+    HeaderQuantity('Wait time', ('wait (s)',), dtype=float),
+    # Extracts the number of scheduled measurements. Only present in Scheduled
+    # measurements.
+    HeaderQuantity('nSched', ('nSched',), dtype=int),
+    # Extracts the number of minor loops. Only present in Minor loops and FORC
+    # measurements. TODO: test if this works for FORC measurements
+    HeaderQuantity('nMinorLoops', ('nMinorLoops',), dtype=int),
+    # Extracts the number of X raster points. Only present in Raster measurements.
+    HeaderQuantity('nX', ('nX',), dtype=int),
+    # Extracts the number of Y raster points. Only present in Raster measurements.
+    HeaderQuantity('nY', ('nY',), dtype=int),
+    # Extracts total X raster step size in mm. Only present in Raster measurements.
+    HeaderQuantity('DeltaX', ('dx (mm)', 'DeltaX (mm)'), dtype=float),
+    # Extracts total Y raster step size in mm. Only present in Raster measurements.
+    HeaderQuantity('DeltaY', ('dy (mm)', 'DeltaY (mm)'), dtype=float),
+    # Exracts the current raster position in X. Only present in Raster measurements.
+    HeaderQuantity('X', ('Raster',), r'\(([0-9]+),[0-9]+\)', dtype=int),
+    # Exracts the current raster position in Y. Only present in Raster measurements.
+    HeaderQuantity('Y', ('Raster',), r'\([0-9]+,([0-9]+)\)', dtype=int),
+    # Extracts boolean information if a raster scan should be averaged at the end.
+    # Only present in Raster measurements.
+    HeaderQuantity('Avg. raster', ('avg. raster',), r'([a-zA-Z0-9]+)'),
+]
+header_quantities = {quantity.name: quantity for quantity in header_quantities}
+header_keys = {key for quantity in header_quantities.values() for key in quantity.keys}
+
+
+class LMOKEHeader:
+    """
+    Key-value index of the metadata header of an LMOKE measurement file.
+
+    The `# key<tabs>value` lines (`key<tabs>value` for VMOKE) are tokenised once. Keys
+    listed in `MULTILINE_KEYS` (i.e. the comment) collect all following lines until
+    their terminating keys. The dialect of the header is recognised from its keys.
+
+    Arguments:
+        metadata_content: str
+            The metadata header of the LMOKE file (see `split_lmoke_content`).
+    """
+
+    def __init__(self, metadata_content: str):
+        self.entries = {}
+        self.multiline_entries = {}
+
+        multiline_key = None
+        commented = False
+        for line in metadata_content.splitlines():
+            if not line.strip():
+                continue
+            commented |= line.startswith('#')
+            key, value = self.tokenise(line)
+            if multiline_key is not None:
+                if key not in MULTILINE_KEYS[multiline_key]:
+                    self.multiline_entries[multiline_key].append(
+                        line.lstrip('# ').strip()
+                    )
+                    continue
+                multiline_key = None
+            if key in MULTILINE_KEYS and key not in self.multiline_entries:
+                multiline_key = key
+                self.multiline_entries[key] = [value] if value else []
+            self.entries.setdefault(key, value)
+
+        if not commented and self.entries:
+            self.dialect = VMOKE
+        elif 'UUID' in self.entries:
+            self.dialect = SINCE_2025
+        else:
+            self.dialect = PRE_2025
+
+    @staticmethod
+    def tokenise(line: str) -> tuple[str, str]:
+        """Splits a `# key<tabs>value` header line into its key and value."""
+        parts = re.split(r'\t+|\s{2,}', line.lstrip('#').strip(), maxsplit=1)
+        if len(parts) == 1:
+            # key and value may be separated by a single space only
+            for key in header_keys:
+                if parts[0].startswith(f'{key} '):
+                    return key, parts[0][len(key) :].strip()
+            return ' '.join(parts[0].split()), ''
+        return ' '.join(parts[0].split()), parts[1].strip()
+
+    def get(self, name: str):
+        """
+        Returns the converted value of the header quantity `name` or None if the
+        quantity is not present in the header.
+        """
+        quantity = header_quantities[name]
+        for key in quantity.keys:
+            if key in self.entries:
+                return quantity.convert(self.entries[key])
+        return None
+
+    def get_multiline(self, key: str):
+        """Returns the lines of a multi-line entry joined by newlines or None."""
+        if key not in self.multiline_entries:
+            return None
+        return '\n'.join(self.multiline_entries[key])
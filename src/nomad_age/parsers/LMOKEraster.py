@@ -0,0 +1,224 @@
+import fnmatch
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy
+from nomad.datamodel import EntryArchive
+
+from nomad_age.parsers.LMOKEparser import (
+    LMOKEHeader,
+    get_lmoke_datetime,
+    get_lmoke_position,
+    read_lmoke_file,
+    read_lmoke_header,
+)
+from nomad_age.schema_packages.LMOKEandVMOKESchema import (
+    LMOKEandVMOKESchema,
+    LMOKERasterMap,
+)
+from nomad_age.utils.utils import create_archive
+
+"""
+# Raster measurements produce one LMOKE file per position. The files of a raster run
+# are grouped by sample, raster profile and geometry (from their headers only) and
+# assembled into a single LMOKERasterMap entry by the measurement completing the run.
+# The headers of a directory are read once per state of its LMOKE files, not once per
+# measurement. The evaluation of all positions is done in one batch by the
+# LMOKENormalizer.
+"""
+# Number of directories whose raster runs are kept (see `find_directory_runs`)
+RASTER_DIRECTORY_CACHE_SIZE = 16
+
+
+def get_raster_key(header: LMOKEHeader):
+    """
+    Returns the key grouping the measurements of a raster (sample, raster profile and
+    geometry) or None if the header does not belong to a raster measurement.
+    """
+    meas_type = header.get('Meas. type') or ''
+    if 'raster' not in meas_type.lower():
+        return None
+    if not header.get('nX') or not header.get('nY'):
+        return None
+    return (
+        header.get('Sample'),
+        header.get('Profile'),
+        header.get('nX'),
+        header.get('nY'),
+        header.get('DeltaX'),
+        header.get('DeltaY'),
+    )
+
+
+def split_raster_runs(
+    files: list[str], positions: list[Optional[tuple[int, int]]], n_positions: int
+) -> list[list[str]]:
+    """
+    Splits the measurements of a raster key (in acquisition order) into runs. A run
+    ends with its `n_positions`-th measurement or before a position it already has,
+    so an aborted run does not shift the runs after it. Measurements without a
+    position (files before 2025 not named by position) can only be split by count.
+
+    Returns:
+    list[list[str]]: The complete runs.
+    """
+    runs, run, seen = [], [], set()
+    for file, position in zip(files, positions):
+        if len(run) == n_positions or (position is not None and position in seen):
+            run, seen = [], set()
+        run.append(file)
+        seen.add(position)
+        if len(run) == n_positions:
+            runs.append(run)
+    return runs
+
+
+def is_lmoke_file(entry: os.DirEntry) -> bool:
+    return entry.is_file() and fnmatch.fnmatch(entry.name, '*LMOKE*.txt')
+
+
+def get_directory_state(directory: str) -> tuple:
+    """
+    Returns the name, size and modification time of the LMOKE files of a directory,
+    which change when a file is added, removed or rewritten in place.
+    """
+    state = []
+    for entry in os.scandir(directory or '.'):
+        if is_lmoke_file(entry):
+            stat = entry.stat()
+            state.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(state))
+
+
+@functools.lru_cache(maxsize=RASTER_DIRECTORY_CACHE_SIZE)
+def find_directory_runs(directory: str, state: tuple) -> dict[str, list[str]]:
+    """
+    Finds the complete raster runs among the LMOKE files of a directory. The result
+    is kept for the state of its LMOKE files (see `get_directory_state`), so the
+    headers are read once for all measurements of a directory.
+
+    Returns:
+    dict[str, list[str]]: The files of each run in acquisition order, by its last
+        file.
+    """
+    groups = {}
+    for entry in os.scandir(directory or '.'):
+        if not is_lmoke_file(entry):
+            continue
+        header = read_lmoke_header(entry.path)
+        raster_key = get_raster_key(header)
+        if raster_key is None:
+            continue
+        path = os.path.join(directory, entry.name)
+        groups.setdefault(raster_key, []).append(
+            (get_lmoke_datetime(path), path, get_lmoke_position(header, path))
+        )
+
+    runs = {}
+    for raster_key, measurements in groups.items():
+        measurements.sort(key=lambda measurement: measurement[:2])
+        _, _, nX, nY, _, _ = raster_key
+        for run in split_raster_runs(
+            [path for _, path, _ in measurements],
+            [position for _, _, position in measurements],
+            nX * nY,
+        ):
+            runs[run[-1]] = run
+    return runs
+
+
+def find_raster_run(mainfile: str):
+    """
+    Finds the files of the raster run `mainfile` belongs to among the LMOKE files in
+    its directory (see `find_directory_runs`).
+
+    Parameters:
+    mainfile (str): The path to an LMOKE file of a raster measurement.
+
+    Returns:
+    list[str]: The files of the run in acquisition order, if the run is complete and
+        `mainfile` is its last measurement, otherwise None.
+    """
+    directory = os.path.dirname(mainfile)
+    runs = find_directory_runs(directory, get_directory_state(directory))
+    return runs.get(os.path.join(directory, os.path.basename(mainfile)))
+
+
+def assemble_raster_map(
+    measurements: list[LMOKEandVMOKESchema], files: list[str]
+) -> LMOKERasterMap:
+    """
+    Assembles the measurements of a raster run into a single LMOKERasterMap. The
+    measurement data are stacked (one row per position, padded with NaN). Positions
+    missing in the headers (files before 2025) follow from the acquisition order,
+    scanning X first; positions counted from 0 are shifted to the 1-based index.
+
+    Parameters:
+    measurements (list[LMOKEandVMOKESchema]): The measurements in acquisition order.
+    files (list[str]): The paths of the measurement files.
+
+    Returns:
+    LMOKERasterMap: The raster map holding the data of all positions.
+
+    Raises:
+    ValueError: If a position is outside of the raster.
+    """
+    first = measurements[0]
+    raster_map = LMOKERasterMap(
+        sample=first.sample,
+        datetime=first.datetime,
+        nX=first.nX,
+        nY=first.nY,
+        DeltaX=first.DeltaX,
+        DeltaY=first.DeltaY,
+        avg_raster=first.avg_raster,
+        measurements=[os.path.basename(file) for file in files],
+    )
+
+    order = numpy.arange(len(measurements))
+    X = numpy.array([measurement.X or 0 for measurement in measurements])
+    Y = numpy.array([measurement.Y or 0 for measurement in measurements])
+    if not X.any() and not Y.any():
+        X, Y = order % first.nX + 1, order // first.nX + 1
+    elif X.min() == 0 or Y.min() == 0:
+        # positions counted from 0 are stored 1-based, like the file names
+        X, Y = X + 1, Y + 1
+    if X.min() < 1 or X.max() > first.nX or Y.min() < 1 or Y.max() > first.nY:
+        raise ValueError(
+            f'Raster positions outside of the {first.nX} x {first.nY} raster'
+        )
+    raster_map.X = X
+    raster_map.Y = Y
+
+    n_points = max(measurement.magnetic_field.shape[0] for measurement in measurements)
+    magnetic_field = numpy.full((len(measurements), n_points), numpy.nan)
+    intensity = numpy.full((len(measurements), n_points), numpy.nan)
+    for row, measurement in enumerate(measurements):
+        n_measured = measurement.magnetic_field.shape[0]
+        magnetic_field[row, :n_measured] = measurement.magnetic_field.magnitude
+        intensity[row, :n_measured] = measurement.intensity.magnitude
+    raster_map.magnetic_field = magnetic_field
+    raster_map.intensity = intensity
+
+    return raster_map
+
+
+def create_raster_map(mainfile: str, archive: EntryArchive, logger) -> None:
+    """
+    Creates the LMOKERasterMap entry of the raster run if `mainfile` completes it.
+    The measurements of the run are parsed in parallel.
+    """
+    files = find_raster_run(mainfile)
+    if files is None:
+        return
+
+    with ThreadPoolExecutor() as executor:
+        measurements = list(executor.map(read_lmoke_file, files))
+    raster_map = assemble_raster_map(measurements, files)
+
+    # an unchanged map (e.g. on reprocessing) is not written again
+    file_name = f'{raster_map.sample}_raster_{raster_map.datetime}.archive.yaml'
+    if create_archive(raster_map, archive, file_name, overwrite=True):
+        logger.info(f'Created raster map {file_name} from {len(files)} measurements')
@@ -20,6 +20,12 @@ parser_entry_point = NewParserEntryPoint(
 
 class LMOKEParserEntryPoint(ParserEntryPoint):
     parameter: int = Field(0, description='Custom configuration parameter')
+    cache_directory: str = Field(
+        '', description='Directory of the result cache (empty: no caching)'
+    )
+    cache_max_size: int = Field(
+        2**30, description='Maximum size of the result cache in bytes'
+    )
 
     def load(self):
         from nomad_age.parsers.LMOKEparser import LMOKEParser
@@ -29,15 +35,53 @@ class LMOKEParserEntryPoint(ParserEntryPoint):
 
 lmoke_parser_entry_point = LMOKEParserEntryPoint(
     name='LMOKEParser',
-    description='LMOKE parser entry point configuration.',
-    mainfile_name_re=r'.*LMOKE.*\.txt',
-    mainfile_contents_re=r'#\s+Meas\.\s+type\s+',
-    # this is a regular expression that matches the contents of the mainfile
+    description='LMOKE and VMOKE parser entry point configuration.',
+    mainfile_name_re=r'.*(LMOKE|VMOKE).*\.txt',
+    # the contents are matched by sniffing the header (`LMOKEParser.is_mainfile`)
+)
+
+
+class LMOKEBundleParserEntryPoint(ParserEntryPoint):
+    max_workers: int = Field(
+        0, description='Number of worker processes parsing a bundle (0: all cores)'
+    )
+
+    def load(self):
+        from nomad_age.parsers.LMOKEbundle import LMOKEBundleParser
+
+        return LMOKEBundleParser(**self.dict())
+
+
+lmoke_bundle_parser_entry_point = LMOKEBundleParserEntryPoint(
+    name='LMOKEBundleParser',
+    description=(
+        'Parser entry point for bundles (*.lmoke.zip) of LMOKE/VMOKE files. Bundles '
+        'uploaded directly are extracted by NOMAD, their members are then parsed by '
+        'the LMOKEParser.'
+    ),
+    mainfile_name_re=r'.*\.lmoke\.zip',
+    mainfile_mime_re=r'application/(zip|x-zip-compressed)',
 )
 
 
 class FieldCoolingParserEntryPoint(ParserEntryPoint):
     parameter: int = Field(0, description='Custom configuration parameter')
+    cache_directory: str = Field(
+        '', description='Directory of the result cache (empty: no caching)'
+    )
+    cache_max_size: int = Field(
+        2**30, description='Maximum size of the result cache in bytes'
+    )
+    plot_max_points: int = Field(
+        2000,
+        description='Maximum number of points per trace of the plot (0: all points)',
+    )
+    tail_mode: bool = Field(
+        False,
+        description=(
+            'Only parse the rows appended to a log file since it was processed before'
+        ),
+    )
 
     def load(self):
         from nomad_age.parsers.field_cooling_parser import FieldCoolingParser
@@ -49,5 +93,33 @@ field_cooling_parser_entry_point = FieldCoolingParserEntryPoint(
     name='FieldCoolingParser',
     description='Field Cooling parser entry point configuration.',
     mainfile_name_re=r'.*\.(DAT|dat)$',
-    mainfile_contents_re=r'#\s+FC-Protokoll\s+#',
+    # the contents are matched by sniffing the header (`FieldCoolingParser.is_mainfile`)
+)
+
+
+class IonBombardmentParserEntryPoint(ParserEntryPoint):
+    cache_directory: str = Field(
+        '', description='Directory of the result cache (empty: no caching)'
+    )
+    cache_max_size: int = Field(
+        2**30, description='Maximum size of the result cache in bytes'
+    )
+    plot_max_points: int = Field(
+        2000,
+        description='Maximum number of points per trace of the plot (0: all points)',
+    )
+
+    def load(self):
+        from nomad_age.parsers.ion_bombardment_parser import IonBombardmentParser
+
+        return IonBombardmentParser(**self.dict())
+
+
+# Not registered in pyproject.toml yet, the log format is provisional (see
+# `ion_bombardment_parser`)
+ion_bombardment_parser_entry_point = IonBombardmentParserEntryPoint(
+    name='IonBombardmentParser',
+    description='Helium Ion Bombardment parser entry point configuration.',
+    mainfile_name_re=r'.*\.(DAT|dat)$',
+    # the contents are matched by sniffing the banner (`InstrumentLogParser`)
 )
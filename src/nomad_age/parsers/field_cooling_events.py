@@ -0,0 +1,124 @@
+import numpy as np
+
+"""
+# Vacuum events (e.g. Penning spikes during the plateau) are detected while the pressure
+# channels of a field cooling log are parsed. The detector is fed the parsed columns in
+# chunks of any size and only keeps the baseline window and the open event between
+# chunks, so its memory is bounded independently of the length of the log.
+"""
+# Number of preceding samples of the rolling (median) baseline, odd
+BASELINE_WINDOW = 301
+# Ratio of pressure to baseline above which the vacuum is considered degraded
+EVENT_THRESHOLD = 2.0
+
+
+class PressureEventDetector:
+    """
+    Streaming detector of pressure events in a pressure channel. An event is a run
+    of samples whose pressure exceeds `threshold` times the rolling baseline, which
+    is the median of the `window` preceding samples.
+
+    Arguments:
+        window: int
+            The number of preceding samples of the baseline (odd).
+        threshold: float
+            The ratio of pressure to baseline above which a sample belongs to an
+            event.
+    """
+
+    def __init__(
+        self, window: int = BASELINE_WINDOW, threshold: float = EVENT_THRESHOLD
+    ):
+        self.window = window | 1
+        self.threshold = threshold
+        self.history = None  # the last `window` samples
+        self.open_event = None  # the event still running at the end of the last chunk
+        self.events = []
+
+    def resume(self, pressure: np.ndarray, events: list[dict]) -> None:
+        """
+        Continues a detection after samples processed before (e.g. of a log parsed
+        before), without feeding them again.
+
+        Parameters:
+        pressure (numpy.ndarray): The pressure of the samples processed before, at
+            least the last `window` ones. No event may be running at their end.
+        events (list[dict]): The events found in these samples (see `finish`).
+        """
+        if pressure.size:
+            padding = np.full(max(self.window - pressure.size, 0), pressure[0])
+            self.history = np.concatenate([padding, pressure[-self.window :]])
+        self.open_event = None
+        self.events = list(events)
+
+    def get_baseline(self, pressure: np.ndarray) -> np.ndarray:
+        """Returns the baseline of each sample of a chunk and keeps the history."""
+        from scipy.ndimage import median_filter
+
+        if self.history is None:
+            self.history = np.full(self.window, pressure[0])
+        values = np.concatenate([self.history, pressure])
+        self.history = values[-self.window :]
+
+        # The centred median at j covers the samples j - k ... j + k, so the median
+        # of the `window` samples before sample i is the one at i - k - 1
+        half_window = self.window // 2
+        median = median_filter(values, size=self.window, mode='nearest')
+        start = self.window - half_window - 1
+        return median[start : start + pressure.size]
+
+    def update(self, time: np.ndarray, pressure: np.ndarray) -> None:
+        """
+        Feeds the next chunk of samples to the detector.
+
+        Parameters:
+        time (numpy.ndarray): The time of the samples [s].
+        pressure (numpy.ndarray): The pressure of the samples.
+        """
+        if pressure.size == 0:
+            return
+        baseline = self.get_baseline(pressure)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            above = pressure > self.threshold * baseline
+
+        # The runs of samples above the threshold, the end is exclusive
+        edges = np.flatnonzero(np.diff(np.r_[False, above, False].astype(np.int8)))
+        open_event, self.open_event = self.open_event, None
+        if open_event is not None and not above[0]:
+            self.events.append(open_event)
+            open_event = None
+
+        for start, end in zip(edges[::2], edges[1::2]):
+            peak = start + int(pressure[start:end].argmax())
+            if start == 0 and open_event is not None:
+                event = open_event
+            else:
+                event = dict(
+                    start=float(time[start]),
+                    baseline=float(baseline[start]),
+                    peak_time=float(time[peak]),
+                    peak_pressure=float(pressure[peak]),
+                )
+            if pressure[peak] > event['peak_pressure']:
+                event.update(
+                    peak_time=float(time[peak]), peak_pressure=float(pressure[peak])
+                )
+            event['end'] = float(time[end - 1])
+
+            if end == pressure.size:
+                self.open_event = event
+            else:
+                self.events.append(event)
+
+    def finish(self) -> list[dict]:
+        """
+        Closes the event still running at the end of the log.
+
+        Returns:
+        list[dict]: The events with their `start`, `end`, `peak_time`,
+            `peak_pressure` and the `baseline` at their start.
+        """
+        if self.open_event is not None:
+            self.events.append(self.open_event)
+            self.open_event = None
+        return self.events
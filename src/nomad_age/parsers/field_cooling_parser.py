@@ -1,79 +1,71 @@
 import os
-import re
-import sys
-from datetime import datetime, timedelta
+from datetime import timedelta
+from typing import Optional
 
 import numpy as np
-import plotly.graph_objects as go
-from nomad.config import config
 from nomad.datamodel import EntryArchive
 from nomad.datamodel.metainfo.plot import PlotlyFigure
-from nomad.parsing import MatchingParser
-from plotly.subplots import make_subplots
 
-from nomad_age.schema_packages.age_schema import (
-    AGE_RawFile,
-    AGE_Sample,
-    AGE_Sample_Reference,
+from nomad_age.parsers.field_cooling_events import PressureEventDetector
+from nomad_age.parsers.instrument_log import (
+    DATA_BLOCK_SIZE,
+    QUALITY_COUNTS,
+    ColumnBuffer,
+    InstrumentLogParser,
+    LogColumn,
+    LogField,
+    LogFormat,
+    add_sample_references,
+    minmax_indices,
+    parse_date,
+    read_log_data,
+    read_log_rows,
+    read_log_stream,
+    read_sample_names,
 )
-from nomad_age.schema_packages.field_cooling_schema import AGE_FieldCooling
-from nomad_age.utils.utils import (
-    create_archive,
-    find_existing_AGE_sample,
-    get_entry_id,
-    get_hash_ref,
-)
-
-configuration = config.get_plugin_entry_point(
-    'nomad_age.parsers:field_cooling_parser_entry_point'
+from nomad_age.schema_packages.age_schema import AGE_DataQuality
+from nomad_age.schema_packages.field_cooling_schema import (
+    AGE_FieldCooling,
+    AGE_FieldCoolingPhase,
+    AGE_PressureEvent,
 )
+from nomad_age.utils.hdf5 import get_offloaded_array
+from nomad_age.utils.utils import read_archive_data
 
 
-def update_entry(entry, eid, archive, logger):
-    """Update the entries with the new archive."""
-    from nomad import files
-    from nomad.search import search
-
-    query = {
-        'entry_id': eid,
-    }
-    search_result = search(
-        owner='all', query=query, user_id=archive.metadata.main_author.user_id
-    )
-    new_entry_dict = entry.m_to_dict()
-    res = search_result.data[0]
-    try:
-        # Open Archives
-        with files.UploadFiles.get(upload_id=res['upload_id']).read_archive(
-            entry_id=res['entry_id']
-        ) as ar:
-            entry_id = res['entry_id']
-            entry_data = ar[entry_id]['data']
-            entry_data.pop('m_def', None)
-            new_entry_dict.update(entry_data)
-    except Exception as e:
-        logger.error('Error in processing data: ', e)
-    new_entry = getattr(sys.modules[__name__], type(entry).__name__).m_from_dict(
-        new_entry_dict
-    )
-    return new_entry
+def plot_field_cooling_data(
+    time,
+    measured_temperature,
+    target_temperature,
+    pirani_pressure,
+    penning_pressure,
+    max_points: int = None,
+) -> PlotlyFigure:
+    """
+    Plots the temperatures and the Penning pressure of a field cooling log. With
+    `max_points`, each trace is decimated to at most this number of points (see
+    `minmax_indices`) before the figure is built.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
 
+    time = np.asarray(time)
 
-def parse_date(date_str: str) -> datetime:
-    # Replace any sequence of spaces or tabs with a single space
-    cleaned = re.sub(r'[ \t]+', ' ', date_str.strip())
-    return datetime.strptime(cleaned, '%Y.%m.%d %H:%M:%S')
+    def decimate(values):
+        values = np.asarray(values)
+        indices = minmax_indices(values, max_points)
+        return time[indices], values[indices]
 
+    time_measured, measured_temperature = decimate(measured_temperature)
+    time_target, target_temperature = decimate(target_temperature)
+    time_penning, penning_pressure = decimate(penning_pressure)
 
-def plot_field_cooling_data(
-    time, measured_temperature, target_temperature, pirani_pressure, penning_pressure
-) -> PlotlyFigure:
     fig = make_subplots(specs=[[{'secondary_y': True}]])
 
     # Temperature traces
     fig.add_trace(
         go.Scatter(
-            x=time,
+            x=time_measured,
             y=measured_temperature,
             mode='lines',
             name='Measured Temperature',
@@ -83,7 +75,7 @@ def plot_field_cooling_data(
     )
     fig.add_trace(
         go.Scatter(
-            x=time,
+            x=time_target,
             y=target_temperature,
             mode='lines',
             name='Target Temperature',
@@ -95,7 +87,7 @@ def plot_field_cooling_data(
 
     fig.add_trace(
         go.Scatter(
-            x=time,
+            x=time_penning,
             y=penning_pressure,
             mode='lines',
             name='Penning Pressure',
@@ -129,8 +121,584 @@ def plot_field_cooling_data(
     return fig
 
 
-class FieldCoolingParser(MatchingParser):
+# Phases of a field cooling process, in order
+PHASES = ('heating', 'plateau', 'cooling', 'final')
+# Maximum deviation of the measured from the final target temperature of a settled
+# process [°C]
+SETTLED_TOLERANCE = 2.0
+# Maximum deviation of a regularly sampled time axis from its grid, relative to the step
+REGULAR_GRID_TOLERANCE = 1e-3
+# Size of the content before the recorded offset read to check the last row (tail mode)
+TAIL_CHECK_SIZE = 4096
+
+FIELD_COOLING_LOG = LogFormat(
+    banner=rb'#\s+FC-Protokoll\s+#',
+    fields=(
+        LogField('samples', ('Probenname',)),
+        LogField('datetime', ('Datum',), dtype=parse_date),
+        LogField('blocking_temperature', ('T(Blocking)',), dtype=float),
+        LogField('plateau_duration', ('Plateuzeit',), dtype=float),
+        # circumventing issues with the umlaut of Abkühlrate
+        LogField('cooling_rate', ('hlrate [',), dtype=float),
+    ),
+    columns=(
+        LogColumn('time', 's'),
+        LogColumn('measured_temperature', '°C'),
+        LogColumn('target_temperature', '°C'),
+        LogColumn('pirani_pressure', 'mbar'),
+        LogColumn('penning_pressure', 'mbar'),
+    ),
+)
+# Column of each pressure channel (gauge) checked for vacuum events, by channel
+PRESSURE_COLUMNS = {'pirani': 3, 'penning': 4}
+
+
+def get_regular_grid(values: np.ndarray, tolerance: float = REGULAR_GRID_TOLERANCE):
+    """
+    Checks if a series (e.g. the time axis) is regularly sampled.
+
+    Parameters:
+    values (numpy.ndarray): The series.
+    tolerance (float): The maximum deviation from the regular grid, relative to the
+        step.
+
+    Returns:
+    tuple[float, float] | None: The start and step of the grid, or None if the
+        series is not regularly sampled (or has less than two points).
+    """
+    if values.size < 2:
+        return None
+    start = values[0]
+    step = (values[-1] - start) / (values.size - 1)
+    if step == 0:
+        return None
+    deviation = np.abs(values - (start + step * np.arange(values.size))).max()
+    if deviation > tolerance * abs(step):
+        return None
+    return float(start), float(step)
+
+
+def find_phases(
+    target_temperature: np.ndarray, measured_temperature: np.ndarray = None
+) -> list[tuple[str, int, int]]:
+    """
+    Segments a field cooling process into its heating, plateau, cooling and final
+    phase. The plateau is where the target temperature is at its maximum, the
+    heating before it. The cooling follows the plateau while the target temperature
+    ramps down to its final value, and lasts until the measured temperature has
+    settled at it (within `SETTLED_TOLERANCE`) if it does so within the log. The
+    rest of the log (e.g. the free cooling once the heater is switched off, with a
+    final target of 0 °C) is the final phase.
+
+    Parameters:
+    target_temperature (numpy.ndarray): The target temperature of the process.
+    measured_temperature (numpy.ndarray, optional): The measured temperature of the
+        process.
+
+    Returns:
+    list[tuple[str, int, int]]: The name, first and end (exclusive) index of each
+        phase. Empty phases are omitted.
+    """
+    size = target_temperature.size
+    if size == 0:
+        return []
+    at_plateau = np.isclose(target_temperature, target_temperature.max())
+    plateau_start = int(at_plateau.argmax())
+    plateau_end = size - int(at_plateau[::-1].argmax())
+
+    # The ramp ends where the target temperature reaches its final value
+    final_temperature = target_temperature[-1]
+    at_final = np.isclose(target_temperature[plateau_end:], final_temperature)
+    cooling_end = plateau_end + int(at_final.argmax()) if at_final.size else size
+    if measured_temperature is not None and cooling_end < size:
+        # settled from the last deviating sample on, unless that is the last one
+        deviation = np.abs(measured_temperature[cooling_end:] - final_temperature)
+        unsettled = np.flatnonzero(~(deviation <= SETTLED_TOLERANCE))
+        if unsettled.size and unsettled[-1] < deviation.size - 1:
+            cooling_end += int(unsettled[-1]) + 1
+
+    boundaries = zip(
+        PHASES,
+        (0, plateau_start, plateau_end, cooling_end),
+        (plateau_start, plateau_end, cooling_end, size),
+    )
+    return [(name, start, end) for name, start, end in boundaries if end > start]
+
+
+def add_phases(
+    entry: AGE_FieldCooling,
+    time: np.ndarray,
+    measured_temperature: np.ndarray,
+    target_temperature: np.ndarray,
+) -> None:
+    """
+    Adds the phases of the process (see `find_phases`) as steps with their
+    statistics to the entry, and the summary of the achieved process parameters.
+    """
+    phases = {}
+    for name, start, end in find_phases(target_temperature, measured_temperature):
+        # a phase ends where the next one starts (or with the log)
+        last = min(end, time.size - 1)
+        measured = measured_temperature[start:end]
+        deviation = np.abs(measured - target_temperature[start:end])
+        duration = time[last] - time[start]
+        phase = AGE_FieldCoolingPhase(
+            name=name,
+            start=time[start],
+            end=time[last],
+            duration=duration,
+            mean_temperature=measured.mean(),
+            min_temperature=measured.min(),
+            max_temperature=measured.max(),
+            mean_deviation=deviation.mean(),
+            max_deviation=deviation.max(),
+        )
+        if duration > 0:
+            phase.rate = (
+                (measured_temperature[last] - measured_temperature[start])
+                / duration
+                * 60
+            )
+        if entry.datetime is not None:
+            phase.start_time = entry.datetime + timedelta(seconds=float(time[start]))
+        entry.steps.append(phase)
+        phases[name] = phase
+
+    if 'plateau' in phases:
+        plateau = phases['plateau']
+        entry.achieved_plateau_temperature = plateau.mean_temperature
+        entry.achieved_plateau_duration = plateau.duration
+        entry.plateau_max_deviation = plateau.max_deviation
+    if 'cooling' in phases and phases['cooling'].rate is not None:
+        entry.effective_cooling_rate = -phases['cooling'].rate
+
+    if entry.blocking_temperature is not None:
+        blocking_temperature = entry.blocking_temperature.to('°C').magnitude
+        above = measured_temperature[:-1] >= blocking_temperature
+        entry.time_above_blocking_temperature = np.diff(time)[above].sum() / 60
+
+
+def add_pressure_events(entry: AGE_FieldCooling, events: dict[str, list[dict]]) -> None:
+    """
+    Adds the pressure events of the gauges (see `PressureEventDetector`) to the entry
+    with the phase they started in, and the searchable summary of the vacuum.
+
+    Parameters:
+    entry (AGE_FieldCooling): The entry, with its phases already added.
+    events (dict[str, list[dict]]): The detected events by gauge (channel).
+    """
+    phases = [
+        (step.name, step.start.to('s').magnitude, step.end.to('s').magnitude)
+        for step in entry.steps
+        if isinstance(step, AGE_FieldCoolingPhase)
+    ]
+    pressure_events = []
+    for channel, channel_events in events.items():
+        for event in channel_events:
+            pressure_event = AGE_PressureEvent(
+                channel=channel,
+                start=event['start'],
+                end=event['end'],
+                duration=event['end'] - event['start'],
+                peak_time=event['peak_time'],
+                peak_pressure=event['peak_pressure'],
+                baseline_pressure=event['baseline'],
+            )
+            # a ratio to a zero (or negative) baseline has no meaning
+            if event['baseline'] > 0:
+                pressure_event.ratio = event['peak_pressure'] / event['baseline']
+            for name, start, end in phases:
+                if start <= event['start'] <= end:
+                    pressure_event.phase = name
+                    break
+            pressure_events.append(pressure_event)
+
+    # subsections can only be appended, so the events are ordered by start before
+    pressure_events.sort(key=lambda pressure_event: pressure_event.start)
+    for pressure_event in pressure_events:
+        entry.pressure_events.append(pressure_event)
+
+    entry.n_pressure_events = len(pressure_events)
+    entry.vacuum_degraded = bool(pressure_events)
+    entry.plateau_vacuum_degraded = any(
+        pressure_event.phase == 'plateau' for pressure_event in pressure_events
+    )
+    ratios = [
+        pressure_event.ratio
+        for pressure_event in pressure_events
+        if pressure_event.ratio is not None
+    ]
+    if ratios:
+        entry.max_pressure_ratio = max(ratios)
+
+
+def get_event_detectors() -> dict[str, PressureEventDetector]:
+    """Returns a pressure event detector for each pressure channel of the log."""
+    return {channel: PressureEventDetector() for channel in PRESSURE_COLUMNS}
+
+
+def update_event_detectors(
+    detectors: dict[str, PressureEventDetector], rows: np.ndarray
+) -> None:
+    """
+    Feeds the next (n, 5) rows of a log (in the units of the log) to the pressure
+    event detectors of its channels (see `get_event_detectors`).
+    """
+    for channel, detector in detectors.items():
+        detector.update(rows[:, 0], rows[:, PRESSURE_COLUMNS[channel]])
+
+
+def find_pressure_events(data: np.ndarray) -> dict[str, list[dict]]:
+    """
+    Detects the pressure events of each channel in the (n, 5) data of a log at once,
+    for data which was not fed to the detectors while it was parsed.
+    """
+    detectors = get_event_detectors()
+    update_event_detectors(detectors, data)
+    return {channel: detector.finish() for channel, detector in detectors.items()}
+
+
+def set_field_cooling_data(
+    entry: AGE_FieldCooling,
+    data: np.ndarray,
+    plot_max_points: int = None,
+    events: dict[str, list[dict]] = None,
+) -> None:
+    """
+    Sets the time series of an entry and derives the phases, the pressure events and
+    the plot from them. Phases and pressure events already derived are replaced.
+
+    Parameters:
+    entry (AGE_FieldCooling): The entry.
+    data (numpy.ndarray): The (n, 5) data of the log.
+    plot_max_points (int, optional): The maximum number of points of each trace of
+        the plot (see `plot_field_cooling_data`).
+    events (dict[str, list[dict]], optional): The pressure events detected while the
+        data was parsed (see `update_event_detectors`), detected in `data` if not
+        given.
+    """
+    entry.steps = [
+        step for step in entry.steps if not isinstance(step, AGE_FieldCoolingPhase)
+    ]
+    entry.pressure_events = []
+    if not data.size:
+        return
+
+    # The columns are contiguous (see `ColumnBuffer`), so the quantities and the
+    # plot get views of the parsed data without copies
+    columns = FIELD_COOLING_LOG.convert_columns(data, AGE_FieldCooling.m_def)
+    time = columns['time']
+    measured_temperature = columns['measured_temperature']
+    target_temperature = columns['target_temperature']
+    pirani_pressure = columns['pirani_pressure']
+    penning_pressure = columns['penning_pressure']
+    # Regularly sampled time axes are stored as start, step and count
+    regular_grid = get_regular_grid(time)
+    if regular_grid is None:
+        entry.time = time
+        entry.time_start = entry.time_step = entry.time_count = None
+    else:
+        entry.time = None
+        entry.time_start, entry.time_step = regular_grid
+        entry.time_count = time.size
+    if entry.datetime is not None:
+        entry.end_time = entry.datetime + timedelta(seconds=float(time[-1]))
+    entry.measured_temperature = measured_temperature
+    entry.target_temperature = target_temperature
+    entry.pirani_pressure = pirani_pressure
+    entry.penning_pressure = penning_pressure
+
+    add_phases(entry, time, measured_temperature, target_temperature)
+
+    if events is None:
+        events = find_pressure_events(data)
+    add_pressure_events(entry, events)
+
+    fig = plot_field_cooling_data(
+        time,
+        measured_temperature,
+        target_temperature,
+        pirani_pressure,
+        penning_pressure,
+        max_points=plot_max_points,
+    )
+    entry.figures = [
+        PlotlyFigure(label='Field Cooling Plot', figure=fig.to_plotly_json())
+    ]
+
+
+def read_field_cooling_file(
+    mainfile: str, plot_max_points: int = None
+) -> AGE_FieldCooling:
+    """
+    Reads a field cooling log file into a new AGE_FieldCooling (metadata, time series
+    and plot). The samples are only named (`lab_id`), their references are resolved
+    by the parser.
+
+    Parameters:
+    mainfile (str): The path to the field cooling log file.
+    plot_max_points (int, optional): The maximum number of points of each trace of
+        the plot (see `plot_field_cooling_data`). The time series keep all points.
+
+    Returns:
+    AGE_FieldCooling: The field cooling process of the log file.
+    """
+    entry = AGE_FieldCooling()
+    entry.data_file = os.path.basename(mainfile)  # the original log file
+
+    entry.instrument = 'Fieldcooling'
+    entry.location = 'BAHAMAS'
+
+    # The log is read in blocks, its content is never held in memory at once, and
+    # the pressure events are detected in each block as it is parsed
+    detectors = get_event_detectors()
+    with open(mainfile, 'rb') as f:
+        quality = dict.fromkeys(QUALITY_COUNTS, 0)
+        metadata_content, data, data_offset, data_rows = read_log_stream(
+            f,
+            FIELD_COOLING_LOG,
+            quality=quality,
+            on_rows=lambda rows: update_event_detectors(detectors, rows),
+        )
+    events = {channel: detector.finish() for channel, detector in detectors.items()}
+
+    header = FIELD_COOLING_LOG.read_header(metadata_content)
+    sample_names = []
+    if header.get('samples') is not None:
+        # Without sample names, the value is probably only a comment
+        sample_names, entry.description = read_sample_names(header['samples'])
+    for name in (
+        'datetime',
+        'blocking_temperature',
+        'plateau_duration',
+        'cooling_rate',
+    ):
+        if header.get(name) is not None:
+            setattr(entry, name, header[name])
+
+    if entry.datetime is not None:
+        name = f'FC_{header["datetime"]}'
+    else:
+        name = f'FC_{mainfile.split("/")[-1].split(".DAT")[0]}'
+    entry.name = name
+
+    set_field_cooling_data(entry, data, plot_max_points, events)
+    entry.data_offset, entry.data_rows = data_offset, data_rows
+    if data_rows:
+        entry.data_last_time = data[data_rows - 1, 0]
+    entry.data_quality = AGE_DataQuality(n_rows=data.shape[0], **quality)
+    add_sample_references(entry, sample_names)
+
+    return entry
+
+
+def resume_event_detectors(
+    entry: AGE_FieldCooling, data: np.ndarray
+) -> tuple[dict[str, PressureEventDetector], int]:
+    """
+    Resumes the pressure event detection of a log parsed before (tail mode) at the
+    last row no event of the entry runs across, so only the rows from there on are
+    fed to the detectors again instead of the whole log.
+
+    Parameters:
+    entry (AGE_FieldCooling): The entry of the log, with its pressure events.
+    data (numpy.ndarray): The (n, 5) complete rows of the log parsed before.
+
+    Returns:
+    tuple[dict[str, PressureEventDetector], int]: The resumed detectors and the
+        index of the first row to feed them.
+    """
+    time = data[:, 0]
+    n_rows = time.size
+    last_time = entry.data_last_time.to('s').magnitude
+
+    # The events by their first and last row; the rows after the last complete one
+    # (a final row still being written) are parsed again
+    events = []
+    for pressure_event in entry.pressure_events:
+        if pressure_event.channel not in PRESSURE_COLUMNS:
+            continue
+        event = dict(
+            start=pressure_event.start.to('s').magnitude,
+            baseline=pressure_event.baseline_pressure.to('mbar').magnitude,
+            peak_time=pressure_event.peak_time.to('s').magnitude,
+            peak_pressure=pressure_event.peak_pressure.to('mbar').magnitude,
+            end=pressure_event.end.to('s').magnitude,
+        )
+        start = n_rows
+        if event['start'] <= last_time:
+            start = int(np.abs(time - event['start']).argmin())
+        end = n_rows
+        if event['end'] < last_time:
+            end = int(np.abs(time - event['end']).argmin())
+        events.append((pressure_event.channel, event, start, end))
+
+    resume_row = n_rows
+    while True:
+        starts = [start for _, _, start, end in events if start < resume_row <= end]
+        if not starts:
+            break
+        resume_row = min(starts)
+
+    detectors = get_event_detectors()
+    for channel, detector in detectors.items():
+        detector.resume(
+            data[:resume_row, PRESSURE_COLUMNS[channel]],
+            [
+                event
+                for event_channel, event, _, end in events
+                if event_channel == channel and end < resume_row
+            ],
+        )
+    return detectors, resume_row
+
+
+def extend_field_cooling_entry(
+    entry: AGE_FieldCooling,
+    mainfile: str,
+    plot_max_points: int = None,
+    block_size: int = DATA_BLOCK_SIZE,
+) -> Optional[int]:
+    """
+    Extends an entry read from a log file that is still being written with the rows
+    appended since (tail mode). Only the log from the recorded `data_offset` on is
+    parsed and fed to the pressure event detectors (see `resume_event_detectors`);
+    the time series are extended and the phases and plot are derived again (see
+    `set_field_cooling_data`).
+
+    Parameters:
+    entry (AGE_FieldCooling): The entry of the log file, as written before (see
+        `read_generated_entry`).
+    mainfile (str): The path to the field cooling log file.
+    plot_max_points (int, optional): The maximum number of points of each trace of
+        the plot (see `plot_field_cooling_data`).
+    block_size (int): The size of the blocks the log is read in.
+
+    Returns:
+    Optional[int]: The number of rows appended to the entry, or None if the log was
+        not just appended to (e.g. replaced or truncated) and must be read again.
+    """
+    data_offset, data_rows = entry.data_offset, entry.data_rows
+    if not data_offset or not data_rows or entry.data_last_time is None:
+        return None
+    if os.path.getsize(mainfile) < data_offset:
+        return None
+    if entry.measured_temperature is None:
+        return None
+    previous = np.array(
+        [
+            entry.get_time().to('s').magnitude,
+            entry.measured_temperature.magnitude,
+            entry.target_temperature.magnitude,
+            entry.pirani_pressure.magnitude,
+            entry.penning_pressure.magnitude,
+        ]
+    )
+    if previous.shape[1] < data_rows:
+        return None
+
+    with open(mainfile, 'rb') as f:
+        # The last complete row must still be the last row of the entry, its time is
+        # compared as written (the time axis of the entry may be a snapped grid)
+        f.seek(max(data_offset - TAIL_CHECK_SIZE, 0))
+        tail = f.read(data_offset - f.tell())
+        last_row = read_log_data(
+            tail[tail.rfind(b'\n', 0, -1) + 1 :], FIELD_COOLING_LOG.n_columns
+        )
+        if (
+            last_row.shape[0] != 1
+            or last_row[0, 0] != entry.data_last_time.to('s').magnitude
+            or not np.array_equal(last_row[0, 1:], previous[1:, data_rows - 1])
+        ):
+            return None
+
+        # A final row without a newline is parsed again with the appended rows
+        estimate = data_rows / data_offset * (os.path.getsize(mainfile) - data_offset)
+        buffer = ColumnBuffer(
+            FIELD_COOLING_LOG.n_columns, data_rows + int(estimate * 1.02) + 1
+        )
+        buffer.extend(previous[:, :data_rows].T)
+        del previous
+        detectors, resume_row = resume_event_detectors(entry, buffer.data)
+        update_event_detectors(detectors, buffer.data[resume_row:])
+        # The counts of the rows parsed before are kept
+        quality = {
+            key: getattr(entry.data_quality, key, None) or 0 for key in QUALITY_COUNTS
+        }
+        new_offset, new_rows = read_log_rows(
+            f,
+            buffer,
+            block_size=block_size,
+            quality=quality,
+            on_rows=lambda rows: update_event_detectors(detectors, rows),
+        )
+
+    n_appended = buffer.size - entry.measured_temperature.shape[0]
+    if new_offset == data_offset and n_appended == 0:
+        return 0
+    events = {channel: detector.finish() for channel, detector in detectors.items()}
+    set_field_cooling_data(entry, buffer.data, plot_max_points, events)
+    entry.data_offset, entry.data_rows = new_offset, new_rows
+    if new_rows > data_rows:
+        entry.data_last_time = buffer.data[new_rows - 1, 0]
+    entry.data_quality = AGE_DataQuality(n_rows=buffer.size, **quality)
+    return n_appended
+
+
+def read_generated_entry(
+    archive: EntryArchive, file_name: str
+) -> Optional[AGE_FieldCooling]:
+    """
+    Reads the field cooling entry written before to its generated archive file in
+    the upload, with its time series (see `get_offloaded_array`).
+
+    Returns:
+    Optional[AGE_FieldCooling]: The entry, or None if the file cannot be read.
+    """
+    data = read_archive_data(archive, file_name)
+    if data is None:
+        return None
+    data = {key: value for key, value in data.items() if key != 'm_def'}
+    entry = AGE_FieldCooling.m_from_dict(data)
+    for offloaded in entry.offloaded_arrays:
+        quantity = entry.m_def.all_quantities.get(offloaded.name)
+        if quantity is not None:
+            entry.m_set(quantity, get_offloaded_array(entry, offloaded.name, archive))
+    return entry
+
+
+class FieldCoolingParser(InstrumentLogParser):
+    """
+    Parser for field cooling log files (see `InstrumentLogParser`).
+
+    Arguments:
+        cache_directory: str, optional
+            The directory of the result cache (see `ResultCache`), no caching if empty.
+        cache_max_size: int, optional
+            The maximum size of the result cache in bytes.
+        plot_max_points: int, optional
+            The maximum number of points of each trace of the plot (0: all points).
+        tail_mode: bool, optional
+            Whether a log file processed before is only parsed from where it was left
+            (see `extend_field_cooling_entry`).
+    """
+
+    log_format = FIELD_COOLING_LOG
+    section_class = AGE_FieldCooling
+
+    def __init__(self, tail_mode: bool = False, **kwargs):
+        super().__init__(**kwargs)
+        self.tail_mode = tail_mode
+
+    def read_file(self, mainfile: str) -> AGE_FieldCooling:
+        return read_field_cooling_file(mainfile, self.plot_max_points)
+
     def parse(self, mainfile: str, archive: EntryArchive, logger):
+        from nomad.config import config
+
+        configuration = config.get_plugin_entry_point(
+            'nomad_age.parsers:field_cooling_parser_entry_point'
+        )
         logger.info(
             f'FieldCoolingParser called on {mainfile}',
             configuration=configuration.parameter,
@@ -140,114 +708,19 @@ class FieldCoolingParser(MatchingParser):
         Later create a new archive out of this.
         Everyting called archive in here, is the original .DAT logfile!
         """
-        uid = archive.metadata.upload_id
-        entry = AGE_FieldCooling()
         entry_file_name = f'{os.path.basename(mainfile)}.archive.yaml'
-        eid = get_entry_id(uid, entry_file_name)
-        entry.data_file = os.path.basename(mainfile)  # the original log file
-
-        entry.instrument = 'Fieldcooling'
-        entry.location = 'BAHAMAS'
-
-        with open(mainfile, encoding='latin1') as f:
-            content = f.read()
-
-        # Parse metadata
-        start_time = None
-        sample_names = []
-        for line in content.split('\n'):
-            if 'Probenname:' in line:
-                lineend = line.split(':')[1].strip()
-                sample_names = re.findall(r'\d{4}_\d{4}_?\d?', lineend)
-                if not sample_names:
-                    # If there is no sample name found, it's probably only a comment
-                    entry.description = line.split(':')[1].strip()
-                else:
-                    # Ceck if there is more text than just the sample names
-                    rest = re.sub(r'\d{4}_\d{4}_?\d?|,', '', lineend)
-                    if (
-                        len(rest.strip()) > 0
-                    ):  # if there is more than just the sample, add it to description
-                        entry.description = lineend
-            elif 'Datum:' in line:
-                start_time = parse_date(line.split(':', 1)[1].strip())
-                entry.datetime = start_time
-            elif 'T(Blocking)' in line:
-                entry.blocking_temperature = float(line.split(':')[1])
-            elif 'Plateuzeit' in line:
-                entry.plateau_duration = float(line.split(':')[1].replace(',', '.'))
-            elif 'hlrate [' in line:  # circumventing issues with the umlaut
-                entry.cooling_rate = float(line.split(':')[1].replace(',', '.'))
-
-        if start_time:
-            name = f'FC_{start_time}'
-        else:
-            name = f'FC_{mainfile.split("/")[-1].split(".DAT")[0]}'
-        entry.name = name
-
-        # Parse time-series data
-        data_table = []
-        in_data_section = False
-
-        for line in content.split('\n'):
-            if line.startswith('#Zeit [s]#'):
-                in_data_section = True
-                continue
-
-            if in_data_section and line.strip() and not line.startswith('#'):
-                values = list(map(float, line.strip().split('\t')))
-                if len(values) == 5:
-                    data_table.append(values)
-
-        if data_table:
-            data = np.array(data_table)
-            entry.time = data[:, 0].tolist()
-            if start_time:
-                entry.end_time = start_time + timedelta(seconds=data[:, 0].tolist()[-1])
-            entry.measured_temperature = data[:, 1].tolist()
-            entry.target_temperature = data[:, 2].tolist()
-            entry.pirani_pressure = data[:, 3].tolist()
-            entry.penning_pressure = data[:, 4].tolist()
-
-            fig = plot_field_cooling_data(
-                data[:, 0].tolist(),
-                data[:, 1].tolist(),
-                data[:, 2].tolist(),
-                data[:, 3].tolist(),
-                data[:, 4].tolist(),
-            )
-            entry.figures = [
-                PlotlyFigure(label='Field Cooling Plot', figure=fig.to_plotly_json())
-            ]
-
-        # Create AGE_Sample_Reference entries for each sample
-        # If it doesn't exist, create a new AGE_Sample
-        for id in sample_names:
-            existing_sample = find_existing_AGE_sample(id)
-            if len(existing_sample.data) == 1:  # already exists
-                entry.samples.append(
-                    AGE_Sample_Reference(
-                        reference=get_hash_ref(uid, f'{id}.archive.yaml')
-                    )
-                )
-            elif len(existing_sample.data) == 0:  # does not exist
-                SampleArchive = AGE_Sample(name=id, lab_id=id)
-                create_archive(
-                    SampleArchive,
-                    archive,
-                    f'{id}.archive.yaml',
-                )
-                sample = get_hash_ref(uid, f'{id}.archive.yaml')
-                entry.samples.append(
-                    AGE_Sample_Reference(name=id, lab_id=id, reference=sample)
+
+        # A log file still being written is only parsed from where it was left, the
+        # extended entry is written like a new one (see `write_entry`)
+        if self.tail_mode and archive.m_context.raw_path_exists(entry_file_name):
+            entry = read_generated_entry(archive, entry_file_name)
+            if entry is not None:
+                n_appended = extend_field_cooling_entry(
+                    entry, mainfile, self.plot_max_points
                 )
-            else:
-                raise ValueError('Two samples have the same ID. Something went wrong')
-
-        raw_file = AGE_RawFile(processed_archive=get_hash_ref(uid, entry_file_name))
-        archive.data = raw_file
-        new_entry_created = create_archive(entry, archive, entry_file_name)
-        if not new_entry_created:
-            new_entry = update_entry(entry, eid, archive, logger)
-            if new_entry is not None:
-                create_archive(new_entry, archive, entry_file_name, overwrite=True)
+                if n_appended is not None:
+                    logger.info(f'Appended {n_appended} rows of {mainfile}')
+                    self.write_entry(entry, mainfile, archive, logger)
+                    return
+
+        self.write_entry(self.read(mainfile), mainfile, archive, logger)
@@ -0,0 +1,607 @@
+import abc
+import os
+import re
+from datetime import datetime
+from typing import BinaryIO, Callable, Optional
+
+import numpy as np
+from nomad.datamodel import EntryArchive
+from nomad.datamodel.data import EntryData
+from nomad.parsing import MatchingParser
+
+from nomad_age.schema_packages.age_schema import (
+    AGE_RawFile,
+    AGE_Sample_Reference,
+)
+from nomad_age.utils.cache import get_result_cache
+from nomad_age.utils.samples import SampleRegistry
+from nomad_age.utils.utils import (
+    create_archive,
+    get_hash_ref,
+    merge_editable_quantities,
+    read_archive_data,
+    sniff_header,
+)
+
+"""
+# The process logs of the lab instruments (field cooling, helium ion bombardment, ...)
+# share one layout: a banner, `key: value` header lines (with comma decimals) and a
+# tab-separated data block below a `#Zeit [s]#...` line. Each instrument declares its
+# log as a `LogFormat`; detecting, reading the header and reading the data block (in
+# bounded-memory blocks, vectorized and with validation) is done here for all of them.
+"""
+WHITESPACE = b' \t\r\n\x0b\x0c'
+# Size of the blocks a log is read in, bounds the memory of parsing besides the data
+DATA_BLOCK_SIZE = 2**18
+# Counts of dropped and repaired rows of the data-quality report
+QUALITY_COUNTS = ('n_malformed_rows', 'n_invalid_rows', 'n_repaired_rows')
+# Lab IDs of samples (e.g. 2024_0207 or 2024_0207_1)
+SAMPLE_NAME_RE = re.compile(r'\d{4}_\d{4}_?\d?')
+
+
+def parse_decimal(value: str) -> float:
+    """Converts a header value with a comma or point decimal to a float."""
+    return float(value.strip().replace(',', '.'))
+
+
+def parse_date(date_str: str) -> datetime:
+    # Replace any sequence of spaces or tabs with a single space
+    cleaned = re.sub(r'[ \t]+', ' ', date_str.strip())
+    return datetime.strptime(cleaned, '%Y.%m.%d %H:%M:%S')
+
+
+def read_sample_names(value: str) -> tuple[list[str], Optional[str]]:
+    """
+    Extracts the lab IDs of the samples from the sample header value of a log.
+
+    Returns:
+    tuple[list[str], Optional[str]]: The lab IDs and the description, i.e. the value
+        if it is more than just the lab IDs (e.g. a comment).
+    """
+    sample_names = SAMPLE_NAME_RE.findall(value)
+    rest = SAMPLE_NAME_RE.sub('', value).replace(',', '')
+    return sample_names, value.strip() if rest.strip() else None
+
+
+def add_sample_references(entry: EntryData, sample_names: list[str]) -> None:
+    """Adds the samples named in a log (lab IDs) to the samples of a process."""
+    for id in sample_names:
+        entry.samples.append(AGE_Sample_Reference(name=id, lab_id=id))
+
+
+class LogField:
+    """
+    A `key: value` line of the header of a log.
+
+    Arguments:
+        name: str
+            The name the value is accessed with.
+        keys: tuple[str, ...]
+            Parts of the key identifying the line (e.g. without units or umlauts).
+        dtype: Callable
+            The function converting the value, `float` accepts comma decimals.
+    """
+
+    def __init__(self, name: str, keys: tuple, dtype: Callable = str):
+        self.name = name
+        self.keys = keys
+        self.dtype = parse_decimal if dtype is float else dtype
+
+    def matches(self, key: str) -> bool:
+        return any(part in key for part in self.keys)
+
+    def convert(self, value: str):
+        """Converts the value of the line or returns None if it is not valid."""
+        try:
+            return self.dtype(value.strip())
+        except ValueError:
+            return None
+
+
+class LogColumn:
+    """
+    A column of the data block of a log.
+
+    Arguments:
+        name: str
+            The name of the column, i.e. of the quantity of the schema it is stored in.
+        unit: str
+            The unit of the values in the log.
+    """
+
+    def __init__(self, name: str, unit: str):
+        self.name = name
+        self.unit = unit
+
+
+class LogFormat:
+    """
+    The declaration of the log of an instrument.
+
+    Arguments:
+        banner: bytes
+            Regular expression of the banner in the first lines of the log.
+        fields: tuple[LogField, ...]
+            The lines of the header.
+        columns: tuple[LogColumn, ...]
+            The columns of the data block, in order.
+        data_header: bytes
+            Regular expression of the start of the header line of the data block.
+    """
+
+    def __init__(
+        self,
+        banner: bytes,
+        fields: tuple,
+        columns: tuple,
+        data_header: bytes = rb'#Zeit \[s\]#',
+    ):
+        self.banner_re = re.compile(banner)
+        self.fields = fields
+        self.columns = columns
+        self.n_columns = len(columns)
+        self.data_header_re = re.compile(rb'^' + data_header + rb'.*$\n?', re.M)
+
+    def split_content(self, content: bytes) -> tuple[str, bytes]:
+        """
+        Splits the raw content of a log once at the header line of the data block.
+
+        Returns:
+        tuple[str, bytes]: The decoded metadata header and the raw data block (empty
+            if the log has no data block).
+        """
+        match = self.data_header_re.search(content)
+        if match is None:
+            return content.decode('latin1'), b''
+        return content[: match.start()].decode('latin1'), content[match.end() :]
+
+    def read_header(self, metadata_content: str) -> dict:
+        """
+        Returns the converted values of the header lines by field name. Each line
+        belongs to the first field it matches, later lines replace earlier ones.
+        """
+        values = {}
+        for line in metadata_content.splitlines():
+            key, separator, value = line.partition(':')
+            if not separator:
+                continue
+            for field in self.fields:
+                if field.matches(key):
+                    values[field.name] = field.convert(value)
+                    break
+        return values
+
+    def convert_columns(self, data: np.ndarray, section_def) -> dict[str, np.ndarray]:
+        """
+        Returns the columns of the (n, n_columns) data by name, converted from their
+        declared units into the units of the quantities of `section_def`. Columns
+        already in those units are returned as views.
+        """
+        from nomad.units import ureg
+
+        columns = {}
+        for column, values in zip(self.columns, data.T):
+            quantity = section_def.all_quantities.get(column.name)
+            if quantity is not None and quantity.unit is not None:
+                if ureg.Unit(column.unit) != ureg.Unit(str(quantity.unit)):
+                    values = ureg.Quantity(values, column.unit).to(quantity.unit)
+                    values = values.magnitude
+            columns[column.name] = values
+        return columns
+
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Returns the indices of the points of a trace kept by min/max decimation: the
+    trace is split into buckets and the minimum and maximum of each bucket are kept,
+    so peaks stay visible in the decimated trace.
+
+    Parameters:
+    values (numpy.ndarray): The y values of the trace.
+    max_points (int): The maximum number of points of the decimated trace.
+
+    Returns:
+    numpy.ndarray: The sorted indices of the kept points (all points if the trace
+        has no more than `max_points`).
+    """
+    n_points = values.size
+    # one bucket less, to leave room for the first and last point of the trace
+    n_buckets = (max_points or 0) // 2 - 1
+    if n_buckets < 1 or n_points <= max_points:
+        return np.arange(n_points)
+
+    # Buckets of equal size, the last one padded (NaN never wins min or max)
+    bucket_size = -(-n_points // n_buckets)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n_points] = values
+    buckets = padded.reshape(n_buckets, bucket_size)
+    offsets = np.arange(n_buckets) * bucket_size
+    minima = np.where(np.isnan(buckets), np.inf, buckets).argmin(axis=1) + offsets
+    maxima = np.where(np.isnan(buckets), -np.inf, buckets).argmax(axis=1) + offsets
+
+    indices = np.unique(np.concatenate([minima, maxima, [0, n_points - 1]]))
+    return indices[indices < n_points]
+
+
+def count_rows(quality: Optional[dict], key: str, count: int) -> None:
+    """Adds `count` rows to the count `key` of a data-quality report."""
+    if quality is not None:
+        quality[key] = quality.get(key, 0) + int(count)
+
+
+def parse_damaged_tokens(
+    tokens: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Converts the (n, columns) tokens of a block which are not all valid numbers.
+    Comma decimals are repaired, the remaining invalid tokens are set to NaN.
+
+    Returns:
+    tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]: The data, the mask of the
+        valid rows and the mask of the rows with comma decimals.
+    """
+    is_repaired = (np.char.find(tokens, b',') >= 0).any(axis=1)
+    tokens = np.char.replace(tokens, b',', b'.')
+    is_valid = np.ones(tokens.shape[0], dtype=bool)
+    try:
+        return tokens.astype(np.float64, order='F'), is_valid, is_repaired
+    except ValueError:
+        pass
+    # Only the tokens of blocks with damaged rows are converted one by one
+    data = np.full(tokens.shape, np.nan, order='F')
+    for (row, column), token in np.ndenumerate(tokens):
+        try:
+            data[row, column] = float(token)
+        except ValueError:
+            is_valid[row] = False
+    return data, is_valid, is_repaired
+
+
+def read_log_data(
+    data_content: bytes, n_columns: int, quality: Optional[dict] = None
+) -> np.ndarray:
+    """
+    Converts the data block of a log into an (n, n_columns) array in a single
+    vectorized pass. Comment rows (`#`) are dropped, so are rows without `n_columns`
+    columns and rows with values which are not numbers; rows with comma decimals are
+    repaired. The array is column-major, so each column is a contiguous view.
+
+    Parameters:
+    data_content (bytes): The data block (tab-separated rows) of the log.
+    n_columns (int): The number of columns of the data block.
+    quality (dict, optional): The data-quality report the numbers of dropped
+        (`n_malformed_rows`, `n_invalid_rows`) and repaired rows (`n_repaired_rows`)
+        are added to.
+
+    Returns:
+    numpy.ndarray: The data of the valid rows.
+    """
+    buffer = np.frombuffer(data_content, dtype=np.uint8)
+
+    # Each token starts with a non-whitespace byte after whitespace (or the start)
+    is_space = np.isin(buffer, np.frombuffer(WHITESPACE, dtype=np.uint8))
+    token_starts = np.flatnonzero(~is_space & np.r_[True, is_space[:-1]])
+    if token_starts.size == 0:
+        return np.empty((0, n_columns))
+
+    # The row of each token, and the number of tokens of each row
+    row_ends = np.flatnonzero(buffer == ord('\n'))
+    token_rows = np.searchsorted(row_ends, token_starts)
+    n_tokens = np.bincount(token_rows, minlength=row_ends.size + 1)
+
+    # Rows starting with a comment (`#`) are dropped like rows with other columns
+    is_first = np.r_[True, token_rows[1:] != token_rows[:-1]]
+    is_comment = np.zeros(n_tokens.size, dtype=bool)
+    is_comment[token_rows[is_first]] = buffer[token_starts[is_first]] == ord('#')
+    valid_rows = (n_tokens == n_columns) & ~is_comment
+    count_rows(
+        quality, 'n_malformed_rows', (~valid_rows & ~is_comment & (n_tokens > 0)).sum()
+    )
+
+    tokens = np.array(data_content.split())[valid_rows[token_rows]].reshape(
+        -1, n_columns
+    )
+    try:
+        return tokens.astype(np.float64, order='F')
+    except ValueError:
+        data, is_valid, is_repaired = parse_damaged_tokens(tokens)
+    count_rows(quality, 'n_invalid_rows', (~is_valid).sum())
+    count_rows(quality, 'n_repaired_rows', (is_repaired & is_valid).sum())
+    if is_valid.all():
+        return data
+    return np.asfortranarray(data[is_valid])
+
+
+class ColumnBuffer:
+    """
+    Growable storage of the columns of a data block. The columns are the rows of a
+    C-ordered (n_columns, capacity) array, so each column is a contiguous view and no
+    copy is needed when parsing is done.
+
+    Arguments:
+        n_columns: int
+            The number of columns.
+        capacity: int
+            The initial number of rows, e.g. estimated from the size of the log.
+    """
+
+    # Factor the capacity grows by if an estimate was too small
+    growth = 1.5
+
+    def __init__(self, n_columns: int, capacity: int = 0):
+        self.storage = np.empty((n_columns, max(capacity, 1)))
+        self.size = 0
+
+    def extend(self, rows: np.ndarray) -> None:
+        """Appends (n, n_columns) rows, growing the storage if needed."""
+        size = self.size + rows.shape[0]
+        if size > self.storage.shape[1]:
+            storage = np.empty(
+                (
+                    self.storage.shape[0],
+                    max(size, int(self.storage.shape[1] * self.growth)),
+                )
+            )
+            storage[:, : self.size] = self.storage[:, : self.size]
+            self.storage = storage
+        self.storage[:, self.size : size] = rows.T
+        self.size = size
+
+    @property
+    def data(self) -> np.ndarray:
+        """The (n, n_columns) rows appended so far, with contiguous columns."""
+        return self.storage[:, : self.size].T
+
+
+def read_log_rows(
+    f: BinaryIO,
+    buffer: ColumnBuffer,
+    rest: bytes = b'',
+    block_size: int = DATA_BLOCK_SIZE,
+    quality: Optional[dict] = None,
+    on_rows: Optional[Callable[[np.ndarray], None]] = None,
+) -> tuple[int, int]:
+    """
+    Parses the rows of a log from the current position to the end of the file in
+    blocks of `block_size` bytes. Each block is parsed (see `read_log_data`) up to
+    its last complete row, the rest is prepended to the next block.
+
+    Parameters:
+    f (BinaryIO): The log file, opened in binary mode.
+    buffer (ColumnBuffer): The buffer the rows are appended to.
+    rest (bytes): The content already read from the file at its current position.
+    block_size (int): The size of the blocks in bytes.
+    quality (dict, optional): The data-quality report of the parsed rows (see
+        `read_log_data`). A final row without a newline which is not valid (e.g. cut
+        off by a crash) is reported as `truncated_last_row`.
+    on_rows (Callable, optional): Called with the (n, columns) rows of each parsed
+        block, e.g. to derive results while the log is read instead of afterwards.
+
+    Returns:
+    tuple[int, int]: The byte offset of the end of the last complete (newline
+        terminated) row and the number of rows in `buffer` up to it. A final row
+        without a newline is parsed as well, but may still be written to.
+    """
+    n_columns = buffer.storage.shape[0]
+    while True:
+        # the content read before (e.g. with the header) is parsed with the first
+        # block, also if the file has no more content
+        block = f.read(block_size)
+        content = rest + block
+        end = content.rfind(b'\n') + 1
+        content, rest = content[:end], content[end:]
+        if content:
+            rows = read_log_data(content, n_columns, quality)
+            buffer.extend(rows)
+            if on_rows is not None:
+                on_rows(rows)
+        if not block:
+            break
+    data_offset, data_rows = f.tell() - len(rest), buffer.size
+
+    # The final row is only reported, it is parsed again when the log is extended
+    last_row = read_log_data(rest, n_columns)
+    buffer.extend(last_row)
+    if on_rows is not None:
+        on_rows(last_row)
+    if quality is not None:
+        quality['truncated_last_row'] = (
+            last_row.shape[0] == 0
+            and rest.strip() != b''
+            and not rest.lstrip().startswith(b'#')
+        )
+    return data_offset, data_rows
+
+
+def read_log_stream(
+    f: BinaryIO,
+    log_format: LogFormat,
+    block_size: int = DATA_BLOCK_SIZE,
+    quality: Optional[dict] = None,
+    on_rows: Optional[Callable[[np.ndarray], None]] = None,
+) -> tuple[str, np.ndarray, int, int]:
+    """
+    Reads a log in blocks of `block_size` bytes (see `read_log_rows`) into a
+    `ColumnBuffer` pre-grown from the size of the log, so the peak memory is that of
+    the data plus a few blocks, not a multiple of the size of the log.
+
+    Parameters:
+    f (BinaryIO): The log file, opened in binary mode.
+    log_format (LogFormat): The format of the log.
+    block_size (int): The size of the blocks in bytes.
+    quality (dict, optional): The data-quality report of the parsed rows (see
+        `read_log_rows`).
+    on_rows (Callable, optional): Called with the rows of each parsed block (see
+        `read_log_rows`).
+
+    Returns:
+    tuple[str, numpy.ndarray, int, int]: The decoded metadata header, the (n,
+        n_columns) data, the byte offset of the end of the last complete row and the
+        number of rows up to it.
+    """
+    # The header is read up to the end of the header line of the data block
+    content = b''
+    while True:
+        block = f.read(block_size)
+        content += block
+        match = log_format.data_header_re.search(content)
+        if match is not None and (match.group().endswith(b'\n') or not block):
+            break
+        if not block:
+            data = np.empty((0, log_format.n_columns))
+            return content.decode('latin1'), data, len(content), 0
+    metadata_content = content[: match.start()].decode('latin1')
+    rest = content[match.end() :]
+
+    # Rows per byte of the content read with the header, with a margin
+    try:
+        data_size = os.fstat(f.fileno()).st_size - f.tell() + len(rest)
+    except (AttributeError, OSError):  # e.g. in-memory streams
+        data_size = 0
+    estimate = rest.count(b'\n') / max(len(rest), 1) * data_size
+    buffer = ColumnBuffer(log_format.n_columns, int(estimate * 1.02) + 1)
+
+    data_offset, data_rows = read_log_rows(
+        f, buffer, rest, block_size, quality, on_rows
+    )
+    return metadata_content, buffer.data, data_offset, data_rows
+
+
+def reconcile_entry(entry: EntryData, archive: EntryArchive, file_name: str, logger):
+    """
+    Writes a process to its generated archive file. If the file exists, the values
+    the users edited in it (its editable quantities) are kept and the file is only
+    written again if the content changed (by its digest, see `create_archive`). The
+    existing file is read straight from the raw files of the upload.
+
+    Parameters:
+    entry (EntryData): The process read from the log file.
+    archive (EntryArchive): The archive of the log file.
+    file_name (str): The name of the generated archive file.
+    logger: The logger of the parser.
+
+    Returns:
+    bool: Whether the archive file was written.
+    """
+    if not archive.m_context.raw_path_exists(file_name):
+        return create_archive(entry, archive, file_name)
+
+    existing = read_archive_data(archive, file_name)
+    if existing is None:
+        logger.warning(f'Could not read {file_name}, it is written again')
+        return create_archive(entry, archive, file_name, overwrite=True)
+
+    merge_editable_quantities(entry, existing)
+    return create_archive(entry, archive, file_name, overwrite=True)
+
+
+class InstrumentLogParser(MatchingParser):
+    """
+    Base parser of the process logs of the lab instruments. The process is written
+    to its own archive (`<logfile>.archive.yaml`), which references the samples
+    (created if they do not exist yet). The log file entry refers to this archive.
+
+    Subclasses declare the `log_format` and the `section_class` of their process and
+    implement `read_file`.
+
+    Arguments:
+        cache_directory: str, optional
+            The directory of the result cache (see `ResultCache`), no caching if empty.
+        cache_max_size: int, optional
+            The maximum size of the result cache in bytes.
+        plot_max_points: int, optional
+            The maximum number of points of each trace of the plot (0: all points).
+    """
+
+    log_format: LogFormat = None
+    section_class: type[EntryData] = None
+
+    def __init__(
+        self,
+        cache_directory: str = '',
+        cache_max_size: int = 2**30,
+        plot_max_points: int = 2000,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.cache = get_result_cache(cache_directory, cache_max_size)
+        self.plot_max_points = plot_max_points
+
+    def is_mainfile(
+        self,
+        filename: str,
+        mime: str,
+        buffer: bytes,
+        decoded_buffer: str,
+        compression: str = None,
+    ) -> bool:
+        """
+        Matches log files by their name and the banner of their format in their
+        header (see `sniff_header`), without decoding or searching the rest of the
+        file.
+        """
+        if compression is not None or not self._mainfile_name_re.fullmatch(filename):
+            return False
+        return sniff_header(filename, buffer, self.log_format.banner_re)
+
+    @abc.abstractmethod
+    def read_file(self, mainfile: str) -> EntryData:
+        """Reads the log file into a new process section."""
+
+    def read(self, mainfile: str) -> EntryData:
+        """
+        Reads the log file (see `read_file`) or, if its content was parsed before,
+        the cached result.
+        """
+        if self.cache is None:
+            return self.read_file(mainfile)
+        # the name of the log file is part of the result (e.g. `data_file`)
+        key = self.cache.key(
+            mainfile,
+            type(self).__name__,
+            file_name=os.path.basename(mainfile),
+            plot_max_points=self.plot_max_points,
+        )
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.section_class.m_from_dict(cached)
+        entry = self.read_file(mainfile)
+        self.cache.put(key, entry.m_to_dict())
+        return entry
+
+    def resolve_samples(
+        self, entry: EntryData, archive: EntryArchive, registry: SampleRegistry
+    ) -> None:
+        """
+        Resolves the AGE_Sample_Reference entries of the samples named in the log
+        with one batched lookup. Samples which do not exist yet are created in the
+        upload by `registry`.
+        """
+        references = registry.get_or_create(
+            (sample_reference.lab_id for sample_reference in entry.samples), archive
+        )
+        for sample_reference in entry.samples:
+            sample_reference.reference = references[sample_reference.lab_id]
+
+    def write_entry(
+        self, entry: EntryData, mainfile: str, archive: EntryArchive, logger
+    ) -> None:
+        """
+        Writes the process read from the log file to its own archive, keeping the
+        edits of the archive written before (see `reconcile_entry`). The samples
+        created for it are processed once it is written.
+        """
+        uid = archive.metadata.upload_id
+        entry_file_name = f'{os.path.basename(mainfile)}.archive.yaml'
+
+        registry = SampleRegistry(uid)
+        self.resolve_samples(entry, archive, registry)
+
+        raw_file = AGE_RawFile(processed_archive=get_hash_ref(uid, entry_file_name))
+        archive.data = raw_file
+        reconcile_entry(entry, archive, entry_file_name, logger)
+        registry.flush(archive)
+
+    def parse(self, mainfile: str, archive: EntryArchive, logger):
+        logger.info(f'{type(self).__name__} called on {mainfile}')
+        self.write_entry(self.read(mainfile), mainfile, archive, logger)
@@ -0,0 +1,179 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+from nomad.datamodel.metainfo.plot import PlotlyFigure
+
+from nomad_age.parsers.instrument_log import (
+    QUALITY_COUNTS,
+    InstrumentLogParser,
+    LogColumn,
+    LogField,
+    LogFormat,
+    add_sample_references,
+    minmax_indices,
+    parse_date,
+    read_log_stream,
+    read_sample_names,
+)
+from nomad_age.schema_packages.age_schema import AGE_DataQuality
+from nomad_age.schema_packages.ion_bombardment_schema import AGE_HeliumIonBombardment
+
+"""
+# Helium ion bombardment logs are expected to be written by the same acquisition
+# software as the field cooling logs: an `IB-Protokoll` banner, the sample, date and
+# the set ion energy and fluence in the header, then the beam current, the accumulated
+# fluence and the chamber pressure every sample interval.
+#
+# PROVISIONAL: this format is modelled on a synthetic log (tests/data/ionbombardment),
+# no log of the instrument was available. The parser is therefore not registered as
+# an entry point (see pyproject.toml) until it is checked against a real log.
+"""
+ION_BOMBARDMENT_LOG = LogFormat(
+    banner=rb'#\s+IB-Protokoll\s+#',
+    fields=(
+        LogField('samples', ('Probenname',)),
+        LogField('datetime', ('Datum',), dtype=parse_date),
+        LogField('ion_energy', ('Energie',), dtype=float),
+        LogField('target_fluence', ('Fluenz',), dtype=float),
+    ),
+    columns=(
+        LogColumn('time', 's'),
+        LogColumn('beam_current', 'nA'),
+        LogColumn('fluence', '1 / cm ** 2'),
+        LogColumn('chamber_pressure', 'mbar'),
+    ),
+)
+
+
+def plot_ion_bombardment_data(
+    time, beam_current, fluence, max_points: int = None
+) -> PlotlyFigure:
+    """
+    Plots the beam current and the accumulated fluence of a helium ion bombardment
+    log. With `max_points`, each trace is decimated to at most this number of points
+    (see `minmax_indices`) before the figure is built.
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
+    def decimate(values):
+        indices = minmax_indices(values, max_points)
+        return time[indices], values[indices]
+
+    time_current, beam_current = decimate(beam_current)
+    time_fluence, fluence = decimate(fluence)
+
+    fig = make_subplots(specs=[[{'secondary_y': True}]])
+    fig.add_trace(
+        go.Scatter(x=time_current, y=beam_current, mode='lines', name='Beam Current'),
+        secondary_y=False,
+    )
+    fig.add_trace(
+        go.Scatter(x=time_fluence, y=fluence, mode='lines', name='Fluence'),
+        secondary_y=True,
+    )
+    fig.update_layout(
+        showlegend=True,
+        xaxis=dict(title='Time (s)', fixedrange=False),
+        yaxis=dict(title='Beam Current (nA)', side='left'),
+        yaxis2=dict(
+            title='Fluence (1/cm²)',
+            showgrid=False,
+            side='right',
+            overlaying='y',
+            zeroline=False,
+            tickformat='.2e',
+        ),
+        legend=dict(orientation='h', yanchor='bottom', y=1.01, xanchor='right', x=1),
+    )
+    return fig
+
+
+def read_ion_bombardment_file(
+    mainfile: str, plot_max_points: int = None
+) -> AGE_HeliumIonBombardment:
+    """
+    Reads a helium ion bombardment log file into a new AGE_HeliumIonBombardment
+    (metadata, time series and plot). The samples are only named (`lab_id`), their
+    references are resolved by the parser.
+
+    Parameters:
+    mainfile (str): The path to the helium ion bombardment log file.
+    plot_max_points (int, optional): The maximum number of points of each trace of
+        the plot (see `plot_ion_bombardment_data`).
+
+    Returns:
+    AGE_HeliumIonBombardment: The helium ion bombardment process of the log file.
+    """
+    entry = AGE_HeliumIonBombardment()
+    entry.data_file = os.path.basename(mainfile)  # the original log file
+
+    with open(mainfile, 'rb') as f:
+        quality = dict.fromkeys(QUALITY_COUNTS, 0)
+        metadata_content, data, _, _ = read_log_stream(
+            f, ION_BOMBARDMENT_LOG, quality=quality
+        )
+
+    header = ION_BOMBARDMENT_LOG.read_header(metadata_content)
+    sample_names = []
+    if header.get('samples') is not None:
+        sample_names, entry.description = read_sample_names(header['samples'])
+    for name in ('datetime', 'ion_energy', 'target_fluence'):
+        if header.get(name) is not None:
+            setattr(entry, name, header[name])
+
+    if entry.datetime is not None:
+        entry.name = f'IB_{header["datetime"]}'
+    else:
+        entry.name = f'IB_{os.path.splitext(os.path.basename(mainfile))[0]}'
+
+    if data.size:
+        columns = ION_BOMBARDMENT_LOG.convert_columns(
+            data, AGE_HeliumIonBombardment.m_def
+        )
+        time = columns['time']
+        entry.time = time
+        entry.beam_current = columns['beam_current']
+        entry.fluence = columns['fluence']
+        entry.chamber_pressure = columns['chamber_pressure']
+        entry.achieved_fluence = columns['fluence'][-1]
+        entry.mean_beam_current = np.mean(columns['beam_current'])
+        if entry.datetime is not None:
+            entry.end_time = entry.datetime + timedelta(seconds=float(time[-1]))
+
+        fig = plot_ion_bombardment_data(
+            time,
+            columns['beam_current'],
+            columns['fluence'],
+            max_points=plot_max_points,
+        )
+        entry.figures = [
+            PlotlyFigure(
+                label='Helium Ion Bombardment Plot', figure=fig.to_plotly_json()
+            )
+        ]
+    entry.data_quality = AGE_DataQuality(n_rows=data.shape[0], **quality)
+    add_sample_references(entry, sample_names)
+
+    return entry
+
+
+class IonBombardmentParser(InstrumentLogParser):
+    """
+    Parser for helium ion bombardment log files (see `InstrumentLogParser`).
+
+    Arguments:
+        cache_directory: str, optional
+            The directory of the result cache (see `ResultCache`), no caching if empty.
+        cache_max_size: int, optional
+            The maximum size of the result cache in bytes.
+        plot_max_points: int, optional
+            The maximum number of points of each trace of the plot (0: all points).
+    """
+
+    log_format = ION_BOMBARDMENT_LOG
+    section_class = AGE_HeliumIonBombardment
+
+    def read_file(self, mainfile: str) -> AGE_HeliumIonBombardment:
+        return read_ion_bombardment_file(mainfile, self.plot_max_points)
@@ -1,7 +1,9 @@
-import plotly.express as px
+import numpy as np
 from nomad.datamodel.data import Schema
 from nomad.datamodel.metainfo.plot import PlotlyFigure, PlotSection
-from nomad.metainfo import Package, Quantity, Section
+from nomad.metainfo import Package, Quantity, Section, SubSection
+
+from nomad_age.schema_packages.age_schema import AGE_OffloadedArray
 
 lmoke_vmoke_package = Package(name='lmoke_vmoke_nomadmetainfo_json', description='None')
 
@@ -59,9 +61,46 @@ Quantities to be defined:
 detector signal (only for VMOKE).
 - **Longitudinal Magnetization**: The longitudinal magnetization.
 - **Transversal Magnetization**: The transversal magnetization (only for VMOKE).
+- **Channels**: The names of all measured channels (only for VMOKE).
+- **Channel Data**: All measured channels as (points, channels) array (only for VMOKE).
+- **Branch Starts**: The index of the first point of each field branch.
+- **Branch Directions**: The sweep direction of each field branch.
 """
 
 
+def to_branches(values, branch_starts) -> np.ndarray:
+    """
+    Arranges flat measurement data into a (cycle, branch, point) array. Each cycle
+    consists of two branches. Incomplete branches or cycles (e.g. from an interrupted
+    measurement) are padded with NaN. If all branches have the same length, a view of
+    the data is returned.
+
+    Parameters:
+    values (array_like): The flat measurement data.
+    branch_starts (array_like): The index of the first point of each branch.
+
+    Returns:
+    numpy.ndarray: The data with shape (n_cycles, 2, n_points_per_branch).
+    """
+    values = np.asarray(values, dtype=float)
+    branch_starts = np.asarray(branch_starts, dtype=int)
+    lengths = np.diff(np.append(branch_starts, values.size))
+    n_branches = branch_starts.size
+    n_points = lengths.max()
+    n_cycles = (n_branches + 1) // 2
+
+    if n_branches % 2 == 0 and np.all(lengths == n_points):
+        return values[branch_starts[0] :].reshape(n_cycles, 2, n_points)
+
+    branches = np.full((2 * n_cycles, n_points), np.nan)
+    rows = np.repeat(np.arange(n_branches), lengths)
+    columns = np.arange(branch_starts[0], values.size) - np.repeat(
+        branch_starts, lengths
+    )
+    branches[rows, columns] = values[branch_starts[0] :]
+    return branches.reshape(n_cycles, 2, n_points)
+
+
 class LMOKEandVMOKESchema(Schema, PlotSection):
     m_def = Section()
 
@@ -282,7 +321,20 @@ class LMOKEandVMOKESchema(Schema, PlotSection):
         description='True if training effect elimination is applied',  # Only VMOKE
     )
 
+    def get_branches(self, name='magnetic_field') -> np.ndarray:
+        """
+        Returns the measurement data `name` as a (cycle, branch, point) array (see
+        `to_branches`). Without branch information, all data form a single branch.
+        """
+        values = self[name]
+        if hasattr(values, 'magnitude'):
+            values = values.magnitude
+        branch_starts = self.branch_starts if self.branch_starts is not None else [0]
+        return to_branches(values, branch_starts)
+
     def generate_hysteresis_plot(self, x_name='magnetic_field', y_name='intensity'):
+        import plotly.express as px
+
         x = self[x_name]
         y = self[y_name]
 
@@ -345,6 +397,46 @@ class LMOKEandVMOKESchema(Schema, PlotSection):
         description='Magnetization in arbitrary units (typically normalized).',
     )
 
+    # All measured channels (only if there are more than field and intensity, VMOKE)
+    channels = Quantity(
+        type=str,
+        shape=['*'],
+        description=(
+            'Names of the measured channels, i.e. the columns of channel_data. '
+            'E.g. longitudinal_field, transversal_field, total_field, '
+            'longitudinal_intensity, transversal_intensity, '
+            'diff_longitudinal_intensity.'
+        ),
+    )
+
+    channel_data = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description=(
+            'All measured channels with shape (points, channels) as in the file, '
+            'i.e. fields in kA/m and intensities in detector voltage.'
+        ),
+    )
+
+    # Branch structure of the measurement data (see get_branches)
+    branch_starts = Quantity(
+        type=int,
+        shape=['*'],
+        description=(
+            'Index of the first point of each field branch in the measurement data. '
+            'Two subsequent branches form a cycle.'
+        ),
+    )
+
+    branch_directions = Quantity(
+        type=int,
+        shape=['*'],
+        description=(
+            'Sweep direction of each field branch. '
+            '-1 for a decreasing and +1 for an increasing field.'
+        ),
+    )
+
     ####### Evaluated values
     # Coercivity
     HC = Quantity(
@@ -483,4 +575,182 @@ class LMOKEandVMOKESchema(Schema, PlotSection):
     )
 
 
+class LMOKERasterMap(Schema, PlotSection):
+    """
+    Spatial map of a raster measurement, assembled from the nX x nY LMOKE
+    measurements (one file per position) of a single raster run.
+    """
+
+    m_def = Section()
+
+    sample = Quantity(
+        type=str,
+        description='Sample name. The letter describes its origin.',
+    )
+
+    datetime = Quantity(
+        type=str,
+        description='Date and time of the first measurement of the raster.',
+    )
+
+    nX = Quantity(
+        type=int,
+        description='Total number of points in X',
+    )
+
+    nY = Quantity(
+        type=int,
+        description='Total number of points in Y',
+    )
+
+    DeltaX = Quantity(
+        type=float,
+        description='Total size in X in mm',
+        unit='mm',
+    )
+
+    DeltaY = Quantity(
+        type=float,
+        description='Total size in Y in mm',
+        unit='mm',
+    )
+
+    avg_raster = Quantity(
+        type=bool,
+        description='True if the measurements of the raster are averaged',
+    )
+
+    measurements = Quantity(
+        type=str,
+        shape=['*'],
+        description='File names of the measurements, one per raster position.',
+    )
+
+    X = Quantity(
+        type=int,
+        shape=['*'],
+        description='Position in X of each measurement (1-based index)',
+    )
+
+    Y = Quantity(
+        type=int,
+        shape=['*'],
+        description='Position in Y of each measurement (1-based index)',
+    )
+
+    ###### Measurement Data (one row per measurement)
+    magnetic_field = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Magnetic field of each measurement in **mT**, kA/m or Oe.',
+        unit='mT',
+    )
+
+    intensity = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Intensity of each measurement in detector voltage.',
+        unit='V',
+    )
+
+    magnetization = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Magnetization of each measurement in arbitrary units.',
+    )
+
+    ####### Evaluated maps (Y, X), NaN where the evaluation failed
+    HC = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Coercivity map in **mT**, kA/m or Oe.',
+        unit='mT',
+    )
+
+    dHC = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Uncertainty of the coercivity map in **mT**, kA/m or Oe.',
+        unit='mT',
+    )
+
+    HEB = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Exchange bias map in **mT**, kA/m or Oe.',
+        unit='mT',
+    )
+
+    dHEB = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Uncertainty of the exchange bias map in **mT**, kA/m or Oe.',
+        unit='mT',
+    )
+
+    MS = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Saturation magnetization map in arb. u.',
+    )
+
+    dMS = Quantity(
+        type=np.float64,
+        shape=['*', '*'],
+        description='Uncertainty of the saturation magnetization map in arb. u.',
+    )
+
+    ####### Averaged loop (only if the raster is averaged)
+    average_magnetic_field = Quantity(
+        type=float,
+        shape=['*'],
+        description='Magnetic field of the loop averaged over the raster in **mT**.',
+        unit='mT',
+    )
+
+    average_magnetization = Quantity(
+        type=float,
+        shape=['*'],
+        description='Magnetization of the loop averaged over the raster in arb. u.',
+    )
+
+    # The measurement data, written to HDF5 in the generated archive
+    offloaded_arrays = SubSection(section_def=AGE_OffloadedArray, repeats=True)
+
+    def generate_map_plots(self, names=('HC', 'HEB', 'MS')):
+        import plotly.express as px
+
+        for name in names:
+            values = self[name]
+            if values is None:
+                continue
+            if hasattr(values, 'magnitude'):
+                values = values.magnitude
+            if np.all(np.isnan(values)):
+                continue
+
+            map_plot = px.imshow(
+                values,
+                x=np.linspace(0, self.DeltaX.magnitude, self.nX),
+                y=np.linspace(0, self.DeltaY.magnitude, self.nY),
+                origin='lower',
+                labels=dict(x='X [mm]', y='Y [mm]', color=name),
+            )
+            self.figures.append(
+                PlotlyFigure(label=f'{name} map', figure=map_plot.to_plotly_json())
+            )
+
+        if self.average_magnetization is not None:
+            hys_plot = px.line(
+                x=self.average_magnetic_field.magnitude, y=self.average_magnetization
+            )
+            hys_plot.update_layout(
+                xaxis_title='Magnetic Field [mT]',
+                yaxis_title='Magnetization [arb. u.]',
+            )
+            self.figures.append(
+                PlotlyFigure(label='Averaged loop', figure=hys_plot.to_plotly_json())
+            )
+
+
 lmoke_vmoke_package.__init_metainfo__()
@@ -45,3 +45,18 @@ field_cooling_schema_entry_point = FieldCoolingSchemaEntryPoint(
     name='FieldCoolingSchema',
     description='Entry Point for custom Field Cooling schema.',
 )
+
+
+class IonBombardmentSchemaEntryPoint(SchemaPackageEntryPoint):
+    parameter: int = Field(0, description='Custom configuration parameter')
+
+    def load(self):
+        from nomad_age.schema_packages.ion_bombardment_schema import m_package
+
+        return m_package  # Package with Helium Ion Bombardment schemata
+
+
+ion_bombardment_schema_entry_point = IonBombardmentSchemaEntryPoint(
+    name='IonBombardmentSchema',
+    description='Entry Point for custom Helium Ion Bombardment schema.',
+)
@@ -1,5 +1,7 @@
 from nomad.config import config
 from nomad.datamodel import EntryData
+from nomad.datamodel.data import ArchiveSection
+from nomad.datamodel.hdf5 import HDF5Reference
 from nomad.datamodel.metainfo.annotations import ELNAnnotation, ELNComponentEnum
 
 # from nomad.datamodel.metainfo.basesections.v2 import System
@@ -40,6 +42,82 @@ class AGE_RawFile_Reference(EntryData):
     )
 
 
+class AGE_DataQuality(ArchiveSection):
+    m_def = Section(
+        label='Data Quality',
+        description=(
+            'Report of the rows of the data block of a log file which were dropped '
+            'or repaired while parsing.'
+        ),
+    )
+
+    n_rows = Quantity(
+        type=int,
+        description='Number of valid rows',
+    )
+
+    n_malformed_rows = Quantity(
+        type=int,
+        description='Number of dropped rows without the columns of the log format',
+    )
+
+    n_invalid_rows = Quantity(
+        type=int,
+        description='Number of dropped rows with values which are not numbers',
+    )
+
+    n_repaired_rows = Quantity(
+        type=int,
+        description='Number of rows with comma decimals, which were repaired',
+    )
+
+    truncated_last_row = Quantity(
+        type=bool,
+        description='Whether the last row was cut off (e.g. by a crash) and dropped',
+    )
+
+
+class AGE_OffloadedArray(ArchiveSection):
+    m_def = Section(
+        label='Offloaded Array',
+        description=(
+            'An array quantity of a generated archive which is stored in a compressed '
+            'HDF5 file of the upload instead of the archive itself.'
+        ),
+    )
+
+    name = Quantity(
+        type=str,
+        description='Name of the array quantity',
+    )
+
+    reference = Quantity(
+        type=HDF5Reference,
+        description='Dataset of the array (<file>#<path> in the upload)',
+    )
+
+    unit = Quantity(
+        type=str,
+        description='Unit of the stored values',
+    )
+
+    shape = Quantity(
+        type=int,
+        shape=['*'],
+        description='Shape of the array',
+    )
+
+    minimum = Quantity(
+        type=float,
+        description='Minimum of the array (ignoring NaN), in the stored unit',
+    )
+
+    maximum = Quantity(
+        type=float,
+        description='Maximum of the array (ignoring NaN), in the stored unit',
+    )
+
+
 class AGE_Sample(CompositeSystem, EntryData):
     m_def = Section(label='AGE Sample', description='AGE sample data')
 
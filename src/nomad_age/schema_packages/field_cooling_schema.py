@@ -1,17 +1,21 @@
+import numpy as np
 from nomad.config import config
-from nomad.datamodel.data import EntryData
+from nomad.datamodel.data import ArchiveSection, EntryData
 from nomad.datamodel.metainfo.annotations import (
     ELNAnnotation,
     ELNComponentEnum,
     Filter,
     SectionProperties,
 )
-from nomad.datamodel.metainfo.basesections import Process
+from nomad.datamodel.metainfo.basesections import Process, ProcessStep
 
 # from nomad.datamodel.metainfo.basesections.v2 import Process
 from nomad.datamodel.metainfo.plot import PlotSection
 from nomad.datamodel.metainfo.workflow import Link
-from nomad.metainfo import Quantity, SchemaPackage, Section
+from nomad.metainfo import Quantity, SchemaPackage, Section, SubSection
+from nomad.units import ureg
+
+from nomad_age.schema_packages.age_schema import AGE_DataQuality, AGE_OffloadedArray
 
 configuration = config.get_plugin_entry_point(
     'nomad_age.schema_packages:field_cooling_schema_entry_point'
@@ -20,6 +24,127 @@ configuration = config.get_plugin_entry_point(
 m_package = SchemaPackage(name='field_cooling_schema')
 
 
+class AGE_FieldCoolingPhase(ProcessStep):
+    m_def = Section(
+        label='Field Cooling Phase',
+        description=(
+            'A phase (heating, plateau, cooling or final) of a field cooling process, '
+            'segmented from the measured data.'
+        ),
+    )
+
+    start = Quantity(
+        type=float,
+        unit='s',
+        description='Start of the phase, relative to the start of the log',
+    )
+
+    end = Quantity(
+        type=float,
+        unit='s',
+        description='End of the phase, relative to the start of the log',
+    )
+
+    mean_temperature = Quantity(
+        type=float,
+        unit='°C',
+        description='Mean measured temperature during the phase',
+    )
+
+    min_temperature = Quantity(
+        type=float,
+        unit='°C',
+        description='Minimum measured temperature during the phase',
+    )
+
+    max_temperature = Quantity(
+        type=float,
+        unit='°C',
+        description='Maximum measured temperature during the phase',
+    )
+
+    mean_deviation = Quantity(
+        type=float,
+        unit='delta_degC',
+        description='Mean deviation of the measured from the target temperature',
+    )
+
+    max_deviation = Quantity(
+        type=float,
+        unit='delta_degC',
+        description='Maximum deviation of the measured from the target temperature',
+    )
+
+    rate = Quantity(
+        type=float,
+        unit='°C / minute',
+        description='Effective rate of the measured temperature (change over duration)',
+    )
+
+
+class AGE_PressureEvent(ArchiveSection):
+    m_def = Section(
+        label='Pressure Event',
+        description=(
+            'A degradation of the vacuum during a field cooling process: a run of '
+            'samples whose pressure exceeds the rolling baseline by a threshold ratio.'
+        ),
+    )
+
+    channel = Quantity(
+        type=str,
+        description='Pressure gauge of the event (pirani or penning)',
+    )
+
+    phase = Quantity(
+        type=str,
+        description=(
+            'Phase (heating, plateau, cooling or final) in which the event started'
+        ),
+    )
+
+    start = Quantity(
+        type=float,
+        unit='s',
+        description='Start of the event, relative to the start of the log',
+    )
+
+    end = Quantity(
+        type=float,
+        unit='s',
+        description='End of the event, relative to the start of the log',
+    )
+
+    duration = Quantity(
+        type=float,
+        unit='s',
+        description='Duration of the event',
+    )
+
+    peak_time = Quantity(
+        type=float,
+        unit='s',
+        description='Time of the maximum pressure, relative to the start of the log',
+    )
+
+    peak_pressure = Quantity(
+        type=float,
+        unit='mbar',
+        description='Maximum pressure during the event',
+    )
+
+    baseline_pressure = Quantity(
+        type=float,
+        unit='mbar',
+        description='Baseline (rolling median) pressure at the start of the event',
+    )
+
+    ratio = Quantity(
+        type=float,
+        description='Ratio of the maximum to the baseline pressure',
+    )
+
+
 class AGE_FieldCooling(PlotSection, Process, EntryData):
     m_def = Section(
         label='Field Cooling',
@@ -57,21 +182,38 @@ class AGE_FieldCooling(PlotSection, Process, EntryData):
     )
 
     time = Quantity(
-        type=float,
+        type=np.float64,
         shape=['*'],
         unit='s',
-        description='Time series',
+        description='Time series, only stored if it is not regularly sampled',
     )
 
-    measured_temperature = Quantity(
+    time_start = Quantity(
+        type=float,
+        unit='s',
+        description='Start of the regularly sampled time series',
+    )
+
+    time_step = Quantity(
         type=float,
+        unit='s',
+        description='Sampling interval of the regularly sampled time series',
+    )
+
+    time_count = Quantity(
+        type=int,
+        description='Number of points of the regularly sampled time series',
+    )
+
+    measured_temperature = Quantity(
+        type=np.float64,
         shape=['*'],
         unit='°C',
         description='Measured temperature',
     )
 
     target_temperature = Quantity(
-        type=float,
+        type=np.float64,
         shape=['*'],
         unit='°C',
         description='Target temperature',
@@ -79,19 +221,108 @@ class AGE_FieldCooling(PlotSection, Process, EntryData):
     )
 
     pirani_pressure = Quantity(
-        type=float,
+        type=np.float64,
         shape=['*'],
         unit='mbar',
         description='Pirani pressure',
     )
 
     penning_pressure = Quantity(
-        type=float,
+        type=np.float64,
         shape=['*'],
         unit='mbar',
         description='Penning pressure',
     )
 
+    achieved_plateau_temperature = Quantity(
+        type=float,
+        unit='°C',
+        description='Mean measured temperature during the plateau',
+    )
+
+    achieved_plateau_duration = Quantity(
+        type=float,
+        unit='minute',
+        description='Duration of the plateau (target temperature at its maximum)',
+        a_display={'unit': 'minute'},
+    )
+
+    plateau_max_deviation = Quantity(
+        type=float,
+        unit='delta_degC',
+        description=(
+            'Maximum deviation of the measured from the target temperature during '
+            'the plateau'
+        ),
+    )
+
+    effective_cooling_rate = Quantity(
+        type=float,
+        unit='°C / minute',
+        description=(
+            'Mean rate of the measured temperature during the cooling, while the '
+            'target temperature ramps down'
+        ),
+        a_display={'unit': '°C / minute'},
+    )
+
+    time_above_blocking_temperature = Quantity(
+        type=float,
+        unit='minute',
+        description=(
+            'Time the measured temperature is at or above the blocking temperature'
+        ),
+        a_display={'unit': 'minute'},
+    )
+
+    n_pressure_events = Quantity(
+        type=int,
+        description='Number of pressure events (degradations of the vacuum)',
+    )
+
+    max_pressure_ratio = Quantity(
+        type=float,
+        description='Maximum ratio of pressure to baseline pressure of all events',
+    )
+
+    vacuum_degraded = Quantity(
+        type=bool,
+        description='Whether the vacuum degraded (any pressure event) during the log',
+    )
+
+    plateau_vacuum_degraded = Quantity(
+        type=bool,
+        description='Whether the vacuum degraded during the plateau',
+    )
+
+    pressure_events = SubSection(section_def=AGE_PressureEvent, repeats=True)
+
+    data_quality = SubSection(section_def=AGE_DataQuality)
+
+    offloaded_arrays = SubSection(section_def=AGE_OffloadedArray, repeats=True)
+
+    data_offset = Quantity(
+        type=int,
+        description=(
+            'Byte offset of the end of the last complete row parsed from the log file, '
+            'later rows are appended from there on reprocessing (tail mode)'
+        ),
+    )
+
+    data_rows = Quantity(
+        type=int,
+        description='Number of complete rows parsed from the log file',
+    )
+
+    data_last_time = Quantity(
+        type=float,
+        unit='s',
+        description=(
+            'Time of the last complete row as written in the log file, to check that '
+            'the log was only appended to on reprocessing (tail mode)'
+        ),
+    )
+
     data_file = Quantity(
         type=str,
         description='Name of the log file of the process.',
@@ -101,6 +332,18 @@ class AGE_FieldCooling(PlotSection, Process, EntryData):
         ),
     )
 
+    def get_time(self):
+        """
+        Returns the time series, expanded from `time_start`, `time_step` and
+        `time_count` if it is regularly sampled (and thus not stored explicitly).
+        """
+        if self.time is not None or self.time_count is None:
+            return self.time
+        return (
+            self.time_start.to('s').magnitude
+            + self.time_step.to('s').magnitude * np.arange(self.time_count)
+        ) * ureg.s
+
     def normalize(self, archive, logger):
         super().normalize(archive, logger)
         self.method = 'Field Cooling'
@@ -0,0 +1,114 @@
+import numpy as np
+from nomad.config import config
+from nomad.datamodel.data import EntryData
+from nomad.datamodel.metainfo.annotations import (
+    ELNAnnotation,
+    ELNComponentEnum,
+    Filter,
+    SectionProperties,
+)
+from nomad.datamodel.metainfo.basesections import Process
+from nomad.datamodel.metainfo.plot import PlotSection
+from nomad.datamodel.metainfo.workflow import Link
+from nomad.metainfo import Quantity, SchemaPackage, Section, SubSection
+
+from nomad_age.schema_packages.age_schema import AGE_DataQuality, AGE_OffloadedArray
+
+configuration = config.get_plugin_entry_point(
+    'nomad_age.schema_packages:ion_bombardment_schema_entry_point'
+)
+
+m_package = SchemaPackage(name='ion_bombardment_schema')
+
+
+class AGE_HeliumIonBombardment(PlotSection, Process, EntryData):
+    m_def = Section(
+        label='Helium Ion Bombardment',
+        description='A Helium Ion Bombardment process.',
+        a_eln=ELNAnnotation(
+            properties=SectionProperties(
+                visible=Filter(exclude=['lab_id']),
+                editable=dict(exclude=['data_file']),
+            )
+        ),
+    )
+
+    ion_energy = Quantity(
+        type=float,
+        unit='keV',
+        description='Energy of the helium ions',
+        a_eln=ELNAnnotation(component=ELNComponentEnum.NumberEditQuantity),
+        a_display={'unit': 'keV'},
+    )
+
+    target_fluence = Quantity(
+        type=float,
+        unit='1 / cm ** 2',
+        description='Target fluence (ions per area)',
+        a_eln=ELNAnnotation(component=ELNComponentEnum.NumberEditQuantity),
+        a_display={'unit': '1 / cm ** 2'},
+    )
+
+    time = Quantity(
+        type=np.float64,
+        shape=['*'],
+        unit='s',
+        description='Time series',
+    )
+
+    beam_current = Quantity(
+        type=np.float64,
+        shape=['*'],
+        unit='nA',
+        description='Beam current',
+    )
+
+    fluence = Quantity(
+        type=np.float64,
+        shape=['*'],
+        unit='1 / cm ** 2',
+        description='Accumulated fluence',
+    )
+
+    chamber_pressure = Quantity(
+        type=np.float64,
+        shape=['*'],
+        unit='mbar',
+        description='Chamber pressure',
+    )
+
+    achieved_fluence = Quantity(
+        type=float,
+        unit='1 / cm ** 2',
+        description='Fluence accumulated at the end of the log',
+    )
+
+    mean_beam_current = Quantity(
+        type=float,
+        unit='nA',
+        description='Mean beam current',
+    )
+
+    data_quality = SubSection(section_def=AGE_DataQuality)
+
+    offloaded_arrays = SubSection(section_def=AGE_OffloadedArray, repeats=True)
+
+    data_file = Quantity(
+        type=str,
+        description='Name of the log file of the process.',
+        a_eln=ELNAnnotation(
+            component=ELNComponentEnum.FileEditQuantity,
+            label='Helium Ion Bombardment Log File',
+        ),
+    )
+
+    def normalize(self, archive, logger):
+        super().normalize(archive, logger)
+        # The state of the samples is derived from the method (see `AGE_Sample`)
+        self.method = 'Helium Ion Bombardment'
+        archive.workflow2.inputs = [
+            Link(name=sample.name, section=sample.reference) for sample in self.samples
+        ]
+
+
+m_package.__init_metainfo__()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Union
+
+"""
+# Content-addressed cache of parse and normalize results. A result is stored under the
+# hash of the raw content it was derived from, the plugin version and the parameters
+# of the step, so unchanged files are not parsed or evaluated again on reprocessing.
+# Each result is a single `.npz` file: numeric arrays are stored as binary arrays, all
+# other values as a JSON document next to them. The cache is bounded in size; the
+# least recently used results are evicted first. The processes sharing a cache
+# directory each keep a running total of its size, which is synced with the
+# directory at an interval, so the size of all results together is enforced too.
+"""
+# Name of the JSON document of the non-array values in a cached result
+META_KEY = '__meta__'
+# Version of the cached results (part of every cache key), to be bumped whenever a
+# parser or normalizer changes its results, as the plugin version is not
+CACHE_VERSION = 2
+# Seconds after which the running total of the cache size is scanned again
+CACHE_RESCAN_INTERVAL = 60.0
+
+
+def get_plugin_version() -> str:
+    """Returns the installed version of the plugin (part of every cache key)."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version('nomad-age')
+    except PackageNotFoundError:
+        return 'unknown'
+
+
+def json_default(value):
+    """Serialises NumPy values (e.g. in plot data) for the JSON document."""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class ResultCache:
+    """
+    A size-bounded cache of results (dictionaries) on disk, addressed by the hash of
+    the content they were derived from.
+
+    Arguments:
+        directory: str
+            The directory holding the cached results.
+        max_size: int
+            The maximum total size of the cached results in bytes.
+        rescan_interval: float, optional
+            The seconds after which the size is scanned again, to count the results
+            written by other processes sharing the directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: int = 2**30,
+        rescan_interval: float = CACHE_RESCAN_INTERVAL,
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.rescan_interval = rescan_interval
+        self.size = None  # running total of the results, scanned on the first put
+        self.scanned = None  # monotonic time of the last scan
+        self.lock = threading.Lock()
+
+    def key(self, content: Union[bytes, str], step: str, **parameters) -> str:
+        """
+        Returns the cache key of a result.
+
+        Parameters:
+        content (bytes | str): The raw content or the path of the file it is read from.
+        step (str): The name of the step producing the result (e.g. the parser).
+        parameters: The parameters of the step, which must be JSON serialisable.
+
+        Returns:
+        str: The SHA-256 hex digest of content, step, cache and plugin version and
+            parameters.
+        """
+        digest = hashlib.sha256()
+        if isinstance(content, str):
+            with open(content, 'rb') as f:
+                for block in iter(lambda: f.read(2**20), b''):
+                    digest.update(block)
+        else:
+            digest.update(content)
+        digest.update(
+            json.dumps(
+                [step, CACHE_VERSION, get_plugin_version(), parameters],
+                sort_keys=True,
+                default=json_default,
+            ).encode()
+        )
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Returns the cached result for `key` or None if there is none. A hit marks the
+        result as recently used.
+        """
+        import numpy
+
+        path = self.path(key)
+        try:
+            with numpy.load(path, allow_pickle=False) as npz:
+                result = json.loads(str(npz[META_KEY]))
+                for name in npz.files:
+                    if name != META_KEY:
+                        result[name] = npz[name]
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return result
+
+    def put(self, key: str, result: dict) -> None:
+        """
+        Stores a result. Numeric lists and arrays are stored as binary arrays, all other
+        values must be JSON serialisable.
+        """
+        import numpy
+
+        arrays, meta = {}, {}
+        for name, value in result.items():
+            if isinstance(value, (list, numpy.ndarray)) and len(value) > 0:
+                try:
+                    array = numpy.asarray(value)
+                except ValueError:  # ragged nested lists
+                    array = None
+                if array is not None and array.dtype.kind in 'biuf':
+                    arrays[name] = array
+                    continue
+            meta[name] = value
+
+        os.makedirs(self.directory, exist_ok=True)
+        # written to a temporary file first, so readers never see partial results
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(
+                    f,
+                    **{META_KEY: numpy.array(json.dumps(meta, default=json_default))},
+                    **arrays,
+                )
+            written = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(self.path(key))
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            if self.scanned is None or (
+                time.monotonic() - self.scanned >= self.rescan_interval
+            ):
+                self.size = sum(entry_size for _, entry_size, _ in self.scan())
+                self.scanned = time.monotonic()
+            else:
+                self.size += written - replaced
+            if self.size > self.max_size:
+                self.evict()
+
+    def scan(self) -> list[tuple[float, int, str]]:
+        """Returns the modification time, size and path of the cached results."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except OSError:  # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used results until the cache fits its size. The
+        directory is scanned again, as other processes may share the cache. Called
+        with the lock held.
+        """
+        entries = self.scan()
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+        self.size = size
+        self.scanned = time.monotonic()
+
+
+def get_result_cache(directory: str, max_size: int = 2**30) -> Optional[ResultCache]:
+    """
+    Returns the result cache in `directory` or None if caching is disabled (no
+    directory configured).
+    """
+    if not directory:
+        return None
+    return ResultCache(directory, max_size)
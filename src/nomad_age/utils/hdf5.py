@@ -0,0 +1,196 @@
+from typing import Optional
+
+import numpy as np
+
+"""
+# The large arrays of the generated archives (e.g. the channels of a field cooling log
+# or the loops of a raster map) are written to a compressed, chunked HDF5 file next to
+# the archive file (`<archive>.arrays.h5`), the archive only holds a reference and the
+# extrema of each array (`offloaded_arrays`). The processed archive keeps these
+# references as well: the arrays are only read where they are consumed, e.g. by the
+# evaluation of a raster map (`get_offloaded_array`), or in slices
+# (`read_offloaded_array`).
+"""
+# Minimum number of values of an array to be stored in the HDF5 file
+HDF5_MIN_SIZE = 1000
+# Suffix of the HDF5 file replacing the suffix of the archive file
+ARRAY_FILE_SUFFIX = '.arrays.h5'
+# Name of the repeating subsection listing the offloaded arrays of a section
+OFFLOADED_ARRAYS = 'offloaded_arrays'
+
+
+def get_array_file_name(file_name: str) -> str:
+    """Returns the name of the HDF5 file of the arrays of an archive file."""
+    for suffix in ('.archive.yaml', '.archive.json'):
+        if file_name.endswith(suffix):
+            return f'{file_name[: -len(suffix)]}{ARRAY_FILE_SUFFIX}'
+    return f'{file_name}{ARRAY_FILE_SUFFIX}'
+
+
+def get_large_arrays(entity, min_size: int = HDF5_MIN_SIZE) -> dict:
+    """
+    Returns the numeric array quantities of a section with at least `min_size`
+    values, as a dictionary of name to (values in the unit of the quantity, unit).
+    """
+    arrays = {}
+    for quantity in entity.m_def.all_quantities.values():
+        if not quantity.shape or not entity.m_is_set(quantity):
+            continue
+        value = entity.m_get(quantity)
+        unit = str(quantity.unit) if quantity.unit is not None else None
+        if hasattr(value, 'magnitude'):
+            value = value.to(quantity.unit).magnitude if unit else value.magnitude
+        value = np.asarray(value)
+        if value.dtype.kind in 'iuf' and value.size >= min_size:
+            arrays[quantity.name] = (value, unit)
+    return arrays
+
+
+def offload_arrays(entity, data: dict, archive, file_name: str) -> Optional[str]:
+    """
+    Writes the large arrays of a section (see `get_large_arrays`) to the HDF5 file of
+    its archive file and replaces them in the serialised `data` of the archive by
+    `offloaded_arrays` references. Sections without `offloaded_arrays` are written
+    as they are.
+
+    Parameters:
+    entity (ArchiveSection): The section written to the archive file.
+    data (dict): The serialised section (`m_to_dict`), modified in place.
+    archive (EntryArchive): The archive whose context the files are written with.
+    file_name (str): The name of the archive file.
+
+    Returns:
+    str: The name of the HDF5 file or None if no array was offloaded.
+    """
+    import h5py
+
+    if OFFLOADED_ARRAYS not in entity.m_def.all_sub_sections:
+        return None
+    data.pop(OFFLOADED_ARRAYS, None)
+    arrays = get_large_arrays(entity)
+    if not arrays:
+        return None
+
+    array_file_name = get_array_file_name(file_name)
+    offloaded = []
+    with archive.m_context.raw_file(array_file_name, 'w+b') as outfile:
+        with h5py.File(outfile, 'w') as h5file:
+            for name, (values, unit) in arrays.items():
+                dataset = h5file.create_dataset(
+                    name,
+                    data=values,
+                    chunks=True,
+                    compression='gzip',
+                    shuffle=True,
+                )
+                if unit is not None:
+                    dataset.attrs['units'] = unit
+                summary = dict(
+                    name=name,
+                    reference=f'{array_file_name}#/{name}',
+                    unit=unit,
+                    shape=list(values.shape),
+                )
+                if values.size and not np.all(np.isnan(values)):
+                    summary.update(
+                        minimum=float(np.nanmin(values)),
+                        maximum=float(np.nanmax(values)),
+                    )
+                offloaded.append({k: v for k, v in summary.items() if v is not None})
+                data.pop(name, None)
+    data[OFFLOADED_ARRAYS] = offloaded
+    return array_file_name
+
+
+def read_offloaded_array(archive, reference: str, selection=()) -> np.ndarray:
+    """
+    Reads an offloaded array or a slice of it from the HDF5 file in the upload.
+
+    Parameters:
+    archive (EntryArchive): An archive of the upload.
+    reference (str): The reference of the array (`<file>#/<dataset>`).
+    selection (optional): The slice to read (e.g. `np.s_[::10]`), all values if not
+        given.
+
+    Returns:
+    numpy.ndarray: The values in the unit of their quantity.
+    """
+    import h5py
+
+    file_name, path = reference.split('#', 1)
+    with archive.m_context.raw_file(file_name, 'rb') as infile:
+        with h5py.File(infile, 'r') as h5file:
+            return h5file[path][selection]
+
+
+def get_offloaded_array(section, name: str, archive):
+    """
+    Returns an array quantity of a section, read from the HDF5 file of its archive if
+    it was offloaded (see `offload_arrays`). The array is not set on the section, so
+    the processed archive keeps only the reference.
+
+    Parameters:
+    section (ArchiveSection): The section of the quantity.
+    name (str): The name of the quantity.
+    archive (EntryArchive): An archive of the upload.
+
+    Returns:
+    The values (with the unit of the quantity, if it has one), or None if the
+    quantity is neither set nor offloaded.
+    """
+    if section.m_is_set(section.m_def.all_quantities[name]):
+        return section.m_get(name)
+    sub_section = section.m_def.all_sub_sections.get(OFFLOADED_ARRAYS)
+    if sub_section is None:
+        return None
+    for offloaded in section.m_get_sub_sections(sub_section):
+        if offloaded.name != name:
+            continue
+        values = read_offloaded_array(archive, offloaded.reference)
+        if offloaded.unit is None:
+            return values
+        from nomad.units import ureg
+
+        return ureg.Quantity(values, offloaded.unit)
+    return None
+
+
+def migrate_archive(archive, file_name: str, section_cls=None) -> bool:
+    """
+    Writes a generated archive file of an earlier version again, with its large arrays
+    offloaded to HDF5 (see `create_archive`). Archives already written by this
+    version (with a content digest) are left as they are.
+
+    Parameters:
+    archive (EntryArchive): An archive of the upload.
+    file_name (str): The name of the generated archive file.
+    section_cls (type, optional): The section class of the data, resolved from its
+        `m_def` if not given.
+
+    Returns:
+    bool: Whether the archive file was written.
+    """
+    import importlib
+
+    from nomad_age.utils.utils import (
+        create_archive,
+        read_archive_data,
+        read_archive_digest,
+    )
+
+    if read_archive_digest(archive, file_name) is not None:
+        return False
+    data = read_archive_data(archive, file_name)
+    if data is None:
+        return False
+    data = dict(data)
+    m_def = data.pop('m_def', '')
+    if section_cls is None:
+        module_name, _, class_name = m_def.rpartition('.')
+        try:
+            section_cls = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError, ValueError):
+            return False
+    return create_archive(
+        section_cls.m_from_dict(data), archive, file_name, overwrite=True
+    )
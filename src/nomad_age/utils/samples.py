@@ -0,0 +1,268 @@
+import threading
+import time
+from collections.abc import Iterable
+from typing import Callable, Optional
+
+from nomad_age.utils.utils import get_hash_ref, get_reference, write_archive
+
+"""
+# Resolution of the lab IDs of samples (as named in the instrument logs) to the
+# references of their AGE_Sample entries. All lab IDs of a parse (or the samples of a
+# whole upload) are looked up with a single terms query instead of one search per ID,
+# and the references found are kept in a per-process cache for a limited time, so
+# reprocessing an upload does not search again for every log. The search backend is
+# a plain function of the query, which tests replace by an in-memory stand-in.
+#
+# Samples which do not exist yet are created through a registry (`SampleRegistry`)
+# held by one parse: the archive file of a sample is created atomically, so parsers
+# processing logs of the same new sample in parallel create it exactly once, and all
+# samples created while parsing a log are processed together when it is written.
+"""
+# Seconds a resolved sample reference is reused without searching again
+SAMPLE_CACHE_TTL = 300.0
+# Fields of the search results needed to reference a sample
+SAMPLE_SEARCH_FIELDS = ('entry_id', 'upload_id', 'results.eln.lab_ids')
+
+
+def search_samples(query: dict) -> list[dict]:
+    """
+    Searches all visible entries matching `query` (all pages).
+
+    Parameters:
+    query (dict): The search query (see `nomad.search.search`).
+
+    Returns:
+    list[dict]: The `entry_id`, `upload_id` and `results.eln.lab_ids` of the entries.
+    """
+    from nomad.app.v1.models import MetadataRequired
+    from nomad.search import search_iterator
+
+    required = MetadataRequired(include=list(SAMPLE_SEARCH_FIELDS))
+    return list(search_iterator(owner='visible', query=query, required=required))
+
+
+def get_lab_ids(entry: dict) -> list[str]:
+    """Returns the lab IDs of a search result."""
+    return entry.get('results', {}).get('eln', {}).get('lab_ids', [])
+
+
+class SampleResolver:
+    """
+    Resolves lab IDs to the references of their AGE_Sample entries with batched
+    searches and a time-limited cache of the references found. IDs without a sample
+    are not cached, so a sample is found as soon as it is indexed. The resolver is
+    shared by the parsers of a process and its cache is safe to use from several
+    threads; the searches run outside of its lock.
+
+    Arguments:
+        search: Callable, optional
+            The search backend, a function of the query returning the matching
+            entries (see `search_samples`).
+        ttl: float, optional
+            The seconds a resolved reference is reused without searching again.
+        clock: Callable, optional
+            The monotonic clock of the cache (seconds).
+    """
+
+    def __init__(
+        self,
+        search: Callable[[dict], list[dict]] = search_samples,
+        ttl: float = SAMPLE_CACHE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.search = search
+        self.ttl = ttl
+        self.clock = clock
+        self.references = {}  # lab_id -> (reference, expiry)
+        self.prefetched_uploads = {}  # upload_id -> expiry
+        self.lock = threading.Lock()
+
+    def get_cached(self, lab_id: str) -> Optional[str]:
+        """Returns the cached reference of a lab ID, if it has not expired."""
+        with self.lock:
+            cached = self.references.get(lab_id)
+            if cached is None:
+                return None
+            reference, expiry = cached
+            if expiry <= self.clock():
+                del self.references[lab_id]
+                return None
+            return reference
+
+    def add_results(self, entries: list[dict], lab_ids: Iterable[str] = None) -> None:
+        """
+        Caches the references of the samples in a search result.
+
+        Parameters:
+        entries (list[dict]): The entries found (see `search_samples`).
+        lab_ids (Iterable[str], optional): The lab IDs to cache, all lab IDs of the
+            entries if not given.
+
+        Raises:
+        ValueError: If several entries have the same lab ID.
+        """
+        wanted = None if lab_ids is None else set(lab_ids)
+        found = {}
+        for entry in entries:
+            for lab_id in get_lab_ids(entry):
+                if wanted is not None and lab_id not in wanted:
+                    continue
+                if lab_id in found and found[lab_id] != entry['entry_id']:
+                    raise ValueError(
+                        f'Two samples have the same ID ({lab_id}). Something went wrong'
+                    )
+                found[lab_id] = entry['entry_id']
+                reference = (
+                    f'{get_reference(entry["upload_id"], entry["entry_id"])}#data'
+                )
+                with self.lock:
+                    self.references[lab_id] = (reference, self.clock() + self.ttl)
+
+    def prefetch_upload(self, upload_id: str) -> None:
+        """
+        Caches the references of all samples of an upload with one search, unless
+        they were prefetched within the cache time.
+        """
+        with self.lock:
+            expiry = self.prefetched_uploads.get(upload_id)
+            if expiry is not None and expiry > self.clock():
+                return
+        entries = self.search({'upload_id': upload_id, 'entry_type': 'AGE_Sample'})
+        self.add_results(entries)
+        with self.lock:
+            self.prefetched_uploads[upload_id] = self.clock() + self.ttl
+
+    def resolve(self, lab_ids: Iterable[str]) -> dict[str, str]:
+        """
+        Resolves lab IDs to the references of their samples. The IDs which are not
+        cached are searched with a single terms query.
+
+        Parameters:
+        lab_ids (Iterable[str]): The lab IDs, e.g. of all samples of a log.
+
+        Returns:
+        dict[str, str]: The reference of each lab ID with an existing sample.
+
+        Raises:
+        ValueError: If several samples have the same lab ID.
+        """
+        lab_ids = list(dict.fromkeys(lab_ids))
+        missing = [lab_id for lab_id in lab_ids if self.get_cached(lab_id) is None]
+        if missing:
+            entries = self.search({'results.eln.lab_ids:any': missing})
+            self.add_results(entries, missing)
+        references = {}
+        for lab_id in lab_ids:
+            reference = self.get_cached(lab_id)
+            if reference is not None:
+                references[lab_id] = reference
+        return references
+
+    def invalidate(self, lab_id: str) -> None:
+        """Drops the cached reference of a lab ID, e.g. when its sample is created."""
+        with self.lock:
+            self.references.pop(lab_id, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.references.clear()
+            self.prefetched_uploads.clear()
+
+
+# The resolver of the process (see `get_sample_resolver`)
+_sample_resolver = None
+
+
+def get_sample_resolver() -> SampleResolver:
+    """Returns the sample resolver of the process, sharing its cache between parses."""
+    global _sample_resolver
+    if _sample_resolver is None:
+        _sample_resolver = SampleResolver()
+    return _sample_resolver
+
+
+def get_sample_file_name(lab_id: str) -> str:
+    """Returns the name of the archive file of a sample created by the parsers."""
+    return f'{lab_id}.archive.yaml'
+
+
+class SampleRegistry:
+    """
+    Get-or-create of the samples of an upload, held by one parse (e.g. for the
+    duration of `InstrumentLogParser.write_entry`) and dropped after `flush`.
+    Existing samples are resolved in one batched lookup (see `SampleResolver`);
+    missing ones are created by exclusively creating their archive file in the
+    upload, so that of several parsers creating the same sample concurrently, each
+    with its own registry, exactly one writes it and all get the same reference.
+    The created samples are collected until `flush`, which triggers their
+    processing after all of them are written.
+
+    Arguments:
+        upload_id: str
+            The upload the samples are created in.
+        resolver: SampleResolver, optional
+            The resolver of existing samples, the one of the process if not given.
+    """
+
+    def __init__(self, upload_id: str, resolver: SampleResolver = None):
+        self.upload_id = upload_id
+        self.resolver = resolver or get_sample_resolver()
+        self.pending = {}  # lab_id -> archive file name, created but not processed
+        self.lock = threading.Lock()
+
+    def create(self, lab_id: str, archive) -> str:
+        """
+        Creates the archive file of a sample unless it exists (atomically) and
+        returns its reference. Only the parser creating the file processes it.
+        """
+        from nomad_age.schema_packages.age_schema import AGE_Sample
+
+        file_name = get_sample_file_name(lab_id)
+        with self.lock:
+            if lab_id not in self.pending:
+                try:
+                    write_archive(
+                        AGE_Sample(name=lab_id, lab_id=lab_id), archive, file_name, 'x'
+                    )
+                    self.pending[lab_id] = file_name
+                except FileExistsError:  # created by another parser
+                    pass
+        self.resolver.invalidate(lab_id)
+        return get_hash_ref(self.upload_id, file_name)
+
+    def get_or_create(self, lab_ids: Iterable[str], archive) -> dict[str, str]:
+        """
+        Returns the references of the samples with the given lab IDs, creating the
+        samples which do not exist yet (see `create`).
+
+        Parameters:
+        lab_ids (Iterable[str]): The lab IDs, e.g. of all samples of a log.
+        archive (EntryArchive): The archive being parsed, whose context the sample
+            archives are written with.
+
+        Returns:
+        dict[str, str]: The reference of each lab ID.
+        """
+        lab_ids = list(dict.fromkeys(lab_ids))
+        self.resolver.prefetch_upload(self.upload_id)
+        references = self.resolver.resolve(lab_ids)
+        for lab_id in lab_ids:
+            if lab_id not in references:
+                references[lab_id] = self.create(lab_id, archive)
+        return references
+
+    def flush(self, archive) -> list[str]:
+        """
+        Triggers the processing of all samples created since the last flush, once
+        per archive file. The context processes one raw file per call, there is no
+        call for several files.
+
+        Returns:
+        list[str]: The archive files of the processed samples.
+        """
+        with self.lock:
+            file_names = sorted(set(self.pending.values()))
+            self.pending.clear()
+        for file_name in file_names:
+            archive.m_context.process_updated_raw_file(file_name, allow_modify=False)
+        return file_names
@@ -1,8 +1,36 @@
 import math
+import os
+from typing import Optional
 
+import numpy as np
 from nomad.datamodel.data import ArchiveSection
 from nomad.utils import hash
 
+from nomad_age.utils.hdf5 import OFFLOADED_ARRAYS, offload_arrays
+
+# Size of the header prefix in which matchers look for the banner of a file
+HEADER_SNIFF_SIZE = 4096
+# First line of the archive files written by the parsers, followed by their digest
+ARCHIVE_DIGEST_PREFIX = '# nomad-age-digest: '
+
+
+def sniff_header(filename, buffer, header_re, size=HEADER_SNIFF_SIZE):
+    """
+    Checks if the header of a file (its first `size` bytes) matches `header_re`.
+    The buffer already read by the matcher is searched first, the file itself is only
+    read if the banner is not in the buffer and the header extends beyond it. Binary
+    files (containing NUL bytes) are rejected.
+    """
+    header = (buffer or b'')[:size]
+    if header_re.search(header) is None:
+        if len(header) == size or os.path.getsize(filename) <= len(header):
+            return False
+        with open(filename, 'rb') as f:
+            header = f.read(size)
+        if header_re.search(header) is None:
+            return False
+    return b'\x00' not in header
+
 
 def get_reference(upload_id, entry_id):
     return f'../uploads/{upload_id}/archive/{entry_id}'
@@ -54,21 +82,215 @@ def dict_nan_equal(dict1, dict2):
     return True
 
 
+def is_numeric_list(value) -> bool:
+    return bool(value) and all(
+        type(item) in (float, int) or isinstance(item, np.number) for item in value
+    )
+
+
+def update_digest(digest, value) -> None:
+    """
+    Feeds a value of an archive (nested dictionaries, lists, arrays and scalars) in
+    a canonical form into a hash: dictionaries with sorted keys, numeric lists and
+    arrays as their float64 bytes and all NaN values (and zeros) alike.
+    """
+    if isinstance(value, dict):
+        digest.update(b'{')
+        for key in sorted(value, key=str):
+            update_digest(digest, str(key))
+            update_digest(digest, value[key])
+        digest.update(b'}')
+    elif isinstance(value, np.ndarray) and value.dtype.kind not in 'iuf':
+        update_digest(digest, value.tolist())
+    elif isinstance(value, np.ndarray) or (
+        isinstance(value, (list, tuple)) and is_numeric_list(value)
+    ):
+        array = np.asarray(value, dtype='<f8')
+        array = np.where(np.isnan(array), np.nan, array + 0.0)  # NaN and -0.0
+        digest.update(f'a{array.shape}'.encode())
+        digest.update(array.tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(b'[')
+        for item in value:
+            update_digest(digest, item)
+        digest.update(b']')
+    elif value is None or isinstance(value, (bool, np.bool_)):
+        digest.update(f'{value}'.encode())
+    elif isinstance(value, (float, np.floating)):
+        value = float('nan') if math.isnan(value) else float(value) + 0.0
+        digest.update(b'f' + np.float64(value).tobytes())
+    else:
+        text = str(value).encode()
+        digest.update(f'{type(value).__name__}{len(text)}:'.encode() + text)
+
+
+def get_archive_digest(content: dict) -> str:
+    """Returns the content digest of an archive (see `update_digest`)."""
+    import hashlib
+
+    digest = hashlib.sha256()
+    update_digest(digest, content)
+    return f'sha256:{digest.hexdigest()}'
+
+
+def read_archive_digest(archive, file_name) -> Optional[str]:
+    """
+    Returns the content digest stored in the first line of an archive file written
+    by `write_archive`, or None if the file does not exist or has none (e.g. it was
+    saved from the ELN since).
+    """
+    try:
+        with archive.m_context.raw_file(file_name, 'r') as infile:
+            line = infile.readline()
+    except (KeyError, OSError, ValueError):
+        return None
+    if not line.startswith(ARCHIVE_DIGEST_PREFIX):
+        return None
+    return line[len(ARCHIVE_DIGEST_PREFIX) :].strip()
+
+
+def write_archive_content(content, archive, file_name, mode='w', digest=None):
+    import json
+
+    import yaml
+
+    with archive.m_context.raw_file(file_name, mode) as outfile:
+        if file_name.endswith('.yaml'):
+            if digest is not None:
+                outfile.write(f'{ARCHIVE_DIGEST_PREFIX}{digest}\n')
+            yaml.dump(content, outfile)
+        elif file_name.endswith('.json'):  # no comments, thus no digest
+            json.dump(content, outfile)
+
+
+def get_archive_content(entity) -> dict:
+    """
+    Returns the content of the archive file of a section. The `offloaded_arrays` are
+    left out, they are derived when the file is written (see `offload_arrays`).
+    """
+    data = entity.m_to_dict(with_root_def=True)
+    data.pop(OFFLOADED_ARRAYS, None)
+    return {'data': data}
+
+
+def write_archive(entity, archive, file_name, mode: str = 'w') -> str:
+    """
+    Writes a section as the `data` of an archive file (`.yaml` or `.json`) into the
+    raw files of the upload, YAML files with the digest of their content in the
+    first line (see `get_archive_digest`). Large arrays are written to an HDF5 file
+    next to it (see `offload_arrays`). With `mode='x'`, the file is only created if
+    it does not exist yet (atomically, FileExistsError otherwise).
+
+    Returns:
+    str: The content digest of the archive.
+    """
+    content = get_archive_content(entity)
+    digest = get_archive_digest(content)
+    offload_arrays(entity, content['data'], archive, file_name)
+    write_archive_content(content, archive, file_name, mode, digest)
+    return digest
+
+
 def create_archive(entity, archive, file_name, *, overwrite: bool = False):
+    """
+    Writes a section to an archive file in the upload (see `write_archive`) and
+    processes it, if the file does not exist or, with `overwrite`, if its content
+    changed. Whether it changed is decided by the content digest in the existing
+    file alone.
+
+    Returns:
+    bool: Whether the archive file was written.
+    """
+    exists = archive.m_context.raw_path_exists(file_name)
+    if exists and not overwrite:
+        return False
+    content = get_archive_content(entity)
+    digest = get_archive_digest(content)
+    if exists and read_archive_digest(archive, file_name) == digest:
+        return False
+    offload_arrays(entity, content['data'], archive, file_name)
+    write_archive_content(content, archive, file_name, 'w', digest)
+    archive.m_context.process_updated_raw_file(file_name, allow_modify=overwrite)
+    return True
+
+
+def get_editable_quantities(section_def) -> list[str]:
+    """
+    Returns the names of the quantities of a section which the users can edit: those
+    with an ELN edit component, filtered by the `editable` properties of the section.
+    """
+    annotation = section_def.m_get_annotations('eln')
+    editable = None
+    if annotation is not None and annotation.properties is not None:
+        editable = annotation.properties.editable
+    if isinstance(editable, dict):
+        include, exclude = editable.get('include'), editable.get('exclude')
+    else:
+        include = getattr(editable, 'include', None)
+        exclude = getattr(editable, 'exclude', None)
+
+    names = []
+    for quantity in section_def.all_quantities.values():
+        eln = quantity.m_get_annotations('eln')
+        if eln is None or eln.component is None:
+            continue
+        if include is not None and quantity.name not in include:
+            continue
+        if exclude is not None and quantity.name in exclude:
+            continue
+        names.append(quantity.name)
+    return names
+
+
+def read_archive_data(archive, file_name) -> Optional[dict]:
+    """
+    Reads the `data` of an archive file (`.yaml` or `.json`) from the raw files of
+    the upload, or returns None if it does not exist or cannot be read.
+    """
     import json
 
     import yaml
 
-    if not archive.m_context.raw_path_exists(file_name) or overwrite:
-        entity_entry = entity.m_to_dict(with_root_def=True)
-        with archive.m_context.raw_file(file_name, 'w') as outfile:
-            if file_name.endswith('.yaml'):
-                yaml.dump({'data': entity_entry}, outfile)
-            elif file_name.endswith('.json'):
-                json.dump({'data': entity_entry}, outfile)
-        archive.m_context.process_updated_raw_file(file_name, allow_modify=overwrite)
-        return True
-    return False
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    try:
+        with archive.m_context.raw_file(file_name, 'r') as infile:
+            if file_name.endswith('.json'):
+                content = json.load(infile)
+            else:
+                content = yaml.load(infile, Loader=loader)
+    except (KeyError, OSError, ValueError, yaml.YAMLError):
+        return None
+    if not isinstance(content, dict) or not isinstance(content.get('data'), dict):
+        return None
+    return content['data']
+
+
+def merge_editable_quantities(entity, data: dict) -> list[str]:
+    """
+    Sets the user-editable quantities of a section (see `get_editable_quantities`)
+    to their values in the data of an existing archive, e.g. to keep the ELN edits
+    of a generated archive when it is written again. Only these quantities of the
+    data are deserialised.
+
+    Returns:
+    list[str]: The names of the quantities which were changed.
+    """
+    names = [name for name in get_editable_quantities(entity.m_def) if name in data]
+    section_cls = entity.m_def.section_cls
+    edited = section_cls.m_from_dict({name: data[name] for name in names})
+    # Compared in serialised form (e.g. quantities with units, datetimes)
+    current = section_cls()
+    for name in names:
+        if entity.m_is_set(entity.m_def.all_quantities[name]):
+            setattr(current, name, getattr(entity, name))
+    current_dict, edited_dict = current.m_to_dict(), edited.m_to_dict()
+
+    changed = []
+    for name in names:
+        if not nan_equal(current_dict.get(name), edited_dict.get(name)):
+            setattr(entity, name, getattr(edited, name))
+            changed.append(name)
+    return changed
 
 
 def find_existing_AGE_sample(lab_id: str):
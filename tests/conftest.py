@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+
+class UploadContext:
+    """Stand-in for the archive context of an upload, recording the processing."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.processed = []
+
+    def raw_path_exists(self, path):
+        return os.path.exists(os.path.join(self.directory, path))
+
+    def raw_file(self, path, *args, **kwargs):
+        return open(os.path.join(self.directory, path), *args, **kwargs)
+
+    def process_updated_raw_file(self, path, allow_modify=False):
+        self.processed.append(path)
+
+
+class UploadArchive:
+    def __init__(self, context):
+        self.m_context = context
+
+
+@pytest.fixture
+def upload_archive(tmp_path):
+    """An archive whose raw files are written to `tmp_path`."""
+    return UploadArchive(UploadContext(str(tmp_path)))
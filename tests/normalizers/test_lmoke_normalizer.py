@@ -0,0 +1,68 @@
+import logging
+
+import nomad.normalizing  # noqa: F401 (loads the entry points of the normalizers)
+import numpy as np
+from nomad.datamodel import EntryArchive
+
+from nomad_age.normalizers.LMOKEnormalizer import LMOKENormalizer
+from nomad_age.parsers.LMOKEparser import read_lmoke_file
+
+TEST_FILE = 'tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt'
+PARAMETERS = ('HC', 'dHC', 'HEB', 'dHEB')
+
+
+def evaluate_as_measured(data) -> dict:
+    """The evaluation of all data in one loop, without the cycle averaging."""
+    normalizer = LMOKENormalizer()
+    magnetization = normalizer.normalize_magnetization(
+        data.magnetic_field, data.intensity
+    )
+    return normalizer.get_parameters(
+        normalizer.hyseval(data.magnetic_field, magnetization, 'tan_hyseval')
+    )
+
+
+def get_magnitude(data, name):
+    return getattr(data[name], 'magnitude', data[name])
+
+
+def normalize(data, **kwargs) -> EntryArchive:
+    archive = EntryArchive(data=data)
+    LMOKENormalizer(**kwargs).normalize(archive, logging.getLogger())
+    return archive
+
+
+def test_lmoke_normalizer_single_cycle():
+    expected = evaluate_as_measured(read_lmoke_file(TEST_FILE))
+    assert expected.get('HC') is not None
+
+    for average_cycles in (False, True):
+        data = normalize(read_lmoke_file(TEST_FILE), average_cycles=average_cycles).data
+        for name in PARAMETERS:
+            assert np.isclose(
+                get_magnitude(data, name), expected[name], equal_nan=True
+            ), name
+
+
+def test_lmoke_normalizer_average_cycles():
+    """Cycles are only averaged if enabled, by default all data is evaluated."""
+    data = read_lmoke_file(TEST_FILE)
+    data.magnetic_field = np.tile(data.magnetic_field, 2)
+    data.intensity = np.tile(data.intensity, 2)
+    data.branch_starts = [0, 100, 200, 300]
+    data.branch_directions = [-1, 1, -1, 1]
+    expected = evaluate_as_measured(data)
+
+    measured = normalize(data.m_copy(deep=True)).data
+    averaged = normalize(data.m_copy(deep=True), average_cycles=True).data
+    assert np.shape(measured.magnetization) == (400,)
+    assert np.shape(averaged.magnetization) == (400,)
+    for name in PARAMETERS:
+        assert np.isclose(
+            get_magnitude(measured, name), expected[name], equal_nan=True
+        ), name
+
+    # both cycles are the same, so their average is the single cycle
+    single = evaluate_as_measured(read_lmoke_file(TEST_FILE))
+    for name in ('HC', 'HEB'):
+        assert np.isclose(get_magnitude(averaged, name), single[name], rtol=1e-2), name
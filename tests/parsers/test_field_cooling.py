@@ -1,33 +1,249 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from nomad.units import ureg
+
+from nomad_age.parsers.field_cooling_events import PressureEventDetector
+from nomad_age.parsers.field_cooling_parser import (
+    PHASES,
+    AGE_FieldCooling,
+    FieldCoolingParser,
+    add_pressure_events,
+    extend_field_cooling_entry,
+    find_phases,
+    get_regular_grid,
+    read_field_cooling_file,
+    read_generated_entry,
+)
+from nomad_age.utils.utils import create_archive
+
+TEST_FILE = 'tests/data/fieldcooling/2024.10.18-2024_0207, 2024_0208 2nd time.DAT'
+
+
 def test_field_cooling_parser():
-    """This all does not work yet.
-    There is a lot of database manipulation in the parser.
-    the whole text parsing should probably be taken out into a TextParser"""
-    pass
-    # parser = FieldCoolingParser()
-    # archive = EntryArchive(metadata=EntryMetadata(upload_id="test_upload_id"))
-
-    # # Path to your test file in tests/data/fieldcooling
-    # test_file = "tests/data/fieldcooling/2024.10.18-2024_0207, 2024_0208 2nd time.DAT"
-
-    # # Run the parser
-    # parser.parse(test_file, archive, logging.getLogger())
-
-    # # Access parsed data through archive.data
-    # entry = archive.data
-
-    # # Test metadata parsing
-    # # TODO: Samples
-    # # assert isinstance(entry.samples, MSubSectionList)
-    # # assert [sample.name for sample in entry.samples] == ['2024_0207', '2024_0208']
-    # assert entry.datetime == datetime(2024, 10, 18, 17, 37, 59, tzinfo=timezone.utc)
-    # assert entry.blocking_temperature == ureg.Quantity(350.0, ureg.degC)
-    # assert entry.plateau_duration == ureg.Quantity(60.0, ureg.minute)
-    # assert entry.cooling_rate == ureg.Quantity(50.0, ureg.delta_degC / ureg.minute)
-
-    # # Test time series data
-    # assert entry.time[0] == 0.0
-    # assert entry.measured_temperature[0] == ureg.Quantity(44.7486074, ureg.degC)
-    # assert entry.target_temperature[0] == ureg.Quantity(25.0, ureg.degC)
-    # assert entry.pirani_pressure[0] == ureg.Quantity(0.2430133, ureg.mbar)
-    # assert entry.penning_pressure[0] == ureg.Quantity(0.0000040, ureg.mbar)
-    # assert len(entry.time) == 23682
+    """The text parsing is tested on its own (`read_field_cooling_file`), the parser
+    itself needs the database to look up and create the samples."""
+    entry = read_field_cooling_file(TEST_FILE)
+
+    # Test metadata parsing
+    assert [sample.lab_id for sample in entry.samples] == ['2024_0207', '2024_0208']
+    assert entry.datetime == datetime(2024, 10, 18, 17, 37, 59, tzinfo=timezone.utc)
+    assert entry.blocking_temperature == ureg.Quantity(350.0, ureg.degC)
+    assert entry.plateau_duration == ureg.Quantity(60.0, ureg.minute)
+    assert entry.cooling_rate == ureg.Quantity(50.0, ureg.delta_degC / ureg.minute)
+
+    # Test time series data
+    assert entry.get_time()[0] == 0.0
+    assert entry.measured_temperature[0] == ureg.Quantity(44.7486074, ureg.degC)
+    assert entry.target_temperature[0] == ureg.Quantity(25.0, ureg.degC)
+    assert entry.pirani_pressure[0] == ureg.Quantity(0.2430133, ureg.mbar)
+    assert entry.penning_pressure[0] == ureg.Quantity(0.0000040, ureg.mbar)
+    assert len(entry.get_time()) == 23682
+
+    # the time series are contiguous views of the parsed data, not copies
+    magnitude = entry.measured_temperature.magnitude
+    assert magnitude.flags['C_CONTIGUOUS']
+    assert magnitude.base is entry.penning_pressure.magnitude.base
+
+    # the regularly sampled time axis is stored as start, step and count
+    assert entry.time is None
+    assert entry.time_step == ureg.Quantity(0.5, ureg.s)
+    assert entry.time_count == 23682
+    assert entry.get_time()[-1] == ureg.Quantity(0.5 * 23681, ureg.s)
+
+
+def test_field_cooling_data_quality(tmp_path):
+    # a damaged log is parsed instead of failing, with the report on the entry
+    with open(TEST_FILE, 'rb') as f:
+        content = f.read()
+    rows = content.split(b'\n')
+    rows[100] = rows[100].replace(b'.', b',')
+    rows[200] = rows[200][:3] + b'\x00' + rows[200][4:]
+    mainfile = tmp_path / 'damaged.DAT'
+    mainfile.write_bytes(b'\n'.join(rows)[:-30])
+    entry = read_field_cooling_file(str(mainfile))
+    quality = entry.data_quality
+    assert quality.n_rows == entry.measured_temperature.shape[0] == 23680
+    assert (quality.n_malformed_rows, quality.n_invalid_rows) == (0, 1)
+    assert quality.n_repaired_rows == 1
+    assert quality.truncated_last_row
+
+
+def test_field_cooling_tail_mode(tmp_path, upload_archive):
+    with open(TEST_FILE, 'rb') as f:
+        content = f.read()
+    mainfile = tmp_path / 'running.DAT'
+    file_name = 'running.DAT.archive.yaml'
+    mainfile.write_bytes(content)
+    expected = read_field_cooling_file(str(mainfile)).m_to_dict()
+
+    def process(cut):
+        """Writes the entry of the log cut at `cut` to its generated archive."""
+        mainfile.write_bytes(content[:cut])
+        entry = read_field_cooling_file(str(mainfile))
+        assert entry.data_offset == content.rindex(b'\n', 0, cut) + 1
+        create_archive(entry, upload_archive, file_name, overwrite=True)
+        return entry.data_rows
+
+    # the log is processed while its last row is still being written, once in the
+    # middle of the pressure event (rows 180 to 329) and once after it
+    for cut in (content.index(b'\n125.0000000\t') + 20, len(content) // 2):
+        n_rows = process(cut)
+        mainfile.write_bytes(content)
+        entry = read_generated_entry(upload_archive, file_name)
+        assert extend_field_cooling_entry(entry, str(mainfile), block_size=2**12) > 0
+        assert entry.data_rows > n_rows
+        assert extend_field_cooling_entry(entry, str(mainfile)) == 0
+
+        extended = entry.m_to_dict()
+        extended.pop('offloaded_arrays', None)
+        assert extended == expected
+
+    # a log which was not just appended to is read again
+    offset = entry.data_offset - 3  # last digit of the last row
+    digit = b'1' if content[offset : offset + 1] != b'1' else b'2'
+    mainfile.write_bytes(content[:offset] + digit + content[offset + 1 :])
+    assert extend_field_cooling_entry(entry, str(mainfile)) is None
+    mainfile.write_bytes(content[: len(content) // 2])
+    assert extend_field_cooling_entry(entry, str(mainfile)) is None
+
+
+def test_field_cooling_plot_decimation():
+    entry = read_field_cooling_file(TEST_FILE, plot_max_points=500)
+    for trace in entry.figures[0].figure['data']:
+        assert len(trace['x']) == len(trace['y']) <= 500
+    assert len(entry.get_time()) == 23682
+
+
+def test_field_cooling_phases():
+    heating = np.linspace(25, 300, 50, endpoint=False)
+    ramp = np.linspace(300, 25, 51)[1:]
+    target = np.r_[heating, np.full(100, 300.0), ramp, np.full(50, 25.0)]
+    # the measured temperature lags behind the ramp and settles at its end
+    measured = np.r_[heating, np.full(100, 300.0), ramp + 20, np.linspace(45, 25, 50)]
+    assert find_phases(target) == [
+        ('heating', 0, 50),
+        ('plateau', 50, 150),
+        ('cooling', 150, 199),
+        ('final', 199, 250),
+    ]
+    assert find_phases(target, measured)[2:] == [
+        ('cooling', 150, 245),
+        ('final', 245, 250),
+    ]
+    assert find_phases(np.full(10, 300.0)) == [('plateau', 0, 10)]
+
+    entry = read_field_cooling_file(TEST_FILE)
+    assert [phase.name for phase in entry.steps] == list(PHASES)
+    plateau = entry.steps[1]
+    assert plateau.start == ureg.Quantity(1301.0, ureg.s)
+    assert plateau.duration == ureg.Quantity(3620.0, ureg.s)
+    assert plateau.min_temperature <= plateau.mean_temperature
+    assert entry.achieved_plateau_temperature == plateau.mean_temperature
+    assert entry.achieved_plateau_duration.to('minute').magnitude > 60
+    assert entry.time_above_blocking_temperature is not None
+
+    # the cooling ends with the ramp of the target temperature (at 50 °C/min, before
+    # the heater is switched off), not with the log
+    cooling = entry.steps[2]
+    assert cooling.end == ureg.Quantity(5141.0, ureg.s)
+    assert 5 < entry.effective_cooling_rate.to('delta_degC / minute').magnitude < 50
+
+
+def test_pressure_events():
+    rng = np.random.default_rng(0)
+    time = np.arange(3000) * 0.5
+    pressure = 1e-6 * (1 + 0.05 * rng.standard_normal(time.size))
+    pressure[500:520] *= 5
+    pressure[1000:1003] *= 10
+    pressure[2990:] *= 4
+
+    # the baseline is the median of the preceding window, also across chunks
+    detector = PressureEventDetector(window=31)
+    baseline = np.concatenate(
+        [detector.get_baseline(pressure[:1234]), detector.get_baseline(pressure[1234:])]
+    )
+    padded = np.r_[np.full(31, pressure[0]), pressure]
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 31)[:-1]
+    assert np.allclose(baseline, np.median(windows, axis=1))
+
+    detector = PressureEventDetector()
+    detector.update(time, pressure)
+    events = detector.finish()
+    assert [(event['start'], event['end']) for event in events] == [
+        (250.0, 259.5),
+        (500.0, 501.0),
+        (1495.0, 1499.5),
+    ]
+    assert events[1]['peak_pressure'] / events[1]['baseline'] > 8
+
+    # events spanning chunks are merged, so the chunk size does not matter
+    detector = PressureEventDetector()
+    for start in range(0, time.size, 7):
+        detector.update(time[start : start + 7], pressure[start : start + 7])
+    assert detector.finish() == events
+
+    entry = read_field_cooling_file(TEST_FILE)
+    assert entry.n_pressure_events == len(entry.pressure_events) == 1
+    assert entry.vacuum_degraded and not entry.plateau_vacuum_degraded
+    event = entry.pressure_events[0]
+    assert (event.channel, event.phase) == ('penning', 'heating')
+    assert event.peak_pressure > event.baseline_pressure
+    assert entry.max_pressure_ratio == event.ratio
+
+
+def test_pressure_events_zero_baseline():
+    # a gauge reading zero (e.g. switched off) has no pressure ratio
+    time = np.arange(1000) * 0.5
+    pressure = np.zeros(time.size)
+    pressure[600:610] = 1e-3
+    detector = PressureEventDetector()
+    detector.update(time, pressure)
+    events = detector.finish()
+    assert [event['baseline'] for event in events] == [0.0]
+
+    entry = AGE_FieldCooling()
+    add_pressure_events(
+        entry, {'pirani': events, 'penning': [dict(events[0], baseline=-1e-6)]}
+    )
+    assert entry.n_pressure_events == 2 and entry.vacuum_degraded
+    assert all(event.ratio is None for event in entry.pressure_events)
+    assert entry.max_pressure_ratio is None
+
+
+def test_regular_grid():
+    time = np.arange(1000) * 0.5 + 10.0
+    assert get_regular_grid(time) == (10.0, 0.5)
+    assert get_regular_grid(time + np.random.default_rng(0).normal(0, 1e-5, 1000))
+
+    # irregular time axes (e.g. a gap in the log) are stored explicitly
+    time[500:] += 3.0
+    assert get_regular_grid(time) is None
+    assert get_regular_grid(time[:1]) is None
+
+
+def test_field_cooling_cache(tmp_path):
+    parser = FieldCoolingParser(cache_directory=str(tmp_path))
+    entry = parser.read(TEST_FILE)
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+
+    cached = parser.read(TEST_FILE)
+    assert cached.datetime == entry.datetime
+    assert cached.end_time == entry.end_time
+    assert [sample.lab_id for sample in cached.samples] == ['2024_0207', '2024_0208']
+    assert list(cached.get_time().magnitude) == list(entry.get_time().magnitude)
+    assert len(cached.figures) == 1
+    assert [phase.name for phase in cached.steps] == list(PHASES)
+
+
+def test_field_cooling_is_mainfile(tmp_path):
+    parser = FieldCoolingParser(mainfile_name_re=r'.*\.(DAT|dat)$')
+    with open(TEST_FILE, 'rb') as f:
+        buffer = f.read(2048)
+    assert parser.is_mainfile(TEST_FILE, 'text/plain', buffer, '')
+
+    unrelated = tmp_path / 'measurement.dat'
+    unrelated.write_bytes(b'\x00\x01' * 100000)
+    with open(unrelated, 'rb') as f:
+        buffer = f.read(2048)
+    assert not parser.is_mainfile(str(unrelated), 'text/plain', buffer, '')
@@ -0,0 +1,191 @@
+import io
+import tracemalloc
+
+import numpy as np
+import pytest
+import yaml
+from nomad.units import ureg
+
+from nomad_age.parsers.field_cooling_parser import FIELD_COOLING_LOG
+from nomad_age.parsers.instrument_log import (
+    InstrumentLogParser,
+    LogColumn,
+    LogField,
+    LogFormat,
+    minmax_indices,
+    read_log_data,
+    read_log_stream,
+    read_sample_names,
+    reconcile_entry,
+)
+from nomad_age.parsers.ion_bombardment_parser import read_ion_bombardment_file
+from nomad_age.schema_packages.field_cooling_schema import AGE_FieldCooling
+
+TEST_FILE = 'tests/data/fieldcooling/2024.10.18-2024_0207, 2024_0208 2nd time.DAT'
+
+
+def test_read_log_header():
+    with open(TEST_FILE, 'rb') as f:
+        metadata_content, _ = FIELD_COOLING_LOG.split_content(f.read())
+    assert 'FC-Protokoll' in metadata_content
+
+    header = FIELD_COOLING_LOG.read_header(metadata_content)
+    assert header['samples'] == '2024_0207, 2024_0208 2nd time'
+    assert header['datetime'].isoformat() == '2024-10-18T17:37:59'
+    assert header['blocking_temperature'] == 350.0
+    assert header['plateau_duration'] == 60.0  # 60,0 in the log
+    assert header['cooling_rate'] == 50.0
+
+    log_format = LogFormat(
+        banner=rb'#\s+XY-Protokoll\s+#',
+        fields=(LogField('energy', ('Energie',), dtype=float),),
+        columns=(LogColumn('time', 's'),),
+    )
+    assert log_format.read_header('Energie [keV]: 3,5\nEnergie: x') == {'energy': None}
+    assert log_format.read_header('Energie [keV]: 3,5') == {'energy': 3.5}
+
+    assert read_sample_names('2024_0207, 2024_0208') == (
+        ['2024_0207', '2024_0208'],
+        None,
+    )
+    assert read_sample_names('test run') == ([], 'test run')
+
+
+def test_read_log_data():
+    with open(TEST_FILE, 'rb') as f:
+        _, data_content = FIELD_COOLING_LOG.split_content(f.read())
+    data = read_log_data(data_content, 5)
+    assert data.shape == (23682, 5)
+    assert list(data[1]) == [0.5, 44.7380418, 25.0, 0.2430133, 0.000004]
+
+    # rows without 5 columns and comment rows are dropped
+    data = read_log_data(
+        b'1\t2\t3\t4\t5\r\n#\t1\t2\t3\t4\r\n1\t2\t3\r\n\r\n6\t7\t8\t9\t10', 5
+    )
+    assert data.tolist() == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10]]
+
+
+def test_read_log_data_quality():
+    quality = {}
+    data = read_log_data(
+        b'1\t2\t3\t4\t5\r\n'
+        b'1,5\t2,5\t3\t4\t5\r\n'  # comma decimals
+        b'2\t2\t3\t4\t5\t6\r\n'  # too many columns
+        b'3\t2\tx\t4\t5\r\n'  # not a number
+        b'4\t2\t3\t4\t\x00\x00\r\n'
+        b'#\t1\t2\r\n'
+        b'5\t2\t3\r\n',  # too few columns
+        5,
+        quality,
+    )
+    assert data.tolist() == [[1, 2, 3, 4, 5], [1.5, 2.5, 3, 4, 5]]
+    assert data[:, 0].flags.c_contiguous
+    assert quality == {'n_malformed_rows': 2, 'n_invalid_rows': 2, 'n_repaired_rows': 1}
+
+
+def test_read_log_stream():
+    with open(TEST_FILE, 'rb') as f:
+        content = f.read()
+    metadata_content, data_content = FIELD_COOLING_LOG.split_content(content)
+    data = read_log_data(data_content, 5)
+
+    # rows split across blocks are parsed once, whatever the block size
+    for block_size in (100, 1000, 2**16):
+        with open(TEST_FILE, 'rb') as f:
+            streamed_metadata, streamed, _, _ = read_log_stream(
+                f, FIELD_COOLING_LOG, block_size
+            )
+        assert streamed_metadata == metadata_content
+        assert np.array_equal(streamed, data)
+        assert streamed[:, 0].flags.c_contiguous
+    _, streamed, offset, n_rows = read_log_stream(
+        io.BytesIO(content), FIELD_COOLING_LOG, 5000
+    )
+    assert (offset, n_rows) == (len(content), len(data))
+    assert np.array_equal(streamed, data)
+
+
+def test_read_log_stream_memory(tmp_path):
+    """The peak memory of parsing is bounded by the data, not the size of the log."""
+    mainfile = tmp_path / 'long.DAT'
+    rows = np.tile([0.0, 44.7486074, 25.0, 0.2430133, 0.000004], (100_000, 1))
+    rows[:, 0] = np.arange(len(rows)) * 0.5
+    with open(mainfile, 'wb') as f:
+        f.write(b'#    FC-Protokoll     #\r\n#Zeit [s]#T_Ist [C]#\t\t\r\n')
+        np.savetxt(f, rows, fmt='%.7f', delimiter='\t', newline='\r\n')
+
+    tracemalloc.start()
+    try:
+        with open(mainfile, 'rb') as f:
+            _, data, _, _ = read_log_stream(f, FIELD_COOLING_LOG, block_size=2**15)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert np.array_equal(data, rows)
+    assert peak < 1.5 * data.nbytes
+    assert peak < mainfile.stat().st_size
+
+
+def test_convert_columns():
+    data = np.asfortranarray([[0.0, 20.0, 25.0, 1.0, 2.0], [1.0, 30.0, 35.0, 3.0, 4.0]])
+    columns = FIELD_COOLING_LOG.convert_columns(data, AGE_FieldCooling.m_def)
+    assert np.shares_memory(columns['measured_temperature'], data)
+
+    # columns in other units than the schema are converted
+    log_format = LogFormat(
+        banner=rb'#',
+        fields=(),
+        columns=(LogColumn('time', 'minute'), LogColumn('pirani_pressure', 'Pa')),
+    )
+    columns = log_format.convert_columns(data[:, :2], AGE_FieldCooling.m_def)
+    assert columns['time'].tolist() == [0.0, 60.0]
+    assert columns['pirani_pressure'].tolist() == [0.2, 0.3]
+
+
+def test_minmax_indices():
+    values = np.sin(np.linspace(0, 20, 10001))
+    values[1234] = 5.0
+    indices = minmax_indices(values, 200)
+    assert len(indices) <= 200
+    assert indices[0] == 0 and indices[-1] == 10000
+    assert 1234 in indices
+    assert values[indices].min() == values.min()
+
+
+class Logger:
+    def warning(self, *args, **kwargs):
+        pass
+
+
+def test_reconcile_entry(tmp_path, upload_archive):
+    ion_bombardment_file = (
+        'tests/data/ionbombardment/2024.11.05-2024_0301, 2024_0302.DAT'
+    )
+    file_name = 'ib.archive.yaml'
+
+    entry = read_ion_bombardment_file(ion_bombardment_file)
+    assert reconcile_entry(entry, upload_archive, file_name, Logger())
+    entry = read_ion_bombardment_file(ion_bombardment_file)
+    assert not reconcile_entry(entry, upload_archive, file_name, Logger())
+    assert upload_archive.m_context.processed == [file_name]
+
+    # Edits in the ELN are kept, the reprocessed file is otherwise unchanged
+    with open(tmp_path / file_name) as f:
+        content = yaml.safe_load(f)
+    content['data']['ion_energy'] = 30.0  # in the unit of the quantity (keV)
+    content['data']['description'] = 'Edited'
+    content['data']['mean_beam_current'] = 0.0  # not editable
+    with open(tmp_path / file_name, 'w') as f:
+        yaml.dump(content, f)
+
+    entry = read_ion_bombardment_file(ion_bombardment_file)
+    assert reconcile_entry(entry, upload_archive, file_name, Logger())
+    assert entry.ion_energy == ureg.Quantity(30.0, ureg.keV)
+    assert entry.description == 'Edited'
+    assert entry.mean_beam_current.to('nA').magnitude > 49
+
+
+def test_instrument_log_parser_abstract():
+    # the parsers of the instruments implement `read_file`
+    with pytest.raises(TypeError):
+        InstrumentLogParser()
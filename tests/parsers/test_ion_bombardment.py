@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+
+from nomad.units import ureg
+
+from nomad_age.parsers.field_cooling_parser import FieldCoolingParser
+from nomad_age.parsers.ion_bombardment_parser import (
+    IonBombardmentParser,
+    read_ion_bombardment_file,
+)
+
+TEST_FILE = 'tests/data/ionbombardment/2024.11.05-2024_0301, 2024_0302.DAT'
+FIELD_COOLING_FILE = (
+    'tests/data/fieldcooling/2024.10.18-2024_0207, 2024_0208 2nd time.DAT'
+)
+
+
+def test_ion_bombardment_parser():
+    """The text parsing is tested on its own (`read_ion_bombardment_file`), the parser
+    itself needs the database to look up and create the samples."""
+    entry = read_ion_bombardment_file(TEST_FILE, plot_max_points=100)
+
+    assert [sample.lab_id for sample in entry.samples] == ['2024_0301', '2024_0302']
+    assert entry.datetime == datetime(2024, 11, 5, 9, 12, 30, tzinfo=timezone.utc)
+    assert entry.ion_energy == ureg.Quantity(25.0, ureg.keV)
+    assert entry.target_fluence.to('1 / cm ** 2').magnitude == 1.9e14
+    assert entry.name == 'IB_2024-11-05 09:12:30'
+
+    assert entry.time.shape == entry.beam_current.shape == (600,)
+    assert entry.fluence[-1] == entry.achieved_fluence
+    assert 49 < entry.mean_beam_current.to('nA').magnitude < 51
+    assert entry.chamber_pressure.units == ureg.mbar
+    assert entry.data_quality.n_rows == 600
+    for trace in entry.figures[0].figure['data']:
+        assert len(trace['x']) <= 100
+
+
+def test_ion_bombardment_is_mainfile():
+    """Field cooling and ion bombardment logs share their names, not their banner."""
+    ion_bombardment = IonBombardmentParser(mainfile_name_re=r'.*\.(DAT|dat)$')
+    field_cooling = FieldCoolingParser(mainfile_name_re=r'.*\.(DAT|dat)$')
+    for mainfile, parser, other in (
+        (TEST_FILE, ion_bombardment, field_cooling),
+        (FIELD_COOLING_FILE, field_cooling, ion_bombardment),
+    ):
+        with open(mainfile, 'rb') as f:
+            buffer = f.read(2048)
+        assert parser.is_mainfile(mainfile, 'text/plain', buffer, '')
+        assert not other.is_mainfile(mainfile, 'text/plain', buffer, '')
+
+
+def test_ion_bombardment_cache(tmp_path):
+    parser = IonBombardmentParser(cache_directory=str(tmp_path))
+    entry = parser.read(TEST_FILE)
+    cached = parser.read(TEST_FILE)
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+    assert list(cached.fluence.magnitude) == list(entry.fluence.magnitude)
@@ -1,8 +1,34 @@
 import logging
+import os
+import shutil
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
+import pytest
 from nomad.datamodel import EntryArchive
 
-from nomad_age.parsers.LMOKEparser import LMOKEParser
+from nomad_age.parsers import LMOKEraster
+from nomad_age.parsers.LMOKEbundle import (
+    LMOKEBundleParser,
+    list_bundle_members,
+    parse_bundle,
+)
+from nomad_age.parsers.LMOKEparser import (
+    PRE_2025,
+    SINCE_2025,
+    LMOKEHeader,
+    LMOKEParser,
+    find_branches,
+    get_channels,
+    read_lmoke_data,
+    read_lmoke_file,
+    read_lmoke_header,
+    split_lmoke_content,
+)
+from nomad_age.parsers.LMOKEraster import assemble_raster_map, find_raster_run
+from nomad_age.schema_packages.LMOKEandVMOKESchema import to_branches
+from nomad_age.utils.cache import ResultCache
 
 
 def test_lmoke_parser():
@@ -17,3 +43,402 @@ def test_lmoke_parser():
     assert archive.data.user == 'Arne Vereijken'
     assert archive.data.sample == '2023_0325_1'
     assert archive.data.device == 'LMOKE'
+
+
+def test_read_lmoke_data():
+    with open('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt') as f:
+        content = f.read()
+    metadata_content, data_content = split_lmoke_content(content)
+
+    assert '# Meas. type' in metadata_content
+    data = read_lmoke_data(data_content)
+    assert data.shape == (200, 2)
+    assert data[0, 0] == 1.944082181097073203e01
+    assert data[-1, 1] == float(content.split()[-1])
+
+    # an interrupted last row is dropped
+    assert read_lmoke_data(data_content + '1.0e+01 ').shape == (200, 2)
+
+    # a short row in the middle does not shift the later rows, footers are dropped
+    data = read_lmoke_data('# H\tI\n1\t2\n3\n5\t6\n7\t8\n# end\nend\n')
+    assert data.tolist() == [[1, 2], [5, 6], [7, 8]]
+
+
+def test_lmoke_header_dialects():
+    with open('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt') as f:
+        metadata_content, _ = split_lmoke_content(f.read())
+    header = LMOKEHeader(metadata_content)
+
+    assert header.dialect == PRE_2025
+    assert header.get('Hstart') == -20.0
+    assert header.get('Hend') == 20.0
+    assert header.get('DeltaX') == 7.0
+    assert header.get('Cycle') == 2
+    assert header.get('nMinorLoops') == 5
+    assert header.get('UUID') is None
+    assert header.get_multiline('Comment') == '\n'
+
+    header = LMOKEHeader(
+        '# User\t\t\tJane Doe\n'
+        '# Sample\t\tP2025_0042_1\n'
+        '# UUID\t\t\tLMOKE0815\n'
+        '# Device\t\tVMOKE\n'
+        '# Comment\t\tfirst line\n'
+        '# second line\n'
+        '# Meas. type \t\tRaster\n'
+        '# Sample angle (deg)\t\t-45.0\n'
+        '# Field angle (deg)\t\t90.0\n'
+        '# Hstart (kA/m)\t\t25.000\n'
+        '# Hend (kA/m)\t\t-25.000\n'
+        '# DeltaX (mm)\t\t 3.500\n'
+        '# Raster\t\t(2,5)/(7,7)\n'
+    )
+
+    assert header.dialect == SINCE_2025
+    assert header.get('User') == 'Jane Doe'
+    assert header.get('Sample') == 'P2025_0042_1'
+    assert header.get('UUID') == 'LMOKE0815'
+    assert header.get('Device') == 'VMOKE'
+    assert header.get('Meas. type') == 'Raster'
+    assert header.get('Sample angle') == -45.0
+    assert header.get('Field angle') == 90.0
+    assert header.get('Hstart') == 25.0
+    assert header.get('Hend') == -25.0
+    assert header.get('DeltaX') == 3.5
+    assert (header.get('X'), header.get('Y')) == (2, 5)
+    assert header.get_multiline('Comment') == 'first line\nsecond line'
+
+
+def test_lmoke_parser_concurrent(tmp_path):
+    with open('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt') as f:
+        metadata_content, data_content = split_lmoke_content(f.read())
+    data = read_lmoke_data(data_content)
+
+    # distinct files: different samples, fields and signals
+    mainfiles = []
+    for i in range(16):
+        mainfile = tmp_path / f'2023_{i:04d}_1_LMOKE_2023-11-07_14-09-{i:02d}.txt'
+        lines = [f'{h * (i + 1):.15e} {v + i:.15e}' for h, v in data]
+        mainfile.write_text(
+            metadata_content.replace('2023_0325_1', f'2023_{i:04d}_1')
+            + '# -----------------------------------------------\n'
+            + '# H (kA/m) \t I (arb.u.)\n'
+            + '\n'.join(lines)
+        )
+        mainfiles.append(str(mainfile))
+
+    def parse(mainfile):
+        archive = EntryArchive()
+        parser.parse(mainfile, archive, logging.getLogger())
+        return archive.data.m_to_dict()
+
+    parser = LMOKEParser()
+    serial = [parse(mainfile) for mainfile in mainfiles]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for _ in range(4):
+            assert list(executor.map(parse, mainfiles)) == serial
+
+    assert [result['sample'] for result in serial] == [
+        f'2023_{i:04d}_1' for i in range(16)
+    ]
+
+
+def test_lmoke_branches():
+    lmoke = read_lmoke_file('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt')
+
+    assert list(lmoke.branch_starts) == [0, 100]
+    assert list(lmoke.branch_directions) == [-1, 1]
+    branches = lmoke.get_branches('magnetic_field')
+    assert branches.shape == (1, 2, 100)
+    assert np.all(np.diff(branches[0, 0]) < 0)
+    assert np.all(np.diff(branches[0, 1]) > 0)
+
+    # two and a half noisy cycles
+    field = lmoke.magnetic_field.magnitude
+    field = np.concatenate((field, field, field[:150]))
+    field += np.random.default_rng(0).normal(0, 0.05, field.size)
+    branch_starts, branch_directions = find_branches(field, pts_per_branch=100)
+    assert np.allclose(branch_starts, [0, 100, 200, 300, 400, 500], atol=2)
+    assert list(branch_directions) == [-1, 1, -1, 1, -1, 1]
+
+    branches = to_branches(field, branch_starts)
+    assert branches.shape[:2] == (3, 2)
+    # the truncated last branch is padded with NaN
+    n_measured = field.size - branch_starts[-1]
+    assert np.isnan(branches[2, 1]).sum() == branches.shape[2] - n_measured
+
+    # an upward noise step within a falling sweep does not split the branch
+    field = np.concatenate((np.linspace(10, -10, 200), np.linspace(-10, 10, 200)))
+    field[100:110] += 3
+    branch_starts, branch_directions = find_branches(field, pts_per_branch=200)
+    assert list(branch_directions) == [-1, 1]
+    assert np.allclose(branch_starts, [0, 200], atol=2)
+
+
+def test_lmoke_raster_map(tmp_path):
+    with open('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt') as f:
+        content = f.read()
+    # a 3 x 2 raster in the header dialect before 2025 (positions not in the header)
+    raster = (
+        content.replace('Hysteresis', 'Raster')
+        .replace('nX\t\t\t7', 'nX\t\t\t3')
+        .replace('nY\t\t\t7', 'nY\t\t\t2')
+    )
+    files = []
+    for i in range(6):
+        mainfile = tmp_path / f'2023_0325_1_LMOKE_2023-11-07_14-1{i}-00.txt'
+        mainfile.write_text(raster)
+        files.append(str(mainfile))
+    # other measurements in the same directory
+    (tmp_path / '2023_0325_1_LMOKE_2023-11-07_14-09-15.txt').write_text(content)
+    (tmp_path / '2023_0326_1_LMOKE_2023-11-07_14-20-00.txt').write_text(
+        raster.replace('2023_0325_1', '2023_0326_1')
+    )
+
+    # only the last measurement of the run completes it
+    assert [find_raster_run(mainfile) for mainfile in files[:-1]] == [None] * 5
+    assert find_raster_run(files[-1]) == files
+
+    raster_map = assemble_raster_map(
+        [read_lmoke_file(mainfile) for mainfile in files], files
+    )
+    assert raster_map.sample == '2023_0325_1'
+    assert (raster_map.nX, raster_map.nY) == (3, 2)
+    assert list(raster_map.X) == [1, 2, 3, 1, 2, 3]
+    assert list(raster_map.Y) == [1, 1, 1, 2, 2, 2]
+    assert raster_map.magnetic_field.shape == (6, 200)
+    assert raster_map.measurements[0] == os.path.basename(files[0])
+
+
+def test_lmoke_raster_runs(tmp_path, monkeypatch):
+    with open('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt') as f:
+        content = f.read()
+    raster = (
+        content.replace('Hysteresis', 'Raster')
+        .replace('nX\t\t\t7', 'nX\t\t\t2')
+        .replace('nY\t\t\t7', 'nY\t\t\t2')
+    )
+    positions = [(1, 1), (2, 1)] + [(1, 1), (2, 1), (1, 2), (2, 2)]
+    files = []
+    for i, (x, y) in enumerate(positions):
+        mainfile = tmp_path / f'2023_0325_1_LMOKE_2023-11-07_14-1{i}-00_({x},{y}).txt'
+        mainfile.write_text(raster)
+        files.append(str(mainfile))
+
+    # the headers are read once for the directory, not once per measurement
+    n_reads = []
+    monkeypatch.setattr(
+        LMOKEraster,
+        'read_lmoke_header',
+        lambda path: n_reads.append(path) or read_lmoke_header(path),
+    )
+    # the aborted run does not shift the complete run after it
+    assert [find_raster_run(mainfile) for mainfile in files] == [None] * 5 + [files[2:]]
+    assert len(n_reads) == len(files)
+
+    # a file rewritten in place with another header is read again
+    mtime_ns = os.stat(files[3]).st_mtime_ns
+    with open(files[3], 'w') as f:
+        f.write(raster.replace('nX\t\t\t2', 'nX\t\t\t3'))
+    os.utime(files[3], ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+    assert find_raster_run(files[-1]) is None
+    with open(files[3], 'w') as f:
+        f.write(raster)
+    assert find_raster_run(files[-1]) == files[2:]
+
+    measurements = [read_lmoke_file(mainfile) for mainfile in files[2:]]
+    raster_map = assemble_raster_map(measurements, files[2:])
+    assert list(raster_map.X) == [1, 2, 1, 2]
+    assert list(raster_map.Y) == [1, 1, 2, 2]
+
+    # positions counted from 0 are shifted, positions outside the raster rejected
+    for measurement in measurements:
+        measurement.X -= 1
+        measurement.Y -= 1
+    raster_map = assemble_raster_map(measurements, files[2:])
+    assert list(raster_map.X) == [1, 2, 1, 2]
+    measurements[-1].X = 5
+    with pytest.raises(ValueError):
+        assemble_raster_map(measurements, files[2:])
+
+
+def test_vmoke_channels(tmp_path):
+    field = np.linspace(20, -20, 50)
+    columns = np.column_stack(
+        (
+            field,
+            0.1 * field,
+            np.hypot(field, 0.1 * field),
+            np.tanh(field),
+            -field,
+            field,
+        )
+    )
+    mainfile = tmp_path / '2025_0042_1_VMOKE_2025-03-14_10-15-00.txt'
+    mainfile.write_text(
+        'User\tJane Doe\n'
+        'Charge\t2025_0042_1\n'
+        'Sample State\tas made\n'
+        'Comment\tNone\n'
+        'Measurement Method\tHysteresis\n'
+        'Sample Angle\t45\n'
+        'Magnetic Field Angle\t90\n'
+        'Magnetic field [kA/m]\tTransversal field [kA/m]\tTotal field [kA/m]\t'
+        'Longitudinal signal [V]\tTransversal signal [V]\tDiff. signal [V]\n'
+        + '\n'.join('\t'.join(f'{value:.6e}' for value in row) for row in columns)
+    )
+
+    vmoke = read_lmoke_file(str(mainfile))
+
+    assert vmoke.device == 'VMOKE'
+    assert vmoke.sample == '2025_0042_1'
+    assert vmoke.meas_type == 'Hysteresis'
+    assert vmoke.field_angle.magnitude == 90.0
+    assert vmoke.channels == [
+        'longitudinal_field',
+        'transversal_field',
+        'total_field',
+        'longitudinal_intensity',
+        'transversal_intensity',
+        'diff_longitudinal_intensity',
+    ]
+    assert vmoke.channel_data.shape == (50, 6)
+    assert np.allclose(vmoke.magnetic_field.magnitude, field)
+    assert np.allclose(vmoke.intensity.magnitude, np.tanh(field), atol=1e-6)
+
+    # without column names, the layout follows from the number of columns
+    assert get_channels([], 4)[1] == 'transversal_field'
+
+
+def test_lmoke_bundle(tmp_path):
+    mainfile = 'tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt'
+    bundle = str(tmp_path / 'campaign.lmoke.zip')
+    with zipfile.ZipFile(bundle, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for i in range(4):
+            zip_file.write(mainfile, f'run/2023_0325_1_LMOKE_2023-11-07_14-09-1{i}.txt')
+        zip_file.writestr('run/notes.txt', 'not a measurement')
+
+    parser = LMOKEBundleParser(
+        max_workers=2,
+        mainfile_name_re=r'.*\.lmoke\.zip',
+        mainfile_mime_re=r'application/zip',
+    )
+    keys = parser.is_mainfile(bundle, 'application/zip', b'', '')
+    assert keys == {
+        f'run/2023_0325_1_LMOKE_2023-11-07_14-09-1{i}.txt' for i in range(4)
+    }
+
+    archive = EntryArchive()
+    child_archives = {key: EntryArchive() for key in keys}
+    parser.parse(bundle, archive, logging.getLogger(), child_archives=child_archives)
+
+    expected = read_lmoke_file(mainfile)
+    for i in range(4):
+        data = child_archives[f'run/2023_0325_1_LMOKE_2023-11-07_14-09-1{i}.txt'].data
+        assert data.datetime == f'2023-11-07_14-09-1{i}'
+        assert data.sample == expected.sample
+        assert np.array_equal(
+            data.magnetic_field.magnitude, expected.magnetic_field.magnitude
+        )
+        assert np.array_equal(data.intensity.magnitude, expected.intensity.magnitude)
+
+
+def test_lmoke_bundle_corrupt_member(tmp_path, caplog):
+    # a member which cannot be parsed is left out, the others are kept
+    mainfile = 'tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt'
+    bundle = str(tmp_path / 'campaign.lmoke.zip')
+    with zipfile.ZipFile(bundle, 'w') as zip_file:
+        zip_file.write(mainfile, 'a_LMOKE_2023-11-07_14-09-10.txt')
+        zip_file.writestr('b_LMOKE_2023-11-07_14-09-11.txt', b'\xff\xfe\x00corrupt')
+        zip_file.write(mainfile, 'c_LMOKE_2023-11-07_14-09-12.txt')
+
+    members = list_bundle_members(bundle)
+    with caplog.at_level(logging.ERROR):
+        measurements = parse_bundle(
+            bundle, members, max_workers=2, logger=logging.getLogger()
+        )
+    assert list(measurements) == [members[0], members[2]]
+    assert members[1] in caplog.text
+
+
+def test_lmoke_parser_cache(tmp_path):
+    mainfile = 'tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt'
+    parser = LMOKEParser(cache_directory=str(tmp_path))
+    data = parser.read(mainfile)
+    cached = parser.read(mainfile)
+
+    assert len(list(tmp_path.glob('*.npz'))) == 1
+    assert cached.sample == data.sample
+    assert cached.comment == data.comment
+    assert np.array_equal(
+        cached.magnetic_field.magnitude, data.magnetic_field.magnitude
+    )
+    assert np.array_equal(cached.branch_starts, data.branch_starts)
+
+    # the least recently used results are evicted to stay within the size
+    cache = parser.cache
+    cache.max_size = 2 * os.path.getsize(next(tmp_path.glob('*.npz')))
+    for i in range(3):
+        cache.put(cache.key(f'{i}'.encode(), 'test'), data.m_to_dict())
+    assert len(list(tmp_path.glob('*.npz'))) == 2
+    assert cache.get(cache.key(b'2', 'test')) is not None
+    assert cache.size == sum(path.stat().st_size for path in tmp_path.glob('*.npz'))
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_result_cache_shared(tmp_path):
+    data = read_lmoke_file('tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt')
+    result = data.m_to_dict()
+
+    # the running total of threads writing to one cache stays exact
+    cache = ResultCache(str(tmp_path / 'threads'))
+    with ThreadPoolExecutor(8) as pool:
+        list(
+            pool.map(
+                lambda i: cache.put(cache.key(f'{i}'.encode(), 't'), result), range(32)
+            )
+        )
+    sizes = [path.stat().st_size for path in (tmp_path / 'threads').glob('*.npz')]
+    assert len(sizes) == 32
+    assert cache.size == sum(sizes)
+
+    # processes sharing a directory count the results of the others after a rescan
+    directory = tmp_path / 'processes'
+    caches = [ResultCache(str(directory), rescan_interval=0) for _ in range(4)]
+    caches[0].put(caches[0].key(b'size', 't'), result)
+    size = next(directory.glob('*.npz')).stat().st_size
+    for cache in caches:
+        cache.max_size = 3 * size
+    for i in range(12):
+        cache = caches[i % 4]
+        cache.put(cache.key(f'{i}'.encode(), 't'), result)
+        assert len(list(directory.glob('*.npz'))) <= 3
+
+
+def test_lmoke_parser_cache_path(tmp_path):
+    # the same content under another name is another result (datetime, position)
+    mainfile = 'tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt'
+    parser = LMOKEParser(cache_directory=str(tmp_path / 'cache'))
+    data = parser.read(mainfile)
+    renamed = tmp_path / '2023_0325_1_LMOKE_2024-01-02_03-04-05_(3,5).txt'
+    shutil.copy(mainfile, renamed)
+    cached = parser.read(str(renamed))
+    assert len(list((tmp_path / 'cache').glob('*.npz'))) == 2
+    assert data.datetime != cached.datetime == read_lmoke_file(str(renamed)).datetime
+    assert (data.X, cached.X, cached.Y) == (0, 3, 5)
+
+
+def test_lmoke_is_mainfile(tmp_path):
+    parser = LMOKEParser(mainfile_name_re=r'.*(LMOKE|VMOKE).*\.txt')
+    mainfile = 'tests/data/2023_0325_1_LMOKE_2023-11-07_14-09-15.txt'
+    with open(mainfile, 'rb') as f:
+        buffer = f.read(2048)
+    assert parser.is_mainfile(mainfile, 'text/plain', buffer, '')
+    assert not parser.is_mainfile('tests/data/example.out', 'text/plain', buffer, '')
+
+    # the header is only sniffed, large unrelated files are not read
+    unrelated = tmp_path / 'LMOKE_notes.txt'
+    unrelated.write_text('0.1\t0.2\n' * 100000 + '# Meas. type\t\tHysteresis\n')
+    with open(unrelated, 'rb') as f:
+        buffer = f.read(2048)
+    assert not parser.is_mainfile(str(unrelated), 'text/plain', buffer, '')
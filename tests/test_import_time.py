@@ -0,0 +1,47 @@
+import subprocess
+import sys
+
+# Modules loaded by every NOMAD worker: nomad.normalizing loads all normalizer plugins
+PLUGIN_MODULES = (
+    'nomad.normalizing',
+    'nomad_age.parsers.LMOKEparser',
+    'nomad_age.parsers.LMOKEbundle',
+    'nomad_age.parsers.LMOKEraster',
+    'nomad_age.parsers.field_cooling_parser',
+    'nomad_age.schema_packages.LMOKEandVMOKESchema',
+)
+# Heavy dependencies which must only be loaded on first use
+LAZY_MODULES = ('plotly', 'evaluix')
+# Budget for the time spent in the plugin's own modules (excluding dependencies)
+SELF_TIME_BUDGET_US = 1_000_000
+
+
+def import_times(modules):
+    """Returns the self import times [us] of all modules loaded by importing
+    `modules`, as reported by `python -X importtime`."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}'],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, _, name = line[len('import time:') :].split('|')
+        times[name.strip()] = int(self_time)
+    return times
+
+
+def test_import_time():
+    times = import_times(PLUGIN_MODULES)
+
+    assert 'nomad_age.normalizers.LMOKEnormalizer' in times
+    for module in LAZY_MODULES:
+        assert module not in times, f'{module} is imported with the plugin'
+
+    self_time = sum(
+        time for name, time in times.items() if name.startswith('nomad_age')
+    )
+    assert self_time < SELF_TIME_BUDGET_US
@@ -0,0 +1,62 @@
+import numpy as np
+import yaml
+
+from nomad_age.parsers.field_cooling_parser import read_field_cooling_file
+from nomad_age.schema_packages.field_cooling_schema import AGE_FieldCooling
+from nomad_age.utils.hdf5 import (
+    get_offloaded_array,
+    migrate_archive,
+    read_offloaded_array,
+)
+from nomad_age.utils.utils import create_archive, read_archive_digest
+
+TEST_FILE = 'tests/data/fieldcooling/2024.10.18-2024_0207, 2024_0208 2nd time.DAT'
+
+
+def test_offload_arrays(tmp_path, upload_archive):
+    entry = read_field_cooling_file(TEST_FILE, plot_max_points=2000)
+    file_name = 'fc.archive.yaml'
+    assert create_archive(entry, upload_archive, file_name)
+    assert (tmp_path / 'fc.arrays.h5').exists()
+
+    with open(tmp_path / file_name) as f:
+        data = yaml.safe_load(f)['data']
+    assert 'measured_temperature' not in data
+    offloaded = {array['name']: array for array in data['offloaded_arrays']}
+    temperature = entry.measured_temperature.magnitude
+    assert offloaded['measured_temperature']['shape'] == [temperature.size]
+    assert offloaded['measured_temperature']['maximum'] == temperature.max()
+
+    # Slices are read from the HDF5 file, whole arrays only where they are used
+    reference = offloaded['measured_temperature']['reference']
+    assert reference == 'fc.arrays.h5#/measured_temperature'
+    assert np.array_equal(
+        read_offloaded_array(upload_archive, reference, np.s_[100:200]),
+        temperature[100:200],
+    )
+    written = AGE_FieldCooling.m_from_dict(data)
+    for name in ('measured_temperature', 'penning_pressure'):
+        values = get_offloaded_array(written, name, upload_archive)
+        assert np.array_equal(values.magnitude, entry[name].magnitude)
+        assert values.units == entry[name].units
+        assert written.m_get(name) is None
+    assert get_offloaded_array(written, 'time', upload_archive) is None
+
+    # The digest covers the offloaded arrays
+    assert not create_archive(entry, upload_archive, file_name, overwrite=True)
+    entry.penning_pressure[-1] *= 2
+    assert create_archive(entry, upload_archive, file_name, overwrite=True)
+
+
+def test_migrate_archive(tmp_path, upload_archive):
+    """Archives written with the arrays inline are written again with HDF5."""
+    entry = read_field_cooling_file(TEST_FILE, plot_max_points=2000)
+    file_name = 'fc.archive.yaml'
+    with open(tmp_path / file_name, 'w') as f:
+        yaml.dump({'data': entry.m_to_dict(with_root_def=True)}, f)
+    size = (tmp_path / file_name).stat().st_size
+
+    assert migrate_archive(upload_archive, file_name)
+    assert read_archive_digest(upload_archive, file_name) is not None
+    assert (tmp_path / file_name).stat().st_size < size / 5
+    assert not migrate_archive(upload_archive, file_name)
@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import yaml
+
+from nomad_age.utils.samples import SampleRegistry, SampleResolver
+from nomad_age.utils.utils import get_hash_ref
+
+
+class InMemorySampleSearch:
+    """Stand-in for the search backend, counting the searches."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.queries = []
+
+    def __call__(self, query):
+        self.queries.append(query)
+        if 'upload_id' in query:
+            return [e for e in self.entries if e['upload_id'] == query['upload_id']]
+        lab_ids = set(query['results.eln.lab_ids:any'])
+        return [
+            e for e in self.entries if lab_ids & set(e['results']['eln']['lab_ids'])
+        ]
+
+
+def sample(lab_id, upload_id='upload', entry_id=None):
+    return {
+        'entry_id': entry_id or f'entry_{lab_id}',
+        'upload_id': upload_id,
+        'results': {'eln': {'lab_ids': [lab_id]}},
+    }
+
+
+class Clock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+def test_resolve_batched():
+    search = InMemorySampleSearch(
+        [sample('2024_0207'), sample('2024_0208', upload_id='other')]
+    )
+    resolver = SampleResolver(search=search)
+    references = resolver.resolve(['2024_0207', '2024_0208', '2024_0209'])
+
+    assert references == {
+        '2024_0207': '../uploads/upload/archive/entry_2024_0207#data',
+        '2024_0208': '../uploads/other/archive/entry_2024_0208#data',
+    }
+    assert search.queries == [
+        {'results.eln.lab_ids:any': ['2024_0207', '2024_0208', '2024_0209']}
+    ]
+
+    # Found samples are cached, missing ones are searched again
+    resolver.resolve(['2024_0207', '2024_0208', '2024_0209'])
+    assert search.queries[1:] == [{'results.eln.lab_ids:any': ['2024_0209']}]
+
+
+def test_resolve_ttl():
+    clock = Clock()
+    search = InMemorySampleSearch([sample('2024_0207')])
+    resolver = SampleResolver(search=search, ttl=10, clock=clock)
+    resolver.resolve(['2024_0207'])
+    clock.time = 9
+    resolver.resolve(['2024_0207'])
+    assert len(search.queries) == 1
+    clock.time = 10
+    resolver.resolve(['2024_0207'])
+    assert len(search.queries) == 2
+
+    resolver.invalidate('2024_0207')
+    resolver.resolve(['2024_0207'])
+    assert len(search.queries) == 3
+
+
+def test_prefetch_upload():
+    search = InMemorySampleSearch(
+        [sample('2024_0207'), sample('2024_0208'), sample('2024_0301', 'other')]
+    )
+    resolver = SampleResolver(search=search)
+    for lab_ids in (['2024_0207'], ['2024_0208', '2024_0207']):
+        resolver.prefetch_upload('upload')
+        assert set(resolver.resolve(lab_ids)) == set(lab_ids)
+    assert len(search.queries) == 1
+
+    assert '2024_0301' in resolver.resolve(['2024_0301'])
+    assert len(search.queries) == 2
+
+
+def test_resolve_duplicates():
+    search = InMemorySampleSearch(
+        [sample('2024_0207'), sample('2024_0207', entry_id='duplicate')]
+    )
+    with pytest.raises(ValueError):
+        SampleResolver(search=search).resolve(['2024_0207'])
+
+
+def test_registry_get_or_create(tmp_path, upload_archive):
+    search = InMemorySampleSearch([sample('2024_0207')])
+    registry = SampleRegistry('upload', SampleResolver(search=search))
+
+    references = registry.get_or_create(['2024_0207', '2024_0208'], upload_archive)
+    assert references['2024_0207'] == '../uploads/upload/archive/entry_2024_0207#data'
+    assert references['2024_0208'] == get_hash_ref('upload', '2024_0208.archive.yaml')
+    assert len(search.queries) == 2  # the upload and the missing lab IDs
+
+    # The new samples are written right away, but only processed on flush
+    with open(tmp_path / '2024_0208.archive.yaml') as f:
+        assert yaml.safe_load(f)['data']['lab_id'] == '2024_0208'
+    registry.get_or_create(['2024_0208', '2024_0209'], upload_archive)
+    assert upload_archive.m_context.processed == []
+    assert registry.flush(upload_archive) == [
+        '2024_0208.archive.yaml',
+        '2024_0209.archive.yaml',
+    ]
+    assert registry.flush(upload_archive) == []
+
+
+def test_registry_concurrent(upload_archive):
+    """Parsers in parallel (each with its own registry) create a sample once."""
+    registries = [
+        SampleRegistry('upload', SampleResolver(search=InMemorySampleSearch([])))
+        for _ in range(8)
+    ]
+    with ThreadPoolExecutor(8) as pool:
+        references = list(
+            pool.map(
+                lambda r: r.get_or_create(['2024_0207'], upload_archive), registries
+            )
+        )
+    assert len({r['2024_0207'] for r in references}) == 1
+
+    for registry in registries:
+        registry.flush(upload_archive)
+    assert upload_archive.m_context.processed == ['2024_0207.archive.yaml']
+
+
+def test_resolver_concurrent():
+    """The parsers of a process share the resolver from several threads."""
+    clock = Clock()
+    lab_ids = [f'2024_{i:04d}' for i in range(50)]
+    resolver = SampleResolver(
+        search=InMemorySampleSearch([sample(lab_id) for lab_id in lab_ids]),
+        ttl=10,
+        clock=clock,
+    )
+
+    def resolve(i):
+        clock.time = i % 20  # entries expire while others are resolved
+        return resolver.resolve(lab_ids[i % 50 :] + lab_ids[: i % 50])
+
+    with ThreadPoolExecutor(8) as pool:
+        for references in pool.map(resolve, range(200)):
+            assert set(references) == set(lab_ids)
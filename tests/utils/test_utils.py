@@ -0,0 +1,46 @@
+import numpy as np
+from nomad.datamodel.metainfo.basesections import CompositeSystem
+
+from nomad_age.utils.utils import (
+    ARCHIVE_DIGEST_PREFIX,
+    create_archive,
+    get_archive_digest,
+    read_archive_digest,
+)
+
+
+def test_archive_digest():
+    content = {'data': {'name': 'a', 'values': [1.0, float('nan'), -0.0]}}
+    digest = get_archive_digest(content)
+    assert digest.startswith('sha256:')
+
+    # NaN, signed zeros, arrays and the order of keys do not matter
+    assert digest == get_archive_digest(
+        {'data': {'values': np.array([1.0, np.nan, 0.0]), 'name': 'a'}}
+    )
+    for changed in (
+        {'data': {'name': 'b', 'values': [1.0, float('nan'), 0.0]}},
+        {'data': {'name': 'a', 'values': [1.0, 2.0, 0.0]}},
+        {'data': {'name': 'a', 'values': [1.0, float('nan')]}},
+        {'data': {'name': 'a', 'values': [[1.0, float('nan'), 0.0]]}},
+        {'data': {'name': 'a', 'values': ['1.0', 'nan', '0.0']}},
+    ):
+        assert get_archive_digest(changed) != digest
+
+
+def test_create_archive(tmp_path, upload_archive):
+    file_name = 'sample.archive.yaml'
+    assert create_archive(CompositeSystem(name='a'), upload_archive, file_name)
+    with open(tmp_path / file_name) as f:
+        assert f.readline().startswith(ARCHIVE_DIGEST_PREFIX)
+    digest = read_archive_digest(upload_archive, file_name)
+
+    assert not create_archive(CompositeSystem(name='b'), upload_archive, file_name)
+    assert not create_archive(
+        CompositeSystem(name='a'), upload_archive, file_name, overwrite=True
+    )
+    assert create_archive(
+        CompositeSystem(name='b'), upload_archive, file_name, overwrite=True
+    )
+    assert read_archive_digest(upload_archive, file_name) != digest
+    assert upload_archive.m_context.processed == [file_name, file_name]